@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 import os
 from pathlib import Path
+from decouple import config
 from django.utils.translation import gettext_lazy as _
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'Quran.middleware.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
@@ -95,13 +97,95 @@ LOGOUT_REDIRECT_URL = '/login/'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# DATABASE_PROFILE selects how SQLite connections are tuned. "production" switches to WAL
+# journaling (readers no longer block the writer), waits up to SQLITE_BUSY_TIMEOUT seconds
+# for the write lock instead of failing with "database is locked", takes that lock at the
+# start of each transaction, and keeps connections open between requests.
+# The journal mode is stored in the database file: "development" leaves it as it is, so a
+# database once opened with "production" stays in WAL mode (go back with
+# `sqlite3 db.sqlite3 "PRAGMA journal_mode = DELETE;"`).
+# Compare both profiles with `python manage.py benchmark_writes`.
+
+DATABASE_PROFILE = config('DATABASE_PROFILE', default='development')
+
+SQLITE_PROFILES = {
+    'development': {
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {
+            'timeout': 5,
+        },
+    },
+    'production': {
+        'CONN_MAX_AGE': config('DATABASE_CONN_MAX_AGE', default=600, cast=int),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': config('SQLITE_BUSY_TIMEOUT', default=20, cast=int),
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode = WAL;'
+                f"PRAGMA synchronous = {config('SQLITE_SYNCHRONOUS', default='NORMAL')};"
+                'PRAGMA cache_size = -20000;'  # 20 MB page cache per connection
+                'PRAGMA temp_store = MEMORY;'
+            ),
+        },
+    },
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # Django's SQLite backend plus the init_command and transaction_mode options
+        'ENGINE': 'Quran.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        **SQLITE_PROFILES[DATABASE_PROFILE],
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Use a shared backend (file, database or redis) when running several worker
+# processes, so cached school settings are invalidated for all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='quran'),
     }
 }
 
+# Seconds a built summary or attendance report is kept. Entries are also replaced as soon
+# as the data of their school changes (School.data_version, stored in the database so
+# bumps from other processes are seen with any cache backend).
+REPORT_CACHE_TIMEOUT = config('REPORT_CACHE_TIMEOUT', default=24 * 60 * 60, cast=int)
+
+
+# Student codes
+# Number of digits of new student codes, grows by one when all codes of that width are used.
+
+STUDENT_CODE_WIDTH = config('STUDENT_CODE_WIDTH', default=4, cast=int)
+
+
+# Request profiling
+# Opt-in: adds a Server-Timing header to every response and keeps a sample of
+# request timings (per worker process) for the staff performance page.
+
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=False, cast=bool)
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.1, cast=float)
+PROFILING_BUFFER_SIZE = config('PROFILING_BUFFER_SIZE', default=500, cast=int)
+PROFILING_TOP_QUERIES = config('PROFILING_TOP_QUERIES', default=5, cast=int)
+
+
+# Background jobs
+# Opt-in: payment status and summary report exports are queued in the database and
+# written by `python manage.py run_jobs` instead of inside the request. Finished files
+# are kept in JOB_FILES_DIR for JOB_RETENTION_DAYS; a running job without progress for
+# JOB_STALE_AFTER seconds is marked failed when a worker starts (its worker died).
+
+BACKGROUND_EXPORTS = config('BACKGROUND_EXPORTS', default=False, cast=bool)
+JOB_FILES_DIR = config('JOB_FILES_DIR', default=str(BASE_DIR / 'job_files'))
+JOB_RETENTION_DAYS = config('JOB_RETENTION_DAYS', default=7, cast=int)
+JOB_STALE_AFTER = config('JOB_STALE_AFTER', default=60 * 60, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -4,6 +4,7 @@ from django.contrib.auth.admin import UserAdmin
 from django.shortcuts import redirect, render
 from django.urls import path, reverse
 from datetime import timedelta
+from Quran.search import search_students
 from Quran.models import (
     School,
     Student,
@@ -12,8 +13,10 @@ from Quran.models import (
     ClassGroup,
     Invoice,
     Attendance,
+    MonthlyAttendance,
     StudentPaymentStatus,
     DiscountConfig,
+    BackgroundJob,
 )
 
 
@@ -48,6 +51,12 @@ class StudentAdmin(admin.ModelAdmin):
     list_per_page = 25
     readonly_fields = ("code", "registration_date")
 
+    def get_search_results(self, request, queryset, search_term):
+        # Names go through the search index; digits (code, phone) use the default search
+        if not search_term.strip() or search_term.strip().isdigit():
+            return super().get_search_results(request, queryset, search_term)
+        return search_students(queryset, search_term), False
+
 
 @admin.register(Teacher)
 class TeacherAdmin(admin.ModelAdmin):
@@ -97,6 +106,16 @@ class AttendanceAdmin(admin.ModelAdmin):
     list_per_page = 25
 
 
+@admin.register(MonthlyAttendance)
+class MonthlyAttendanceAdmin(admin.ModelAdmin):
+    list_display = ("student", "month", "year", "total_present")
+    list_filter = ("year", "month")
+    search_fields = ("student__name", "student__code")
+    ordering = ("-year", "-month")
+    list_per_page = 25
+    readonly_fields = ("school", "student", "year", "month", "present_days")
+
+
 @admin.register(StudentPaymentStatus)
 class StudentPaymentStatusAdmin(admin.ModelAdmin):
     list_display = ("student", "month", "year", "is_paid")
@@ -112,5 +131,14 @@ class DiscountConfigAdmin(admin.ModelAdmin):
     list_filter = ('school',)
 
 
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ("kind", "user", "status", "progress", "created_at", "finished_at")
+    list_filter = ("status", "kind")
+    ordering = ("-created_at",)
+    list_per_page = 25
+    readonly_fields = ("user", "kind", "params", "progress", "file_name", "file_path", "error", "started_at", "finished_at")
+
+
 admin.site.unregister(User)
 admin.site.register(User, CustomUserAdmin)
\ No newline at end of file
@@ -0,0 +1,31 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend with two extra OPTIONS, named as in Django 5.1:
+    - init_command: statements run on every new connection, e.g. "PRAGMA journal_mode = WAL;"
+    - transaction_mode: DEFERRED (default), IMMEDIATE or EXCLUSIVE, used to begin atomic blocks
+    """
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.init_command = kwargs.pop('init_command', '')
+        self.transaction_mode = kwargs.pop('transaction_mode', None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for statement in self.init_command.split(';'):
+            if statement.strip():
+                conn.execute(statement)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        # A deferred transaction that reads then writes can't wait for the busy timeout
+        # when another connection holds the write lock, it fails with "database is locked".
+        # IMMEDIATE takes the write lock first, so concurrent writers queue up instead.
+        if self.transaction_mode:
+            self.cursor().execute(f"BEGIN {self.transaction_mode}")
+        else:
+            super()._start_transaction_under_autocommit()
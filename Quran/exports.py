@@ -0,0 +1,256 @@
+import csv
+import io
+import os
+import tempfile
+from itertools import chain, islice
+from django.http import FileResponse
+from django.contrib.staticfiles import finders
+from django.utils import translation
+from django.utils.translation import gettext as _
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.drawing.image import Image
+from openpyxl.styles import Alignment, Font, PatternFill, NamedStyle
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.cell_range import CellRange
+
+# Rows fetched from the database per chunk
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = {
+    'xlsx': "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    'csv': "text/csv",
+}
+
+
+def export_styles():
+    """Named cell styles of an export, created once per workbook and shared by all its cells."""
+    return [
+        NamedStyle(
+            name="export_title",
+            font=Font(size=14, bold=True),
+            alignment=Alignment(horizontal="center", vertical="center"),
+        ),
+        NamedStyle(
+            name="export_header",
+            font=Font(bold=True, color="FFFFFF"),
+            fill=PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid"),
+            alignment=Alignment(horizontal="center", vertical="center"),
+        ),
+        NamedStyle(
+            name="export_row_even",
+            fill=PatternFill(start_color="F2F2F2", end_color="F2F2F2", fill_type="solid"),
+            alignment=Alignment(horizontal="center", vertical="center"),
+        ),
+        NamedStyle(
+            name="export_row_odd",
+            fill=PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid"),
+            alignment=Alignment(horizontal="center", vertical="center"),
+        ),
+        NamedStyle(
+            name="export_totals",
+            font=Font(bold=True),
+            fill=PatternFill(start_color="D9D9D9", end_color="D9D9D9", fill_type="solid"),
+            alignment=Alignment(horizontal="center", vertical="center"),
+        ),
+    ]
+
+
+def export_cell(ws, value, style):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style
+    return cell
+
+
+def iter_rows(rows):
+    """Read querysets in chunks, other iterables as they are."""
+    if hasattr(rows, 'iterator'):
+        return rows.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    return iter(rows)
+
+
+def column_value(column, row):
+    if 'value' in column:
+        return column['value'](row)
+    return row.get(column['key'])
+
+
+def write_xlsx(export_file, title, headers, rows, totals, rtl):
+    """
+    Write rows to a write-only workbook: logo, merged title, header, striped rows and totals.
+    Column widths come from the headers and the first chunk of rows, since a
+    write-only sheet needs them before its first row.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    for style in export_styles():
+        wb.add_named_style(style)
+    ws.sheet_view.rightToLeft = rtl
+
+    # Add logo in first row
+    logo_path = finders.find("logo.png")
+    if logo_path:
+        img = Image(logo_path)
+        img.height = 60
+        img.width = 120
+        ws.add_image(img, "A1")
+
+    # Title row merged over the columns after the logo
+    ws.merged_cells.add(CellRange(min_col=2, min_row=1, max_col=max(len(headers), 2), max_row=1))
+    ws.row_dimensions[1].height = 48
+    ws.row_dimensions[2].height = 25
+    ws.sheet_format.defaultRowHeight = 30
+    ws.sheet_format.customHeight = True
+
+    # Column widths
+    widths = [len(str(header)) for header in headers]
+    first_rows = list(islice(rows, EXPORT_CHUNK_SIZE))
+    for row_values in first_rows:
+        for col_index, value in enumerate(row_values):
+            if value is not None:
+                widths[col_index] = max(widths[col_index], len(str(value)))
+    for col_index, width in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(col_index)].width = width + 2
+
+    ws.append([None, export_cell(ws, title, "export_title")])
+    ws.append([export_cell(ws, header, "export_header") for header in headers])
+
+    # Data rows with stripe effect
+    row_index = 3
+    for row_values in chain(first_rows, rows):
+        style = "export_row_even" if row_index % 2 == 0 else "export_row_odd"
+        ws.append([export_cell(ws, value, style) for value in row_values])
+        row_index += 1
+
+    # Totals row, filled while the rows were written
+    if totals is not None:
+        ws.row_dimensions[row_index].height = 25
+        ws.append([export_cell(ws, value, "export_totals") for value in totals])
+
+    wb.save(export_file)
+
+
+def write_csv(export_file, title, headers, rows, totals, rtl):
+    # utf-8-sig so Excel opens Arabic text correctly
+    text = io.TextIOWrapper(export_file, encoding="utf-8-sig", newline="")
+    writer = csv.writer(text)
+    writer.writerow(headers)
+    writer.writerows(rows)
+    if totals is not None:
+        writer.writerow(totals)
+    text.flush()
+    text.detach()
+
+
+def write_table(export_file, rows, columns, title, file_format='xlsx', rtl=False, progress=None):
+    """
+    Write rows to an open binary file as XLSX or CSV.
+
+    `rows` is a queryset (read in chunks) or an iterable of dicts.
+    `columns` is a list of dicts with a 'header' and either a 'key' of the row or a
+    'value' callable; columns with 'total': True are summed in the same pass.
+    `progress` is called with the number of rows written after every chunk.
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {file_format}")
+
+    headers = [column['header'] for column in columns]
+    total_indexes = [index for index, column in enumerate(columns) if column.get('total')]
+    totals = None
+    if total_indexes:
+        totals = [""] * len(columns)
+        totals[0] = _("Totals")
+        for index in total_indexes:
+            totals[index] = 0
+
+    def values():
+        for count, row in enumerate(iter_rows(rows), start=1):
+            row_values = [column_value(column, row) for column in columns]
+            for index in total_indexes:
+                totals[index] += row_values[index] or 0
+            yield row_values
+            if progress and count % EXPORT_CHUNK_SIZE == 0:
+                progress(count)
+
+    writer = write_csv if file_format == 'csv' else write_xlsx
+    writer(export_file, title, headers, values(), totals, rtl)
+
+
+def export_filename(filename, file_format):
+    return f"{os.path.splitext(filename)[0]}.{file_format}"
+
+
+def export_table(rows, columns, title, filename, file_format='xlsx', rtl=False):
+    """Export rows (see write_table) to an XLSX or CSV file streamed back as a FileResponse."""
+    export_file = tempfile.TemporaryFile()
+    write_table(export_file, rows, columns, title, file_format, rtl)
+    export_file.seek(0)
+
+    return FileResponse(
+        export_file,
+        as_attachment=True,
+        filename=export_filename(filename, file_format),
+        content_type=EXPORT_FORMATS[file_format],
+    )
+
+
+def payment_status_export():
+    """Title, columns, file name and direction of the payment status export in the active language."""
+    # Set headers based on language
+    if translation.get_language() == "ar":
+        title_text = "حالة الدفع"
+        headers = [
+            "التاريخ", "رمز الطالب", "اسم الطالب", "الشهر", "السنة", "المبلغ"
+        ]
+    else:
+        title_text = _("Payment Status")
+        headers = [
+            _("Date"), _("Student Code"), _("Student Name"), _("Month"), _("Year"), _("Amount"),
+        ]
+
+    keys = ["date", "student_code", "student_name", "month", "year", "amount"]
+    columns = [{"header": header, "key": key} for header, key in zip(headers, keys)]
+    columns[-1]["total"] = True
+
+    return {
+        "columns": columns,
+        "title": title_text,
+        "filename": _("payment_status.xlsx"),
+        "rtl": translation.get_language() == "ar",
+    }
+
+
+def summary_report_export():
+    """Title, columns, file name and direction of the summary report export in the active language."""
+    # Set headers based on language
+    if translation.get_language() == "ar":
+        title_text = "تقرير ملخص"
+        headers = [
+            "المعلم", "المجموعة", "البداية", "النهاية", "إجمالي الطلاب",
+            "المدفوع هذا الشهر", "الخصم هذا الشهر", "إعفاء كامل", "غير مدفوع",
+            "المدفوع الأشهر السابقة", "الخصم الأشهر السابقة", "الإجمالي"
+        ]
+    else:
+        title_text = _("Summary Report")
+        headers = [
+            _("Teacher"), _("Group"), _("Start"), _("End"), _("Total Students"),
+            _("Paid Current"), _("Discount Current"), _("Full Discount"), _("Not Paid"),
+            _("Paid Previous"), _("Discount Previous"), _("Total Amount")
+        ]
+
+    keys = [
+        "teacher__name", "name", "start_time", "end_time", "total_students",
+        "students_paid_current", "students_discount_current", "students_full_discount", "students_not_paid",
+        "students_paid_previous", "students_discount_previous", "final_total",
+    ]
+    columns = [
+        {"header": header, "key": key, "total": index >= 4}
+        for index, (header, key) in enumerate(zip(headers, keys))
+    ]
+
+    return {
+        "columns": columns,
+        "title": title_text,
+        "filename": _("summary_report.xlsx"),
+        "rtl": translation.get_language() == "ar",
+    }
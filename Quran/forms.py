@@ -1,7 +1,8 @@
 from django import forms
 from django.forms.widgets import TimeInput, RadioSelect
+from django.utils.translation import gettext_lazy as _
 from Quran.models import (
-    Student, Teacher, Course, ClassGroup, GENDER_CHOICES, ACADEMIC_YEAR_CHOICES
+    School, Student, Teacher, Course, ClassGroup, GENDER_CHOICES, ACADEMIC_YEAR_CHOICES
 )
 
 class StudentForm(forms.ModelForm):
@@ -126,3 +127,23 @@ class ClassGroupForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         if not (user and user.is_superuser):
             self.fields.pop('school')
+
+
+class BulkInvoiceForm(forms.Form):
+    """A month of invoices for one school, or one group, of the user's schools."""
+    school = forms.ModelChoiceField(queryset=School.objects.none(), required=False, label=_("School"))
+    group = forms.ModelChoiceField(queryset=ClassGroup.objects.none(), required=False, label=_("Group"))
+    month = forms.IntegerField(min_value=1, max_value=12, label=_("Month"))
+    year = forms.IntegerField(min_value=2000, label=_("Year"))
+
+    def __init__(self, *args, **kwargs):
+        school_ids = kwargs.pop('school_ids')
+        super().__init__(*args, **kwargs)
+        self.fields['school'].queryset = School.objects.filter(pk__in=school_ids)
+        self.fields['group'].queryset = ClassGroup.objects.filter(school_id__in=school_ids)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('school') and not cleaned_data.get('group') and not self.errors:
+            raise forms.ValidationError(_("Select a school or a group."))
+        return cleaned_data
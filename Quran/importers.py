@@ -0,0 +1,453 @@
+import re
+import time as time_module
+from datetime import date, time
+import pandas as pd
+from openpyxl import load_workbook
+from django.db import transaction
+from Quran.models import School, Student, Teacher, ClassGroup, StudentImportHash, normalize_search_text
+from Quran.services import rebuild_ledger, refresh_school_snapshot
+from Quran.signals import LEDGER_STUDENT_FIELDS, school_updates_suspended
+
+# Rows written per bulk query
+IMPORT_BATCH_SIZE = 500
+
+# Workbook columns, in order
+WORKBOOK_COLUMNS = [
+    'name', 'id_number', 'gender', 'birth_date', 'academic_year', 'level',
+    'group', 'phone', 'phone_2', 'parent_profession', 'discount_flag',
+]
+
+# Issues reported per row, in report order
+ISSUE_COLUMNS = [
+    'name', 'id_number', 'duplicate_id', 'gender', 'birth_date', 'academic_year',
+    'level', 'phone', 'parent_profession', 'group_not_found', 'discount_flag',
+]
+
+ACADEMIC_YEAR_MAP = {
+    'الصف الاول الابتدائى': 'primary_1',
+    'الصف الثانى الابتدائى': 'primary_2',
+    'الصف الثالث الابتدائى': 'primary_3',
+    'الصف الرابع الابتدائى': 'primary_4',
+    'الصف الخامس الابتدائى': 'primary_5',
+    'الصف السادس الابتدائى': 'primary_6',
+    'الصف الاول الاعدادى': 'middle_1',
+    'الصف الثانى الاعدادى': 'middle_2',
+    'الصف الثالث الاعدادى': 'middle_3',
+    'الصف الاول الثانوى': 'high_1',
+    'الصف الثانى الثانوى': 'high_2',
+    'الصف الثالث الثانوى': 'high_3',
+    'الفرقة الاولى جامعة': 'university_1',
+    'الفرقة الثانية جامعة': 'university_2',
+    'الفرقة الثالثة جامعة': 'university_3',
+    'الفرقة الرابعة جامعة': 'university_4',
+    'خريج': 'graduate',
+}
+
+GENDER_MAP = {
+    'أنثى': 'F', 'انثى': 'F', 'و': 'F', 'ف': 'F',
+    'ذكر': 'M', 'م': 'M', 'ذ': 'M',
+}
+
+BIRTH_DATE_FORMATS = ["%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"]
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+
+# "Name (1:00 م - 3:00 م)": hour, minute and م (pm) / ص (am) of both times
+GROUP_TIME_PATTERN = r'(\d{1,2}):(\d{2})\s*([مص])\s*-\s*(\d{1,2}):(\d{2})\s*([مص])'
+TEACHER_TITLE_PATTERN = r'(الشيخ|شيخ|أ\.|ا\.)'
+
+DEFAULT_START = time(13, 0)
+DEFAULT_END = time(15, 0)
+DEFAULT_BIRTH_DATE = date(2026, 1, 1)
+NOT_SPECIFIED = "غير محدد"
+
+# Student fields set from a workbook row
+STUDENT_IMPORT_FIELDS = [
+    'name', 'gender', 'birth_date', 'academic_year', 'level', 'group',
+    'phone', 'parent_profession', 'discount_type', 'is_active', 'search_name',
+]
+
+
+# Parsed columns a row's content hash covers
+HASHED_COLUMNS = [
+    'name', 'gender', 'birth_date', 'academic_year', 'level', 'phone',
+    'parent_profession', 'discount_type', 'teacher_name', 'start_time', 'end_time',
+]
+
+
+# -------------------------
+# Parsing
+# -------------------------
+
+def cell_text(value):
+    """Text of a cell as pandas' dtype=str would give it, without the '.0' of whole numbers."""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def read_workbook(path):
+    """
+    Student rows of a workbook, one student per row after the header.
+    The sheet is streamed through openpyxl's read-only mode.
+    """
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(min_row=2, max_col=len(WORKBOOK_COLUMNS), values_only=True)
+        return pd.DataFrame.from_records(list(rows), columns=range(len(WORKBOOK_COLUMNS)))
+    finally:
+        wb.close()
+
+
+def normalize_name(name):
+    name = str(name)
+    name = re.sub(TEACHER_TITLE_PATTERN, '', name)
+    name = re.sub(r'\s+', ' ', name).strip()
+    return name
+
+
+def teacher_key(name):
+    """Key used to match teacher names case-insensitively."""
+    return normalize_name(name).casefold()
+
+
+def parse_birth_dates(text):
+    """Dates written day first, ISO dates and Excel serial numbers; NaT otherwise."""
+    parsed = pd.Series(pd.NaT, index=text.index, dtype='datetime64[ns]')
+    for fmt in BIRTH_DATE_FORMATS:
+        parsed = parsed.fillna(pd.to_datetime(text, format=fmt, errors='coerce'))
+    serial = pd.to_numeric(text, errors='coerce')
+    serial = serial.where(serial.between(1, 2958465))
+    return parsed.fillna(EXCEL_EPOCH + pd.to_timedelta(serial, unit='D'))
+
+
+def arabic_times(hours, minutes, markers, default):
+    """Times from hour/minute/marker columns; `default` where missing or invalid."""
+    hour = pd.to_numeric(hours)
+    minute = pd.to_numeric(minutes)
+    hour = hour.mask((markers == 'م') & (hour != 12), hour + 12)
+    hour = hour.mask((markers == 'ص') & (hour == 12), 0)
+    valid = hour.between(0, 23) & minute.between(0, 59)
+
+    total = (hour * 60 + minute).where(valid)
+    times = {value: time(int(value) // 60, int(value) % 60) for value in total.dropna().unique()}
+    return total.map(times).where(valid, default)
+
+
+def parse_students(df):
+    """
+    Validate the student rows of a workbook in one vectorized pass.
+
+    Returns a frame of cleaned student values (plus the group's teacher name and
+    times) and a boolean frame with one ISSUE_COLUMNS column per defaulted value.
+    `id_number` is None when the row needs a generated id: an invalid id or an id
+    repeated in the file. Only the file is looked at; see flag_foreign_ids.
+    """
+    df = df.reindex(columns=range(len(WORKBOOK_COLUMNS)))
+    df.columns = WORKBOOK_COLUMNS
+    text = pd.DataFrame({
+        column: df[column].map(cell_text, na_action='ignore').fillna('').astype(str).str.strip()
+        for column in WORKBOOK_COLUMNS
+    }, index=df.index)
+    issues = pd.DataFrame(index=df.index)
+
+    # NAME
+    issues['name'] = text['name'] == ''
+    name = text['name'].mask(issues['name'], 'UNKNOWN_' + (df.index + 2).astype(str))
+
+    # ID NUMBER
+    id_number = text['id_number'].str.replace(r'\D', '', regex=True)
+    valid_id = id_number.str.len() == 14
+    issues['id_number'] = ~valid_id
+    issues['duplicate_id'] = valid_id & id_number.where(valid_id).duplicated()
+    id_number = id_number.where(valid_id & ~issues['duplicate_id'], None)
+
+    # GENDER (Default M)
+    gender = text['gender'].map(GENDER_MAP)
+    issues['gender'] = gender.isna()
+
+    # BIRTH DATE
+    birth_date = parse_birth_dates(text['birth_date'])
+    issues['birth_date'] = birth_date.isna()
+
+    # ACADEMIC YEAR
+    academic_year = text['academic_year'].map(ACADEMIC_YEAR_MAP)
+    issues['academic_year'] = academic_year.isna()
+
+    # LEVEL
+    issues['level'] = text['level'] == ''
+
+    # PHONE, fixing Egyptian 10-digit mobile numbers
+    phone = text['phone'].str.replace(r'\D', '', regex=True)
+    phone = phone.mask((phone.str.len() == 10) & ~phone.str.startswith('0'), '0' + phone)
+    issues['phone'] = phone == ''
+
+    # PARENT PROFESSION
+    issues['parent_profession'] = text['parent_profession'] == ''
+
+    # GROUP
+    times = text['group'].str.extract(GROUP_TIME_PATTERN)
+    teacher_name = (
+        text['group']
+        .str.replace(r'\(.*?\)', '', regex=True)
+        .str.replace(TEACHER_TITLE_PATTERN, '', regex=True)
+        .str.replace(r'\s+', ' ', regex=True)
+        .str.strip()
+    )
+    issues['group_not_found'] = teacher_name == ''
+
+    # DISCOUNT
+    issues['discount_flag'] = text['discount_flag'] == ''
+
+    students = pd.DataFrame({
+        'row': df.index + 2,
+        'id_number': id_number,
+        'name': name,
+        'gender': gender.fillna('M'),
+        'birth_date': birth_date.fillna(pd.Timestamp(DEFAULT_BIRTH_DATE)).dt.date,
+        'academic_year': academic_year.fillna('pre_primary'),
+        'level': text['level'].mask(issues['level'], NOT_SPECIFIED),
+        'phone': phone.mask(issues['phone'], '00000000000'),
+        'parent_profession': text['parent_profession'].mask(issues['parent_profession'], NOT_SPECIFIED),
+        'discount_type': (text['discount_flag'] == 'نعم').map({True: 'discount', False: 'none'}),
+        'teacher_name': teacher_name,
+        'start_time': arabic_times(times[0], times[1], times[2], DEFAULT_START),
+        'end_time': arabic_times(times[3], times[4], times[5], DEFAULT_END),
+    }, index=df.index)
+    return students, issues[ISSUE_COLUMNS]
+
+
+def parse_workbook(path):
+    """Read and validate one workbook; runs in the import worker processes."""
+    return parse_students(read_workbook(path))
+
+
+def flag_foreign_ids(students, issues, foreign_ids):
+    """Report ids of `foreign_ids` (students of another school) as duplicates needing a generated id."""
+    foreign = students['id_number'].isin(foreign_ids)
+    if not foreign.any():
+        return students, issues
+    issues = issues.assign(duplicate_id=issues['duplicate_id'] | foreign)
+    students = students.assign(id_number=students['id_number'].mask(foreign, None))
+    return students, issues
+
+
+def issue_report(students, issues):
+    """Rows with defaulted values: row number, student name and the defaulted columns."""
+    flagged = issues[issues.any(axis=1)]
+    return [
+        {
+            'row': int(students.at[index, 'row']),
+            'student_name': students.at[index, 'name'],
+            'missing': [column for column in ISSUE_COLUMNS if flags[column]],
+        }
+        for index, flags in flagged.iterrows()
+    ]
+
+
+# -------------------------
+# Writing
+# -------------------------
+
+def fallback_ids(reserved):
+    """Yield generated 14-digit ids starting with 9 that are not in `reserved`."""
+    candidate = int(time_module.time() * 1000000) % 10 ** 13
+    while True:
+        candidate = (candidate + 1) % 10 ** 13
+        id_number = f"9{candidate:013d}"
+        if id_number not in reserved:
+            reserved.add(id_number)
+            yield id_number
+
+
+def ensure_groups(school, course, rows, result):
+    """
+    Find or create the teacher and class group of every row, keyed by
+    (normalized teacher name, start, end). Returns that index of groups.
+    """
+    teachers = {}
+    for teacher in Teacher.objects.filter(school=school).order_by('pk'):
+        teachers.setdefault(teacher_key(teacher.name), teacher)
+    groups = {}
+    for group in ClassGroup.objects.filter(school=school).select_related('teacher').order_by('pk'):
+        groups.setdefault((teacher_key(group.teacher.name), group.start_time, group.end_time), group)
+
+    wanted = {}
+    for row in rows:
+        if row['teacher_name']:
+            key = (teacher_key(row['teacher_name']), row['start_time'], row['end_time'])
+            wanted.setdefault(key, row['teacher_name'])
+
+    new_teachers = {}
+    teacher_ids = fallback_ids(set(Teacher.objects.values_list('id_number', flat=True)))
+    for (key, _start, _end), name in wanted.items():
+        if key not in teachers and key not in new_teachers:
+            new_teachers[key] = Teacher(
+                school=school,
+                name=name,
+                id_number=next(teacher_ids),
+                phone="01000000000",
+                gender="M",
+                marital_status="S",
+                qualification="Quran Teacher",
+            )
+    Teacher.objects.bulk_create(new_teachers.values(), batch_size=IMPORT_BATCH_SIZE)
+    teachers.update(new_teachers)
+
+    new_groups = []
+    for (key, start_time, end_time), name in wanted.items():
+        if (key, start_time, end_time) not in groups:
+            group = ClassGroup(
+                school=school,
+                course=course,
+                teacher=teachers[key],
+                start_time=start_time,
+                end_time=end_time,
+                name=f"{name} ({start_time.strftime('%H:%M')} - {end_time.strftime('%H:%M')})",
+            )
+            groups[(key, start_time, end_time)] = group
+            new_groups.append(group)
+    ClassGroup.objects.bulk_create(new_groups, batch_size=IMPORT_BATCH_SIZE)
+
+    result['teachers_created'] = len(new_teachers)
+    result['groups_created'] = len(new_groups)
+    return groups
+
+
+def content_hashes(students):
+    """Hex content hash of every parsed row, over the values written to the student."""
+    hashes = pd.util.hash_pandas_object(students[HASHED_COLUMNS].astype(str), index=False)
+    return hashes.map('{:016x}'.format)
+
+
+def chunks(values, size=IMPORT_BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def import_students(school, course, students, issues, full=False):
+    """
+    Apply the parsed students of a workbook (see parse_students) to a school in one transaction.
+
+    Rows whose content hash matches the last import of their id_number are skipped
+    unless `full` is set. Other students are matched by id_number: new ones are
+    bulk created, changed ones bulk updated, and students missing from the file are
+    deleted when nothing refers to them. Missing teachers and groups are created
+    with `course`.
+    """
+    result = {
+        'created': 0,
+        'updated': 0,
+        'unchanged': 0,
+        'deleted': 0,
+        'teachers_created': 0,
+        'groups_created': 0,
+        'issues': issue_report(students, issues),
+    }
+
+    hashes = content_hashes(students)
+    existing_ids = dict(Student.objects.filter(school=school).values_list('id_number', 'pk'))
+    known_hashes = dict(StudentImportHash.objects.filter(school=school).values_list('id_number', 'content_hash'))
+
+    # Rows without a usable id keep the generated id of an identical row of the last import
+    missing_id = students['id_number'].isna()
+    if missing_id.any():
+        file_ids = set(students['id_number'].dropna())
+        generated = {
+            content_hash: id_number for id_number, content_hash in known_hashes.items()
+            if id_number not in file_ids and id_number in existing_ids
+        }
+        reused = hashes[missing_id].map(lambda content_hash: generated.pop(content_hash, None))
+        students = students.assign(id_number=students['id_number'].mask(missing_id, reused))
+    unchanged = students['id_number'].isin(existing_ids.keys()) & students['id_number'].map(known_hashes).eq(hashes)
+    if full:
+        unchanged[:] = False
+    result['unchanged'] = int(unchanged.sum())
+
+    rows = students[~unchanged].assign(content_hash=hashes[~unchanged]).to_dict('records')
+    file_ids = set(students['id_number'].dropna())
+
+    existing = {}
+    for id_numbers in chunks(row['id_number'] for row in rows if row['id_number'] in existing_ids):
+        existing.update((student.id_number, student) for student in Student.objects.filter(school=school, id_number__in=id_numbers))
+    student_ids = None
+    if any(row['id_number'] is None for row in rows):
+        student_ids = fallback_ids(set(Student.objects.values_list('id_number', flat=True)))
+
+    with transaction.atomic():
+        groups = ensure_groups(school, course, rows, result)
+        default_group = ClassGroup.objects.filter(school=school).order_by('pk').first()
+
+        new_students, changed_students, new_hashes = [], [], []
+        ledger_changed = False
+        for row in rows:
+            id_number = row['id_number'] or next(student_ids)
+            new_hashes.append(StudentImportHash(school=school, id_number=id_number, content_hash=row['content_hash']))
+            group = default_group
+            if row['teacher_name']:
+                group = groups[(teacher_key(row['teacher_name']), row['start_time'], row['end_time'])]
+            values = {field: row[field] for field in STUDENT_IMPORT_FIELDS if field in row}
+            values.update(
+                group_id=group.pk if group else None,
+                is_active=True,
+                search_name=normalize_search_text(row['name']),
+            )
+
+            student = existing.get(id_number)
+            if student is None:
+                new_students.append(Student(school=school, id_number=id_number, **values))
+                continue
+
+            before = {field: getattr(student, field) for field in LEDGER_STUDENT_FIELDS}
+            changed = False
+            for field, value in values.items():
+                if getattr(student, field) != value:
+                    setattr(student, field, value)
+                    changed = True
+            if changed:
+                changed_students.append(student)
+                ledger_changed = ledger_changed or any(
+                    getattr(student, field) != value for field, value in before.items()
+                )
+            else:
+                result['unchanged'] += 1
+
+        # bulk_create skips Student.save(), so codes are allocated here
+        for student, code in zip(new_students, Student.allocate_codes(len(new_students))):
+            student.code = code
+        Student.objects.bulk_create(new_students, batch_size=IMPORT_BATCH_SIZE)
+        Student.objects.bulk_update(changed_students, STUDENT_IMPORT_FIELDS, batch_size=IMPORT_BATCH_SIZE)
+        result['created'] = len(new_students)
+        result['updated'] = len(changed_students)
+
+        # Students gone from the file, unless invoices or attendance refer to them.
+        # delete() signals every row, the school is refreshed once below instead
+        vanished = [pk for id_number, pk in existing_ids.items() if id_number not in file_ids]
+        with school_updates_suspended(school.id):
+            for pks in chunks(vanished):
+                _, deleted = Student.objects.filter(
+                    pk__in=pks,
+                    invoices__isnull=True,
+                    attendances__isnull=True,
+                    payment_statuses__isnull=True,
+                ).delete()
+                result['deleted'] += deleted.get(Student._meta.label, 0)
+
+        StudentImportHash.objects.bulk_create(
+            new_hashes,
+            batch_size=IMPORT_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['school', 'id_number'],
+            update_fields=['content_hash', 'updated_at'],
+        )
+        for id_numbers in chunks(known_hashes.keys() - file_ids - {row.id_number for row in new_hashes}):
+            StudentImportHash.objects.filter(school=school, id_number__in=id_numbers).delete()
+
+        # bulk_update skips the signals keeping the ledger and cached reports in sync
+        if ledger_changed:
+            rebuild_ledger(school_ids=[school.id])
+        if result['created'] or result['updated'] or result['deleted'] or result['groups_created']:
+            School.bump_data_version(school.id)
+            refresh_school_snapshot(school.id, ['students', 'revenue'])
+
+    return result
@@ -0,0 +1,179 @@
+import os
+from datetime import timedelta
+from itertools import count
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone, translation
+from Quran.exports import (
+    EXPORT_CHUNK_SIZE, export_filename, payment_status_export, summary_report_export, write_table,
+)
+from Quran.models import BackgroundJob
+from Quran.utils import cached_report, get_group_summary, get_payment_summary
+
+# Job kind -> handler(job, progress), registered with @job_handler
+JOB_HANDLERS = {}
+
+
+class JobAbandoned(Exception):
+    """Raised by progress() when the job is no longer running, e.g. marked stale by fail_stale_jobs."""
+
+
+def job_handler(kind):
+    def register(function):
+        JOB_HANDLERS[kind] = function
+        return function
+    return register
+
+
+def submit_job(user, kind, **params):
+    """Queue a job for the run_jobs worker. Handlers run in the language of the request."""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    params.setdefault('language', translation.get_language())
+    return BackgroundJob.objects.create(user=user, kind=kind, params=params)
+
+
+def claim_job():
+    """
+    Mark the oldest pending job as running and return its id, None when the queue is empty.
+    The conditional UPDATE lets several workers poll the same table without taking a job twice.
+    """
+    while True:
+        job_id = (
+            BackgroundJob.objects.filter(status='pending')
+            .order_by('created_at', 'pk')
+            .values_list('pk', flat=True)
+            .first()
+        )
+        if job_id is None:
+            return None
+        now = timezone.now()
+        if BackgroundJob.objects.filter(pk=job_id, status='pending').update(status='running', started_at=now, updated_at=now):
+            return job_id
+
+
+def run_job(job_id):
+    """Run a claimed job and record its result. Returns the job, done or failed."""
+    job = BackgroundJob.objects.get(pk=job_id)
+
+    def progress(percent):
+        # 100 is set with the done status, updated_at is the heartbeat checked by fail_stale_jobs
+        if not BackgroundJob.objects.filter(pk=job.pk, status='running').update(
+            progress=min(int(percent), 99), updated_at=timezone.now(),
+        ):
+            raise JobAbandoned("The job is no longer running.")
+
+    try:
+        handler = JOB_HANDLERS.get(job.kind)
+        if handler is None:
+            raise ValueError(f"Unknown job kind: {job.kind}")
+        with translation.override(job.params.get('language')):
+            handler(job, progress)
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e) or e.__class__.__name__
+        job.file_name = job.file_path = ''
+    else:
+        job.status = 'done'
+        job.progress = 100
+    job.finished_at = timezone.now()
+    fields = ['status', 'progress', 'error', 'file_name', 'file_path', 'finished_at']
+    # A job failed meanwhile (marked stale) keeps its status, and gets no file
+    if not BackgroundJob.objects.filter(pk=job.pk, status='running').update(
+        updated_at=job.finished_at, **{field: getattr(job, field) for field in fields},
+    ):
+        if job.file_path:
+            try:
+                os.remove(job_file_path(job))
+            except FileNotFoundError:
+                pass
+        job.refresh_from_db()
+    return job
+
+
+def run_job_in_worker(job_id):
+    """run_job for pool workers: each thread or process closes its own connection."""
+    try:
+        return run_job(job_id).status
+    finally:
+        connection.close()
+
+
+def job_file_path(job):
+    return os.path.join(settings.JOB_FILES_DIR, job.file_path)
+
+
+def fail_stale_jobs():
+    """Mark running jobs without progress for JOB_STALE_AFTER as failed, their worker stopped."""
+    now = timezone.now()
+    return BackgroundJob.objects.filter(
+        status='running',
+        updated_at__lt=now - timedelta(seconds=settings.JOB_STALE_AFTER),
+    ).update(status='failed', error="The worker stopped before the job finished.", finished_at=now, updated_at=now)
+
+
+def purge_jobs():
+    """Delete jobs finished more than JOB_RETENTION_DAYS ago, with their files."""
+    jobs = BackgroundJob.objects.filter(finished_at__lt=timezone.now() - timedelta(days=settings.JOB_RETENTION_DAYS))
+    for job in jobs.exclude(file_path=''):
+        try:
+            os.remove(job_file_path(job))
+        except FileNotFoundError:
+            pass
+    return jobs.delete()[0]
+
+
+def queryset_chunks(queryset, size=EXPORT_CHUNK_SIZE):
+    """
+    Rows of a queryset, one complete query per chunk. Unlike QuerySet.iterator(), no SQLite
+    read stays open while the job writes its progress, which could deadlock with another writer.
+    """
+    if not queryset.ordered:
+        queryset = queryset.order_by('pk')
+    for start in count(0, size):
+        rows = list(queryset[start:start + size])
+        yield from rows
+        if len(rows) < size:
+            return
+
+
+def export_job(job, progress, rows, total, export):
+    """Write an export (see Quran.exports) to JOB_FILES_DIR and attach it to the job."""
+    file_format = job.params['file_format']
+    os.makedirs(settings.JOB_FILES_DIR, exist_ok=True)
+    job.file_path = f"job_{job.pk}.{file_format}"
+    path = job_file_path(job)
+
+    # Written under a temporary name, so a download never sees a partial file
+    try:
+        with open(f"{path}.part", 'wb') as export_file:
+            write_table(
+                export_file,
+                rows,
+                export['columns'],
+                export['title'],
+                file_format,
+                export['rtl'],
+                progress=lambda count: progress(count * 100 / max(total, 1)),
+            )
+    except BaseException:
+        os.remove(f"{path}.part")
+        raise
+    os.replace(f"{path}.part", path)
+    job.file_name = export_filename(export['filename'], file_format)
+
+
+@job_handler('payment_status_export')
+def payment_status_export_job(job, progress):
+    params = job.params
+    rows = get_payment_summary(school_id=params['school_id'], from_date=params['from_date'], to_date=params['to_date'])
+    export_job(job, progress, queryset_chunks(rows), rows.count(), payment_status_export())
+
+
+@job_handler('summary_report_export')
+def summary_report_export_job(job, progress):
+    params = job.params
+    rows = cached_report('summary', params['school_id'], None, params['month'], params['year'], lambda: get_group_summary(
+        school_id=params['school_id'], month=params['month'], year=params['year'],
+    ))
+    export_job(job, progress, rows, len(rows), summary_report_export())
@@ -0,0 +1,154 @@
+import random
+import re
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from Quran.models import Student
+from Quran.services import save_group_attendance
+from Quran.utils import get_group_roster
+
+
+def apply_profile(profile):
+    """Reconnect the default database with the settings of a DATABASE_PROFILE."""
+    connections['default'].close()
+    connections['default'].settings_dict.update(settings.SQLITE_PROFILES[profile])
+
+
+def journal_mode(profile):
+    """The journal mode set by the init_command of a profile, SQLite's default DELETE without one."""
+    init_command = settings.SQLITE_PROFILES[profile].get('OPTIONS', {}).get('init_command', '')
+    match = re.search(r'journal_mode\s*=\s*(\w+)', init_command, re.IGNORECASE)
+    return match.group(1).upper() if match else 'DELETE'
+
+
+def set_journal_mode(mode):
+    # Needs the only connection to the database
+    with connection.cursor() as cursor:
+        cursor.execute(f"PRAGMA journal_mode = {mode}")
+    connections.close_all()
+
+
+def init_worker(profile):
+    django.setup()
+    apply_profile(profile)
+
+
+def run_worker(role, groups, started_at, duration, seed):
+    """
+    Submit attendance (writers) or load rosters (readers) until the deadline.
+    Returns the latency of each call in seconds and the number of lock errors.
+    """
+    rng = random.Random(seed)
+    today = date.today()
+    latencies, errors = [], 0
+    time.sleep(max(0, started_at - time.time()))
+    while time.time() < started_at + duration:
+        school_id, group_id, student_ids = rng.choice(groups)
+        day = today.replace(day=rng.randrange(1, today.day + 1))
+        began = time.perf_counter()
+        try:
+            if role == 'write':
+                present_ids = [student_id for student_id in student_ids if rng.random() < 0.85]
+                save_group_attendance([school_id], day, student_ids, present_ids)
+            else:
+                get_group_roster([school_id], group_id, day)
+        except OperationalError:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - began)
+    connection.close()
+    return role, latencies, errors
+
+
+def milliseconds(latencies, quantile):
+    if not latencies:
+        return 0
+    if len(latencies) == 1:
+        return latencies[0] * 1000
+    return statistics.quantiles(latencies, n=100)[quantile - 1] * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure attendance submissions from concurrent processes under each database profile. '
+        'Runs against the configured database and rewrites the attendance of the current month '
+        'for the dataset created by "generate_dataset --seed N".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1, help='Seed of the generated dataset to write to')
+        parser.add_argument('--profiles', nargs='+', default=['development', 'production'], help='Profiles of SQLITE_PROFILES to compare')
+        parser.add_argument('--writers', type=int, default=8, help='Processes submitting attendance')
+        parser.add_argument('--readers', type=int, default=4, help='Processes loading attendance rosters')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds per profile')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("The benchmark compares SQLite profiles, the default database is not SQLite.")
+        unknown = set(options['profiles']) - set(settings.SQLITE_PROFILES)
+        if unknown:
+            raise CommandError(f"Unknown profiles: {', '.join(sorted(unknown))}")
+
+        groups = {}
+        for school_id, group_id, student_id in Student.objects.filter(
+            school__code__startswith=f"BENCH-{options['seed']}-",
+            group__isnull=False,
+            is_active=True,
+        ).values_list('school_id', 'group_id', 'id'):
+            groups.setdefault((school_id, group_id), []).append(student_id)
+        if not groups:
+            raise CommandError(f"No dataset for seed {options['seed']}, run generate_dataset --seed {options['seed']} first.")
+        groups = [(school_id, group_id, student_ids) for (school_id, group_id), student_ids in groups.items()]
+
+        self.stdout.write(
+            f"{len(groups)} groups, {options['writers']} writers, {options['readers']} readers, "
+            f"{options['duration']:g}s per profile\n"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            original_mode = cursor.fetchone()[0]
+
+        self.stdout.write(
+            f"{'Profile':<14}{'Writes/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"
+            f"{'Lock errors':>13}{'Reads/s':>10}{'Read p95 ms':>13}"
+        )
+        try:
+            for profile in options['profiles']:
+                row = self.run_profile(profile, groups, options)
+                self.stdout.write(
+                    f"{profile:<14}{row['writes'] / options['duration']:>10.1f}"
+                    f"{milliseconds(row['write_latencies'], 50):>10.1f}"
+                    f"{milliseconds(row['write_latencies'], 95):>10.1f}"
+                    f"{max(row['write_latencies'], default=0) * 1000:>10.1f}"
+                    f"{row['errors']:>13}{row['reads'] / options['duration']:>10.1f}"
+                    f"{milliseconds(row['read_latencies'], 95):>13.1f}"
+                )
+        finally:
+            # Leave the database in the journal mode it had
+            set_journal_mode(original_mode)
+        self.stdout.write("\nWrite latency includes the wait for the database lock.")
+
+    def run_profile(self, profile, groups, options):
+        # Switch to the journal mode of the profile before the workers start
+        apply_profile(profile)
+        set_journal_mode(journal_mode(profile))
+
+        roles = ['write'] * options['writers'] + ['read'] * options['readers']
+        started_at = time.time() + 1
+        row = {'writes': 0, 'reads': 0, 'errors': 0, 'write_latencies': [], 'read_latencies': []}
+        with ProcessPoolExecutor(max_workers=len(roles), initializer=init_worker, initargs=(profile,)) as executor:
+            futures = [
+                executor.submit(run_worker, role, groups, started_at, options['duration'], options['seed'] * 1000 + index)
+                for index, role in enumerate(roles)
+            ]
+            for future in futures:
+                role, latencies, errors = future.result()
+                row[f'{role}s'] += len(latencies)
+                row[f'{role}_latencies'].extend(latencies)
+                row['errors'] += errors
+        return row
@@ -0,0 +1,37 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from Quran.models import ClassGroup
+from Quran.services import create_monthly_invoices
+
+
+class Command(BaseCommand):
+    help = 'Invoice every eligible student of a school or group for a month, skipping students already invoiced'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', type=int, action='append', dest='schools', help='Invoice this school id (repeatable)')
+        parser.add_argument('--group', type=int, help='Only invoice this group id')
+        parser.add_argument('--month', type=int, help='Billed month, defaults to the current one')
+        parser.add_argument('--year', type=int, help='Billed year, defaults to the current one')
+
+    def handle(self, *args, **options):
+        today = date.today()
+        month = options['month'] or today.month
+        year = options['year'] or today.year
+        if not 1 <= month <= 12:
+            raise CommandError(f"Invalid month: {month}")
+
+        school_ids = options['schools']
+        if options['group']:
+            group_school_id = ClassGroup.objects.filter(pk=options['group']).values_list('school_id', flat=True).first()
+            if group_school_id is None or (school_ids and group_school_id not in school_ids):
+                raise CommandError(f"Group {options['group']} not found.")
+            school_ids = [group_school_id]
+        if not school_ids:
+            raise CommandError("Pass --school or --group.")
+
+        result = create_monthly_invoices(school_ids, month, year, group_id=options['group'])
+        total = sum(invoice.amount for invoice in result['invoices'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(result['invoices'])} invoice(s) for {month}/{year}, total {total}."
+        ))
+        self.stdout.write(f"Skipped {result['skipped']} student(s) already invoiced.")
@@ -0,0 +1,223 @@
+import calendar
+import random
+import time
+from datetime import date, time as dt_time
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from Quran.models import (
+    School, Teacher, Course, ClassGroup, Student, Attendance, MonthlyAttendance, Invoice, StudentPaymentStatus,
+    DiscountConfig, ACADEMIC_YEAR_CHOICES, SCHOOL_SETTINGS_DEFAULTS, normalize_search_text,
+)
+from Quran.services import rebuild_ledger
+
+FIRST_NAMES = [
+    'محمد', 'أحمد', 'محمود', 'علي', 'عمر', 'يوسف', 'إبراهيم', 'حسن', 'خالد', 'مصطفى',
+    'فاطمة', 'مريم', 'عائشة', 'زينب', 'نور', 'سارة', 'هدى', 'آية', 'منى', 'سلمى',
+]
+FAMILY_NAMES = [
+    'عبد الله', 'عبد الرحمن', 'السيد', 'حسين', 'إسماعيل', 'عثمان', 'سليمان', 'رمضان', 'شعبان', 'منصور',
+]
+PROFESSIONS = ['مهندس', 'طبيب', 'مدرس', 'محاسب', 'تاجر', 'موظف', 'مزارع', 'سائق']
+ACADEMIC_YEARS = [value for value, _label in ACADEMIC_YEAR_CHOICES]
+
+# Friday is the weekly day off
+SCHOOL_WEEKDAYS = {0, 1, 2, 3, 5, 6}
+
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic synthetic dataset (students, attendance, invoices) for benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schools', type=int, default=1, help='Number of schools')
+        parser.add_argument('--groups', type=int, default=4, help='Groups per school')
+        parser.add_argument('--students', type=int, default=25, help='Students per group')
+        parser.add_argument('--months', type=int, default=6, help='Months of history, ending with the current month')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed, also part of the school codes')
+        parser.add_argument('--attendance-rate', type=float, default=0.85, help='Probability a student is present')
+        parser.add_argument('--payment-rate', type=float, default=0.9, help='Probability a month gets invoiced')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.counts = {}
+        started = time.perf_counter()
+
+        codes = [f"BENCH-{options['seed']}-{index + 1}" for index in range(options['schools'])]
+        if School.objects.filter(code__in=codes).exists():
+            raise CommandError(f"Dataset for seed {options['seed']} already exists, use another --seed.")
+
+        self.months = self.history_months(options['months'])
+        self.today = date.today()
+        self.used_ids = set(Student.objects.values_list('id_number', flat=True))
+        self.used_ids.update(Teacher.objects.values_list('id_number', flat=True))
+
+        try:
+            with transaction.atomic():
+                schools = [School.objects.create(name=f"Benchmark School {code}", code=code) for code in codes]
+                for school in schools:
+                    self.generate_school(school)
+                months = rebuild_ledger(school_ids=[school.id for school in schools])
+        except ValidationError as e:
+            raise CommandError(" ".join(e.messages))
+
+        for name, count in self.counts.items():
+            self.stdout.write(f"{name}: {count}")
+        self.stdout.write(f"Ledger months: {months}")
+        self.stdout.write(self.style.SUCCESS(f"Dataset generated in {time.perf_counter() - started:.1f}s"))
+
+    def history_months(self, count):
+        today = date.today()
+        months = []
+        year, month = today.year, today.month
+        for _i in range(count):
+            months.append((year, month))
+            month -= 1
+            if month == 0:
+                year, month = year - 1, 12
+        return list(reversed(months))
+
+    def bulk_create(self, model, objects):
+        model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+        self.counts[model.__name__] = self.counts.get(model.__name__, 0) + len(objects)
+        return objects
+
+    def unique_id_number(self):
+        while True:
+            id_number = str(self.rng.randrange(2 * 10 ** 13, 4 * 10 ** 13))
+            if id_number not in self.used_ids:
+                self.used_ids.add(id_number)
+                return id_number
+
+    def person_name(self):
+        return f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(FIRST_NAMES)} {self.rng.choice(FAMILY_NAMES)}"
+
+    def phone(self):
+        return f"01{self.rng.choice('0125')}{self.rng.randrange(10 ** 7, 10 ** 8)}"
+
+    def generate_school(self, school):
+        rng = self.rng
+        first_year, first_month = self.months[0]
+        self.bulk_create(DiscountConfig, [
+            DiscountConfig(school=school, name='discount', value=SCHOOL_SETTINGS_DEFAULTS.discount),
+            DiscountConfig(school=school, name='start_month', value=first_month),
+            DiscountConfig(school=school, name='start_year', value=first_year),
+        ])
+
+        courses = self.bulk_create(Course, [
+            Course(school=school, name=name, price=price)
+            for name, price in (('حفظ', 150), ('تجويد', 200), ('تلاوة', 100))
+        ])
+
+        teachers = self.bulk_create(Teacher, [
+            Teacher(
+                school=school,
+                id_number=self.unique_id_number(),
+                name=self.person_name(),
+                phone=self.phone(),
+                gender=rng.choice('MF'),
+                marital_status=rng.choice('SM'),
+                qualification='Quran Teacher',
+            )
+            for _i in range(self.options['groups'])
+        ])
+
+        groups = self.bulk_create(ClassGroup, [
+            ClassGroup(
+                school=school,
+                name=f"Group {index + 1}",
+                course=rng.choice(courses),
+                teacher=teacher,
+                start_time=dt_time(13 + index % 6),
+                end_time=dt_time(15 + index % 6),
+            )
+            for index, teacher in enumerate(teachers)
+        ])
+
+        for group in groups:
+            self.generate_group(school, group)
+
+    def generate_group(self, school, group):
+        rng = self.rng
+        options = self.options
+        codes = Student.allocate_codes(options['students'])
+        names = [self.person_name() for _code in codes]
+        students = self.bulk_create(Student, [
+            Student(
+                school=school,
+                id_number=self.unique_id_number(),
+                name=name,
+                search_name=normalize_search_text(name),
+                code=code,
+                gender=rng.choice('MF'),
+                birth_date=date(rng.randrange(2005, 2020), rng.randrange(1, 13), rng.randrange(1, 29)),
+                academic_year=rng.choice(ACADEMIC_YEARS),
+                level=str(rng.randrange(1, 31)),
+                group=group,
+                phone=self.phone(),
+                parent_profession=rng.choice(PROFESSIONS),
+                discount_type=rng.choices(['none', 'discount', 'full'], weights=[85, 10, 5])[0],
+            )
+            for code, name in zip(codes, names)
+        ])
+
+        attendances, monthly, invoices = [], [], []
+        for year, month in self.months:
+            school_days = [
+                date(year, month, day)
+                for day in range(1, calendar.monthrange(year, month)[1] + 1)
+                if date(year, month, day).weekday() in SCHOOL_WEEKDAYS and date(year, month, day) <= self.today
+            ]
+            for student in students:
+                bits = 0
+                for day in school_days:
+                    present = rng.random() < options['attendance_rate']
+                    attendances.append(Attendance(school=school, student=student, date=day, present=present))
+                    if present:
+                        bits |= 1 << (day.day - 1)
+                monthly.append(MonthlyAttendance(school=school, student=student, year=year, month=month, present_days=bits))
+
+                if student.discount_type == 'full' or rng.random() >= options['payment_rate']:
+                    continue
+                amount = group.course.price
+                if student.discount_type == 'discount':
+                    amount -= SCHOOL_SETTINGS_DEFAULTS.discount
+                invoices.append(Invoice(
+                    school=school,
+                    student=student,
+                    date=self.invoice_date(year, month),
+                    month=month,
+                    year=year,
+                    amount=amount,
+                ))
+
+            if len(attendances) >= BATCH_SIZE:
+                self.bulk_create(Attendance, attendances)
+                attendances = []
+
+        self.bulk_create(Attendance, attendances)
+        self.bulk_create(MonthlyAttendance, monthly)
+        self.bulk_create(Invoice, invoices)
+
+        # bulk_create skips the post_save signal that creates payment statuses
+        self.bulk_create(StudentPaymentStatus, [
+            StudentPaymentStatus(
+                school=school,
+                student=invoice.student,
+                invoice=invoice,
+                month=invoice.month,
+                year=invoice.year,
+                is_paid=True,
+            )
+            for invoice in invoices
+        ])
+
+    def invoice_date(self, year, month):
+        """Usually paid in the billed month, sometimes one month late (never in the future)."""
+        if self.rng.random() < 0.1:
+            year, month = (year, month + 1) if month < 12 else (year + 1, 1)
+        last_day = calendar.monthrange(year, month)[1]
+        paid = date(year, month, self.rng.randrange(1, last_day + 1))
+        return min(paid, self.today)
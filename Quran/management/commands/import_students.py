@@ -0,0 +1,127 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import django
+from django.core.management.base import BaseCommand, CommandError
+from Quran.importers import flag_foreign_ids, import_students, parse_workbook
+from Quran.models import School, Course, Student
+
+WORKBOOK_SUFFIXES = ('.xlsx', '.xlsm')
+
+
+class Command(BaseCommand):
+    help = (
+        'Import the students of schools from Excel workbooks. Workbooks are parsed in parallel '
+        'and written one school at a time. With several workbooks, each file name must start '
+        'with a school code, e.g. "asheer_students.xlsx" for the school with code "asheer".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Excel workbooks or directories of workbooks, one student per row after the header')
+        parser.add_argument('--school', type=int, help='School id of a single workbook, defaults to the first school')
+        parser.add_argument('--course', type=int, help='Course id of new groups, defaults to the school\'s first course')
+        parser.add_argument('--full', action='store_true', help='Rewrite every row, even those unchanged since the last import')
+        parser.add_argument('--workers', type=int, help='Parsing processes, defaults to one per workbook up to the CPU count')
+
+    def handle(self, *args, **options):
+        workbooks = self.workbook_paths(options['paths'])
+        schools = self.resolve_schools(workbooks, options['school'])
+        courses = {}
+        for path, school in schools.items():
+            course = Course.objects.filter(school=school)
+            course = course.filter(pk=options['course']) if options['course'] else course.order_by('pk')
+            courses[path] = course.first()
+            if not courses[path]:
+                raise CommandError(f"School or Course not found for {path.name}")
+
+        parsed = self.parse(workbooks, options['workers'])
+
+        # Writes stay sequential: one school, one transaction at a time
+        results = []
+        for path in workbooks:
+            school = schools[path]
+            foreign_ids = set(Student.objects.exclude(school=school).values_list('id_number', flat=True))
+            students, issues = flag_foreign_ids(*parsed[path], foreign_ids)
+            result = import_students(school, courses[path], students, issues, full=options['full'])
+            results.append(result)
+            self.report(path, school, result)
+
+        if len(results) > 1:
+            self.report_totals(results)
+
+    def workbook_paths(self, paths):
+        workbooks = []
+        for path in map(Path, paths):
+            if path.is_dir():
+                workbooks.extend(sorted(
+                    child for child in path.iterdir()
+                    if child.suffix.lower() in WORKBOOK_SUFFIXES and not child.name.startswith('~$')
+                ))
+            elif path.is_file():
+                workbooks.append(path)
+            else:
+                raise CommandError(f"Workbook not found: {path}")
+        if not workbooks:
+            raise CommandError("No workbooks found")
+        return workbooks
+
+    def resolve_schools(self, workbooks, school_id):
+        if len(workbooks) == 1:
+            school = School.objects.filter(pk=school_id).first() if school_id else School.objects.first()
+            if not school:
+                raise CommandError("School or Course not found")
+            return {workbooks[0]: school}
+        if school_id:
+            raise CommandError("--school only applies to a single workbook")
+
+        codes = {school.code.casefold(): school for school in School.objects.all()}
+        schools = {}
+        for path in workbooks:
+            stem = path.stem.casefold()
+            school = codes.get(stem) or codes.get(stem.split('_')[0])
+            if not school:
+                raise CommandError(f"No school code matches workbook {path.name}")
+            schools[path] = school
+        return schools
+
+    def parse(self, workbooks, workers):
+        workers = workers or min(len(workbooks), os.cpu_count() or 1)
+        if workers <= 1:
+            return {path: parse_workbook(path) for path in workbooks}
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+            return dict(zip(workbooks, executor.map(parse_workbook, workbooks)))
+
+    def report(self, path, school, result):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n📘 {school} ({path.name})"))
+        self.stdout.write(
+            f"✅ Teachers created: {result['teachers_created']}, ClassGroups created: {result['groups_created']}"
+        )
+        self.stdout.write(f"🗑 Deleted {result['deleted']} students without relations")
+        self.stdout.write(f"\n✅ Students created: {result['created']}")
+        self.stdout.write(f"♻️ Students updated: {result['updated']}")
+        self.stdout.write(f"⏸ Students unchanged: {result['unchanged']}")
+
+        if result['issues']:
+            self.stdout.write("\n⚠️ Rows with auto-filled defaults:\n")
+            for issue in result['issues']:
+                self.stdout.write(
+                    f"Row {issue['row']} | "
+                    f"Name: {issue['student_name']} | "
+                    f"Defaulted: {', '.join(issue['missing'])}"
+                )
+        else:
+            self.stdout.write("✅ No missing values detected.")
+
+    def report_totals(self, results):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n📊 Totals for {len(results)} workbooks"))
+        for key in ('created', 'updated', 'unchanged', 'deleted'):
+            self.stdout.write(f"Students {key}: {sum(result[key] for result in results)}")
+
+        issue_counts = {}
+        for result in results:
+            for issue in result['issues']:
+                for column in issue['missing']:
+                    issue_counts[column] = issue_counts.get(column, 0) + 1
+        self.stdout.write(f"Rows with defaults: {sum(len(result['issues']) for result in results)}")
+        for column, count in sorted(issue_counts.items(), key=lambda item: -item[1]):
+            self.stdout.write(f"    {column}: {count}")
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from Quran.services import current_academic_year, promote_academic_year
+
+
+class Command(BaseCommand):
+    help = 'Move students one academic year up, once per school and academic year'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, help='Academic year to promote into (year it starts), defaults to the current one')
+        parser.add_argument('--school', type=int, action='append', dest='schools', help='Only promote this school id (repeatable)')
+        parser.add_argument('--dry-run', action='store_true', help='Show what would change without writing')
+
+    def handle(self, *args, **options):
+        academic_year = options['year'] or current_academic_year()
+        dry_run = options['dry_run']
+
+        results = promote_academic_year(
+            academic_year=academic_year,
+            school_ids=options['schools'],
+            dry_run=dry_run,
+        )
+
+        prefix = '[dry-run] ' if dry_run else ''
+        for result in results:
+            school = result['school']
+            if result['status'] == 'skipped':
+                self.stdout.write(f"{prefix}{school}: already promoted for {academic_year}")
+            elif result['status'] == 'baseline':
+                self.stdout.write(f"{prefix}{school}: no previous promotion, recorded {academic_year} as baseline")
+            else:
+                total = sum(result['counts'].values())
+                self.stdout.write(self.style.SUCCESS(f"{prefix}{school}: promoted {total} students to {academic_year}"))
+                for academic_year_name, count in result['counts'].items():
+                    self.stdout.write(f"    {academic_year_name}: {count}")
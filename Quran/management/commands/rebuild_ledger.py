@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from Quran.services import rebuild_ledger
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the monthly financial ledger used by the summary report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', type=int, action='append', dest='schools', help='Only rebuild this school id (repeatable)')
+
+    def handle(self, *args, **options):
+        months = rebuild_ledger(school_ids=options['schools'])
+        self.stdout.write(self.style.SUCCESS(f'Ledger rebuilt for {months} school month(s).'))
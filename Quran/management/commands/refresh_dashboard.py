@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from Quran.services import refresh_dashboard
+
+
+class Command(BaseCommand):
+    help = 'Recompute the dashboard snapshot of every school (run daily, and after bulk data changes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', type=int, action='append', dest='schools', help='Only refresh this school id (repeatable)')
+
+    def handle(self, *args, **options):
+        schools = refresh_dashboard(school_ids=options['schools'])
+        self.stdout.write(self.style.SUCCESS(f'Dashboard refreshed for {schools} school(s).'))
@@ -0,0 +1,69 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection
+from Quran.jobs import claim_job, fail_stale_jobs, purge_jobs, run_job_in_worker
+
+# Seconds between two purges of old jobs
+PURGE_INTERVAL = 60 * 60
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued background jobs (large exports). The queue is the BackgroundJob table, '
+        'no broker needed; several workers can share it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Jobs run at the same time')
+        parser.add_argument('--processes', action='store_true', help='Run jobs in processes instead of threads, for CPU-heavy exports')
+        parser.add_argument('--poll', type=float, default=2, help='Seconds between checks of an empty queue')
+        parser.add_argument('--once', action='store_true', help='Run the queued jobs, then exit')
+
+    def handle(self, *args, **options):
+        workers = max(options['workers'], 1)
+        stale = fail_stale_jobs()
+        if stale:
+            self.stdout.write(self.style.WARNING(f"Marked {stale} stale jobs as failed"))
+
+        if options['processes']:
+            # Spawned, so workers never share the connection of this process
+            executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup)
+        else:
+            executor = ThreadPoolExecutor(workers)
+
+        running = {}
+        purged_at = 0
+        with executor:
+            while True:
+                if time.monotonic() - purged_at > PURGE_INTERVAL:
+                    purge_jobs()
+                    purged_at = time.monotonic()
+
+                for future, job_id in list(running.items()):
+                    if future.done():
+                        del running[future]
+                        self.report(job_id, future)
+
+                while len(running) < workers:
+                    job_id = claim_job()
+                    if job_id is None:
+                        break
+                    running[executor.submit(run_job_in_worker, job_id)] = job_id
+
+                if options['once'] and not running:
+                    break
+                # Threads use their own connections, this one only polls
+                connection.close()
+                time.sleep(options['poll'] if len(running) < workers else 0.2)
+
+    def report(self, job_id, future):
+        try:
+            status = future.result()
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Job {job_id} crashed the worker: {e}"))
+            return
+        style = self.style.SUCCESS if status == 'done' else self.style.ERROR
+        self.stdout.write(style(f"Job {job_id}: {status}"))
@@ -0,0 +1,135 @@
+import heapq
+import random
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+# Sampled request profiles of this process, newest last
+_profiles = deque(maxlen=getattr(settings, 'PROFILING_BUFFER_SIZE', 500))
+_profiles_lock = threading.Lock()
+
+
+def recent_profiles():
+    """Return the sampled request profiles of this worker process, newest first."""
+    with _profiles_lock:
+        return list(reversed(_profiles))
+
+
+def clear_profiles():
+    with _profiles_lock:
+        _profiles.clear()
+
+
+def summarize_profiles(profiles):
+    """Aggregate profiles per view: requests, average/max wall time, average queries and SQL time."""
+    views = {}
+    for profile in profiles:
+        view = views.setdefault(profile['view'], {
+            'view': profile['view'],
+            'requests': 0,
+            'total_ms': 0,
+            'max_ms': 0,
+            'queries': 0,
+            'sql_ms': 0,
+        })
+        view['requests'] += 1
+        view['total_ms'] += profile['total_ms']
+        view['max_ms'] = max(view['max_ms'], profile['total_ms'])
+        view['queries'] += profile['queries']
+        view['sql_ms'] += profile['sql_ms']
+
+    summary = []
+    for view in views.values():
+        count = view['requests']
+        summary.append({
+            'view': view['view'],
+            'requests': count,
+            'avg_ms': round(view['total_ms'] / count, 1),
+            'max_ms': view['max_ms'],
+            'avg_queries': round(view['queries'] / count, 1),
+            'avg_sql_ms': round(view['sql_ms'] / count, 1),
+        })
+    return sorted(summary, key=lambda view: view['avg_ms'], reverse=True)
+
+
+class QueryRecorder:
+    """Database execute wrapper counting queries and keeping the slowest ones."""
+
+    def __init__(self, top_n):
+        self.top_n = top_n
+        self.count = 0
+        self.total = 0.0
+        self.slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.total += duration
+            entry = (duration, self.count, sql)
+            if len(self.slowest) < self.top_n:
+                heapq.heappush(self.slowest, entry)
+            elif self.top_n:
+                heapq.heappushpop(self.slowest, entry)
+
+
+class RequestProfilingMiddleware:
+    """
+    Opt-in (PROFILING_ENABLED) timing of every request: wall time, query count,
+    SQL time and the slowest statements. Numbers are sent in a Server-Timing header;
+    a PROFILING_SAMPLE_RATE fraction of requests is kept in a bounded in-memory
+    buffer shown on the staff performance page.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.top_n = settings.PROFILING_TOP_QUERIES
+
+    def __call__(self, request):
+        recorder = QueryRecorder(self.top_n)
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        total_ms = round(total * 1000, 1)
+        sql_ms = round(recorder.total * 1000, 1)
+        response['Server-Timing'] = (
+            f'total;dur={total_ms}, '
+            f'db;dur={sql_ms};desc="{recorder.count} queries"'
+        )
+
+        if random.random() < self.sample_rate:
+            match = request.resolver_match
+            profile = {
+                'time': timezone.now(),
+                'method': request.method,
+                'path': request.path,
+                'view': (match.view_name if match else None) or request.path,
+                'status': response.status_code,
+                'total_ms': total_ms,
+                'queries': recorder.count,
+                'sql_ms': sql_ms,
+                'slowest': [
+                    {'ms': round(duration * 1000, 1), 'sql': sql}
+                    for duration, _, sql in sorted(recorder.slowest, reverse=True)
+                ],
+            }
+            with _profiles_lock:
+                _profiles.append(profile)
+
+        return response
+
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.4 on 2026-10-18 04:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_monthly_attendance(apps, schema_editor):
+    Attendance = apps.get_model('Quran', 'Attendance')
+    MonthlyAttendance = apps.get_model('Quran', 'MonthlyAttendance')
+
+    bitmaps = {}
+    for school_id, student_id, day in (
+        Attendance.objects.filter(present=True).order_by().values_list('school_id', 'student_id', 'date').iterator()
+    ):
+        key = (school_id, student_id, day.year, day.month)
+        bitmaps[key] = bitmaps.get(key, 0) | (1 << (day.day - 1))
+
+    MonthlyAttendance.objects.bulk_create(
+        [
+            MonthlyAttendance(school_id=school_id, student_id=student_id, year=year, month=month, present_days=bits)
+            for (school_id, student_id, year, month), bits in bitmaps.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Quran', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyAttendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField(verbose_name='Year')),
+                ('month', models.PositiveIntegerField(verbose_name='Month')),
+                ('present_days', models.IntegerField(default=0, verbose_name='Present Days')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_attendances', to='Quran.school', verbose_name='School')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_attendances', to='Quran.student', verbose_name='Student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['school', 'year', 'month'], name='Quran_month_school__3561e5_idx')],
+                'unique_together': {('student', 'year', 'month')},
+            },
+        ),
+        migrations.RunPython(build_monthly_attendance, migrations.RunPython.noop),
+    ]
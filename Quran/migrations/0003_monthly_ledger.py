@@ -0,0 +1,67 @@
+# Generated by Django 5.0.4 on 2026-10-18 04:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_monthly_ledger(apps, schema_editor):
+    StudentPaymentStatus = apps.get_model('Quran', 'StudentPaymentStatus')
+    MonthlyLedger = apps.get_model('Quran', 'MonthlyLedger')
+
+    ledgers = {}
+    for school_id, group_id, discount_type, day, month, year, amount in (
+        StudentPaymentStatus.objects.filter(
+            is_paid=True,
+            student__is_active=True,
+            student__group__isnull=False,
+            student__discount_type__in=['none', 'discount'],
+        ).order_by().values_list(
+            'invoice__school_id', 'student__group_id', 'student__discount_type',
+            'invoice__date', 'invoice__month', 'invoice__year', 'invoice__amount',
+        ).iterator()
+    ):
+        key = (school_id, group_id, day.year, day.month)
+        ledger = ledgers.setdefault(key, MonthlyLedger(
+            school_id=school_id, group_id=group_id, year=day.year, month=day.month
+        ))
+        prefix = 'paid' if discount_type == 'none' else 'discount'
+        period = 'current' if (year, month) == (day.year, day.month) else 'previous'
+        field = f'{prefix}_{period}'
+        setattr(ledger, field, getattr(ledger, field) + 1)
+        setattr(ledger, f'{field}_amount', getattr(ledger, f'{field}_amount') + amount)
+
+    MonthlyLedger.objects.bulk_create(ledgers.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Quran', '0002_monthly_attendance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField(verbose_name='Year')),
+                ('month', models.PositiveIntegerField(verbose_name='Month')),
+                ('paid_current', models.PositiveIntegerField(default=0, verbose_name='Paid Current')),
+                ('paid_current_amount', models.IntegerField(default=0, verbose_name='Paid Current Amount')),
+                ('paid_previous', models.PositiveIntegerField(default=0, verbose_name='Paid Previous')),
+                ('paid_previous_amount', models.IntegerField(default=0, verbose_name='Paid Previous Amount')),
+                ('discount_current', models.PositiveIntegerField(default=0, verbose_name='Discount Current')),
+                ('discount_current_amount', models.IntegerField(default=0, verbose_name='Discount Current Amount')),
+                ('discount_previous', models.PositiveIntegerField(default=0, verbose_name='Discount Previous')),
+                ('discount_previous_amount', models.IntegerField(default=0, verbose_name='Discount Previous Amount')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_ledgers', to='Quran.classgroup', verbose_name='Group')),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_ledgers', to='Quran.school', verbose_name='School')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['school', 'year', 'month'], name='Quran_month_school__bb0607_idx')],
+                'unique_together': {('group', 'year', 'month')},
+            },
+        ),
+        migrations.RunPython(build_monthly_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.4 on 2026-10-18 04:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Quran', '0004_code_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AcademicYearPromotion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('academic_year', models.PositiveIntegerField(verbose_name='Academic Year')),
+                ('students', models.PositiveIntegerField(default=0, verbose_name='Promoted Students')),
+                ('promoted_at', models.DateTimeField(auto_now_add=True, verbose_name='Promoted At')),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='academic_year_promotions', to='Quran.school', verbose_name='School')),
+            ],
+            options={
+                'unique_together': {('school', 'academic_year')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.4 on 2026-10-18 04:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Quran', '0005_academic_year_promotion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentImportHash',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('id_number', models.CharField(max_length=14, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=16, verbose_name='Content Hash')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_import_hashes', to='Quran.school', verbose_name='School')),
+            ],
+            options={
+                'unique_together': {('school', 'id_number')},
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.4 on 2026-10-18 04:42
+
+import re
+
+from django.db import migrations, models
+
+# Frozen copy of Quran.models.normalize_search_text as of this migration
+ARABIC_DIACRITICS = re.compile('[\u0610-\u061a\u0640\u064b-\u065f\u0670\u06d6-\u06ed]')
+ARABIC_LETTER_FORMS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه',
+    'ى': 'ي',
+    'ؤ': 'و', 'ئ': 'ي',
+})
+
+
+def normalize_search_text(text):
+    text = ARABIC_DIACRITICS.sub('', str(text or '')).translate(ARABIC_LETTER_FORMS).casefold()
+    return ' '.join(text.split())
+
+
+def fill_search_names(apps, schema_editor):
+    Student = apps.get_model('Quran', 'Student')
+    students = list(Student.objects.only('id', 'name'))
+    for student in students:
+        student.search_name = normalize_search_text(student.name)
+    Student.objects.bulk_update(students, ['search_name'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Quran', '0006_student_import_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='search_name',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=100, verbose_name='Search Name'),
+        ),
+        migrations.RunPython(fill_search_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.4 on 2026-10-18 04:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Quran', '0007_student_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['updated_at', 'id'], name='Quran_stude_updated_46d847_idx'),
+        ),
+    ]
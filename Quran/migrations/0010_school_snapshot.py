@@ -0,0 +1,32 @@
+# Generated by Django 5.0.4 on 2026-10-18 05:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Quran', '0009_background_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchoolSnapshot',
+            fields=[
+                ('school', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='Quran.school', verbose_name='School')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('active_students', models.PositiveIntegerField(default=0, verbose_name='Active Students')),
+                ('attendance_present', models.PositiveIntegerField(default=0, verbose_name='Present Today')),
+                ('attendance_recorded', models.PositiveIntegerField(default=0, verbose_name='Attendance Recorded Today')),
+                ('collected_amount', models.IntegerField(default=0, verbose_name='Collected Amount')),
+                ('expected_amount', models.IntegerField(default=0, verbose_name='Expected Amount')),
+                ('unpaid_students', models.PositiveIntegerField(default=0, verbose_name='Unpaid Students')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['school', 'date'], name='Quran_atten_school__a8da58_idx'),
+        ),
+    ]
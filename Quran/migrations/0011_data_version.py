@@ -0,0 +1,34 @@
+# Generated by Django 5.0.4 on 2026-10-18 05:19
+
+from django.db import migrations, models
+
+
+def move_school_data_versions(apps, schema_editor):
+    # The versions used to be CodeSequence rows
+    CodeSequence = apps.get_model('Quran', 'CodeSequence')
+    DataVersion = apps.get_model('Quran', 'DataVersion')
+    sequences = CodeSequence.objects.filter(name__startswith='school_data:')
+    DataVersion.objects.bulk_create(
+        [DataVersion(name=sequence.name, value=sequence.next_index) for sequence in sequences]
+    )
+    sequences.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Quran', '0010_school_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Name')),
+                ('value', models.PositiveBigIntegerField(default=0, verbose_name='Value')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+            ],
+        ),
+        migrations.RunPython(move_school_data_versions, migrations.RunPython.noop),
+    ]
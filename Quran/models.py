@@ -1,5 +1,9 @@
-import random
-from django.db import models
+import re
+from typing import NamedTuple
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F
+from django.core.cache import cache
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
@@ -49,12 +53,40 @@ ACADEMIC_YEAR_CHOICES = [
     ('graduate', _('Graduate')),
 ]
 
+# -------------------------
+# Search
+# -------------------------
+
+# Harakat, Quranic marks and tatweel
+ARABIC_DIACRITICS = re.compile('[\u0610-\u061a\u0640\u064b-\u065f\u0670\u06d6-\u06ed]')
+# Letter forms people write interchangeably: hamza/madda alef, ta marbuta, alef maqsura, hamza seats
+ARABIC_LETTER_FORMS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه',
+    'ى': 'ي',
+    'ؤ': 'و', 'ئ': 'ي',
+})
+
+
+def normalize_search_text(text):
+    """Name as stored in the search index: no diacritics, unified letter forms, single spaces."""
+    text = ARABIC_DIACRITICS.sub('', str(text or '')).translate(ARABIC_LETTER_FORMS).casefold()
+    return ' '.join(text.split())
+
+
 DISCOUNT_TYPE_CHOICES = [
     ('none', _('No discount')),
     ('discount', _('Have discount')),
     ('full', _('Full discount')),
 ]
 
+JOB_STATUS_CHOICES = [
+    ('pending', _('Pending')),
+    ('running', _('Running')),
+    ('done', _('Done')),
+    ('failed', _('Failed')),
+]
+
 # -------------------------
 # Models
 # -------------------------
@@ -73,6 +105,48 @@ class School(models.Model):
         verbose_name = _("School")
         verbose_name_plural = _("Schools")
 
+    @staticmethod
+    def scope_version_name(user_id):
+        return f"user_schools:{user_id}"
+
+    @classmethod
+    def ids_for_user(cls, user):
+        """
+        Return the sorted ids of the schools of a user, every school for superusers.
+        Cached under the user's scope version, a DataVersion row bumped by School.users
+        changes and by schools created or deleted, so every process sees a change at once.
+        """
+        name = cls.scope_version_name('all' if user.is_superuser else user.pk)
+        key = f"{name}:{DataVersion.current(name)}"
+        school_ids = cache.get(key)
+        if school_ids is None:
+            schools = cls.objects.all() if user.is_superuser else cls.objects.filter(users=user)
+            school_ids = sorted(schools.values_list('pk', flat=True))
+            cache.set(key, school_ids, None)
+        return school_ids
+
+    @classmethod
+    def bump_scope_version(cls, *user_ids):
+        """Change the scope version of users ('all' for superusers), in the transaction of the change."""
+        DataVersion.bump(*(cls.scope_version_name(user_id) for user_id in set(user_ids)))
+
+    @staticmethod
+    def data_version_name(school_id):
+        return f"school_data:{school_id}"
+
+    @classmethod
+    def data_version(cls, school_id):
+        """
+        Return the version of the report data of a school, part of the report cache keys.
+        Kept in the database (a DataVersion row), so every process sees a committed bump.
+        """
+        return DataVersion.current(cls.data_version_name(school_id))
+
+    @classmethod
+    def bump_data_version(cls, *school_ids):
+        """Change the data version of schools, in the transaction of the change, so their cached reports are rebuilt."""
+        DataVersion.bump(*(cls.data_version_name(school_id) for school_id in set(school_ids)))
+
 
 class Teacher(models.Model):
     school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='teachers', verbose_name=_("School"))
@@ -138,21 +212,110 @@ class Student(models.Model):
     discount_type = models.CharField(max_length=10, choices=DISCOUNT_TYPE_CHOICES, default='none', verbose_name=_("Discount Type"))
     is_active = models.BooleanField(default=True, verbose_name=_("Active"))
     registration_date = models.DateTimeField(default=timezone.now, verbose_name=_("Registration Date"))
+    search_name = models.CharField(max_length=100, blank=True, editable=False, db_index=True, verbose_name=_("Search Name"))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of the student list
+            models.Index(fields=['updated_at', 'id']),
+        ]
+
     def __str__(self):
         return f"{self.name}"
 
     def save(self, *args, **kwargs):
         if not self.code:
             self.code = self.generate_unique_code()
+        self.search_name = normalize_search_text(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'search_name'}
         super().save(*args, **kwargs)
 
     def generate_unique_code(self):
-        while True:
-            code = str(random.randint(1000, 9999))
-            if not Student.objects.filter(code=code).exists():
-                return code
+        return Student.allocate_codes(1)[0]
+
+    @classmethod
+    def allocate_codes(cls, count):
+        """
+        Reserve `count` unused student codes from the shared code sequence.
+        Codes start at STUDENT_CODE_WIDTH digits and grow one digit when a width is used up.
+        """
+        codes = []
+        while len(codes) < count:
+            candidates = [
+                code_for_index(index)
+                for index in CodeSequence.reserve('student_code', count - len(codes))
+            ]
+            # Skip codes given before the sequence existed
+            taken = set(cls.objects.filter(code__in=candidates).values_list('code', flat=True))
+            codes.extend(code for code in candidates if code not in taken)
+        return codes
+
+
+# Consecutive indexes are spread over the code space (multiplier is coprime with 9 * 10^n)
+CODE_MULTIPLIER = 7919
+CODE_OFFSET = 4409
+
+
+def code_for_index(index):
+    """Map a sequence index to a unique numeric code, one digit wider when a width is used up."""
+    width = settings.STUDENT_CODE_WIDTH
+    max_width = Student._meta.get_field('code').max_length
+    while True:
+        space = 9 * 10 ** (width - 1)
+        if index < space:
+            break
+        index -= space
+        width += 1
+    if width > max_width:
+        raise ValidationError(_("No student codes left."))
+    return str(10 ** (width - 1) + (CODE_MULTIPLIER * index + CODE_OFFSET) % space)
+
+
+class CodeSequence(models.Model):
+    name = models.CharField(max_length=50, unique=True, verbose_name=_("Name"))
+    next_index = models.PositiveBigIntegerField(default=0, verbose_name=_("Next Index"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
+
+    def __str__(self):
+        return f"{self.name} - {self.next_index}"
+
+    @classmethod
+    def reserve(cls, name, count):
+        """Reserve `count` consecutive indexes of a sequence and return them as a range."""
+        with transaction.atomic():
+            cls.objects.get_or_create(name=name)
+            # The UPDATE takes the write lock before the value is read back
+            cls.objects.filter(name=name).update(next_index=F('next_index') + count)
+            end = cls.objects.filter(name=name).values_list('next_index', flat=True).get()
+        return range(end - count, end)
+
+
+class DataVersion(models.Model):
+    """A counter of changes to some data, part of the cache keys of what is derived from it."""
+    name = models.CharField(max_length=50, unique=True, verbose_name=_("Name"))
+    value = models.PositiveBigIntegerField(default=0, verbose_name=_("Value"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
+
+    def __str__(self):
+        return f"{self.name} - {self.value}"
+
+    @classmethod
+    def current(cls, name):
+        return cls.objects.filter(name=name).values_list('value', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls, *names):
+        """Increment versions. Missing rows are created at 0 then incremented, so concurrent bumps all count."""
+        names = set(names)
+        if not names:
+            return
+        missing = names - set(cls.objects.filter(name__in=names).values_list('name', flat=True))
+        if missing:
+            cls.objects.bulk_create([cls(name=name) for name in missing], ignore_conflicts=True)
+        cls.objects.filter(name__in=names).update(value=F('value') + 1)
 
 
 class Invoice(models.Model):
@@ -177,12 +340,7 @@ class Invoice(models.Model):
         if student.discount_type == 'full':
             return 0
         elif student.discount_type == 'discount':
-            discount_value_obj, _ = DiscountConfig.objects.get_or_create(
-                school=student.school,
-                name='discount',
-                defaults={'value': 30}
-            )
-            discount_value = discount_value_obj.value
+            discount_value = DiscountConfig.for_school(student.school_id).discount
             return base_price - discount_value
         return base_price
 
@@ -215,6 +373,32 @@ class Attendance(models.Model):
     class Meta:
         unique_together = ('student', 'date')
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['school', 'date']),
+        ]
+
+
+class MonthlyAttendance(models.Model):
+    """Rollup of a student's attendance in one month, bit (day - 1) is set when present."""
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='monthly_attendances', verbose_name=_("School"))
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='monthly_attendances', verbose_name=_("Student"))
+    year = models.PositiveIntegerField(verbose_name=_("Year"))
+    month = models.PositiveIntegerField(verbose_name=_("Month"))
+    present_days = models.IntegerField(default=0, verbose_name=_("Present Days"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
+
+    class Meta:
+        unique_together = ('student', 'year', 'month')
+        indexes = [
+            models.Index(fields=['school', 'year', 'month']),
+        ]
+
+    def is_present(self, day):
+        return bool(self.present_days >> (day - 1) & 1)
+
+    @property
+    def total_present(self):
+        return self.present_days.bit_count()
 
 
 class StudentPaymentStatus(models.Model):
@@ -229,6 +413,129 @@ class StudentPaymentStatus(models.Model):
     class Meta:
         unique_together = ('student', 'month', 'year')
 
+class MonthlyLedger(models.Model):
+    """Paid invoices of a group issued in one month, split by discount type and billed month."""
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='monthly_ledgers', verbose_name=_("School"))
+    group = models.ForeignKey(ClassGroup, on_delete=models.CASCADE, related_name='monthly_ledgers', verbose_name=_("Group"))
+    year = models.PositiveIntegerField(verbose_name=_("Year"))
+    month = models.PositiveIntegerField(verbose_name=_("Month"))
+    paid_current = models.PositiveIntegerField(default=0, verbose_name=_("Paid Current"))
+    paid_current_amount = models.IntegerField(default=0, verbose_name=_("Paid Current Amount"))
+    paid_previous = models.PositiveIntegerField(default=0, verbose_name=_("Paid Previous"))
+    paid_previous_amount = models.IntegerField(default=0, verbose_name=_("Paid Previous Amount"))
+    discount_current = models.PositiveIntegerField(default=0, verbose_name=_("Discount Current"))
+    discount_current_amount = models.IntegerField(default=0, verbose_name=_("Discount Current Amount"))
+    discount_previous = models.PositiveIntegerField(default=0, verbose_name=_("Discount Previous"))
+    discount_previous_amount = models.IntegerField(default=0, verbose_name=_("Discount Previous Amount"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
+
+    class Meta:
+        unique_together = ('group', 'year', 'month')
+        indexes = [
+            models.Index(fields=['school', 'year', 'month']),
+        ]
+
+
+class SchoolSnapshot(models.Model):
+    """
+    Dashboard figures of a school on `date`: today's attendance and the revenue of its month.
+    Kept current by signals and the bulk services, recomputed by refresh_dashboard.
+    """
+    school = models.OneToOneField(School, on_delete=models.CASCADE, primary_key=True, related_name='snapshot', verbose_name=_("School"))
+    date = models.DateField(verbose_name=_("Date"))
+    active_students = models.PositiveIntegerField(default=0, verbose_name=_("Active Students"))
+    attendance_present = models.PositiveIntegerField(default=0, verbose_name=_("Present Today"))
+    attendance_recorded = models.PositiveIntegerField(default=0, verbose_name=_("Attendance Recorded Today"))
+    collected_amount = models.IntegerField(default=0, verbose_name=_("Collected Amount"))
+    expected_amount = models.IntegerField(default=0, verbose_name=_("Expected Amount"))
+    unpaid_students = models.PositiveIntegerField(default=0, verbose_name=_("Unpaid Students"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
+
+    def __str__(self):
+        return f"{self.school} - {self.date}"
+
+    @property
+    def attendance_rate(self):
+        if not self.attendance_recorded:
+            return None
+        return round(self.attendance_present * 100 / self.attendance_recorded)
+
+    @property
+    def collection_rate(self):
+        if not self.expected_amount:
+            return None
+        return round(self.collected_amount * 100 / self.expected_amount)
+
+
+class AcademicYearPromotion(models.Model):
+    """Academic years whose promotion was applied to a school (the year the academic year starts)."""
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='academic_year_promotions', verbose_name=_("School"))
+    academic_year = models.PositiveIntegerField(verbose_name=_("Academic Year"))
+    students = models.PositiveIntegerField(default=0, verbose_name=_("Promoted Students"))
+    promoted_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Promoted At"))
+
+    class Meta:
+        unique_together = ('school', 'academic_year')
+
+    def __str__(self):
+        return f"{self.school} - {self.academic_year}"
+
+
+class StudentImportHash(models.Model):
+    """Content hash of the workbook row a student was last imported from."""
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='student_import_hashes', verbose_name=_("School"))
+    id_number = models.CharField(max_length=14, verbose_name=_("ID"))
+    content_hash = models.CharField(max_length=16, verbose_name=_("Content Hash"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
+
+    class Meta:
+        unique_together = ('school', 'id_number')
+
+    def __str__(self):
+        return f"{self.school} - {self.id_number}"
+
+
+class BackgroundJob(models.Model):
+    """A long-running task (e.g. a large export) queued for the run_jobs worker, see Quran.jobs."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='background_jobs', verbose_name=_("User"))
+    kind = models.CharField(max_length=50, verbose_name=_("Kind"))
+    params = models.JSONField(default=dict, blank=True, verbose_name=_("Parameters"))
+    status = models.CharField(max_length=10, choices=JOB_STATUS_CHOICES, default='pending', verbose_name=_("Status"))
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name=_("Progress"))
+    file_name = models.CharField(max_length=255, blank=True, verbose_name=_("File Name"))
+    file_path = models.CharField(max_length=255, blank=True, verbose_name=_("File Path"))
+    error = models.TextField(blank=True, verbose_name=_("Error"))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
+    started_at = models.DateTimeField(blank=True, null=True, verbose_name=_("Started At"))
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name=_("Finished At"))
+    # Heartbeat of the worker, touched on every progress update
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
+
+    class Meta:
+        verbose_name = _("Background Job")
+        verbose_name_plural = _("Background Jobs")
+        indexes = [
+            # Workers pick the oldest pending job
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in ('done', 'failed')
+
+
+class SchoolSettings(NamedTuple):
+    discount: int
+    start_month: int
+    start_year: int
+
+
+SCHOOL_SETTINGS_DEFAULTS = SchoolSettings(discount=30, start_month=1, start_year=2026)
+
+
 class DiscountConfig(models.Model):
     school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='discount_configs', verbose_name=_("School"))
     name = models.CharField(max_length=50, verbose_name=_("Discount Name"))
@@ -242,3 +549,31 @@ class DiscountConfig(models.Model):
     def __str__(self):
         return f"{self.name} - {self.value}"
 
+    @staticmethod
+    def cache_key(school_id):
+        return f"school_settings:{school_id}"
+
+    @classmethod
+    def for_school(cls, school_id):
+        """
+        Return the SchoolSettings of a school, loaded with one query and cached.
+        Names missing from the table fall back to SCHOOL_SETTINGS_DEFAULTS.
+        """
+        key = cls.cache_key(school_id)
+        settings = cache.get(key)
+        if settings is None:
+            values = SCHOOL_SETTINGS_DEFAULTS._asdict()
+            values.update(
+                (name, int(value))
+                for name, value in cls.objects.filter(
+                    school_id=school_id,
+                    name__in=SchoolSettings._fields,
+                ).values_list('name', 'value')
+            )
+            settings = SchoolSettings(**values)
+            cache.set(key, settings, None)
+        return settings
+
+    @classmethod
+    def clear_cache(cls, school_id):
+        cache.delete(cls.cache_key(school_id))
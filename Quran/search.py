@@ -0,0 +1,111 @@
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from Quran.models import Student, normalize_search_text
+
+SEARCH_TABLE = 'quran_student_search'
+STUDENT_TABLE = Student._meta.db_table
+
+# External-content FTS5 table over Quran_student.search_name; the triggers keep it in
+# sync with every write, including bulk_create/bulk_update and raw updates.
+SEARCH_INDEX_SQL = {
+    SEARCH_TABLE: f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+            search_name, content='{STUDENT_TABLE}', content_rowid='id'
+        )
+    """,
+    f'{SEARCH_TABLE}_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert AFTER INSERT ON {STUDENT_TABLE} BEGIN
+            INSERT INTO {SEARCH_TABLE}(rowid, search_name) VALUES (new.id, new.search_name);
+        END
+    """,
+    f'{SEARCH_TABLE}_delete': f"""
+        CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete AFTER DELETE ON {STUDENT_TABLE} BEGIN
+            INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, search_name) VALUES ('delete', old.id, old.search_name);
+        END
+    """,
+    f'{SEARCH_TABLE}_update': f"""
+        CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_update AFTER UPDATE OF search_name ON {STUDENT_TABLE} BEGIN
+            INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, search_name) VALUES ('delete', old.id, old.search_name);
+            INSERT INTO {SEARCH_TABLE}(rowid, search_name) VALUES (new.id, new.search_name);
+        END
+    """,
+}
+
+_index_available = {}
+
+
+def ensure_search_index(using=DEFAULT_DB_ALIAS):
+    """
+    Create the FTS5 table and its triggers when missing, then rebuild the index.
+    Runs after every migrate, since SQLite drops the triggers whenever a migration
+    rebuilds the student table. Returns whether the index is available.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+
+    with connection.cursor() as cursor:
+        names = ", ".join(f"'{name}'" for name in SEARCH_INDEX_SQL)
+        cursor.execute(f"SELECT name FROM sqlite_master WHERE name IN ({names})")
+        existing = {name for (name,) in cursor.fetchall()}
+        if existing != set(SEARCH_INDEX_SQL):
+            try:
+                for sql in SEARCH_INDEX_SQL.values():
+                    cursor.execute(sql)
+            except OperationalError:
+                # SQLite built without FTS5
+                return False
+            cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+
+    _index_available[using] = True
+    return True
+
+
+def search_index_available(using=DEFAULT_DB_ALIAS):
+    if using not in _index_available:
+        connection = connections[using]
+        available = False
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [SEARCH_TABLE])
+                available = cursor.fetchone() is not None
+        _index_available[using] = available
+    return _index_available[using]
+
+
+def search_students(queryset, query):
+    """
+    Students of `queryset` matching `query`, best matches first.
+
+    Digits search student codes by prefix. Otherwise every word must start a word of
+    the student's name, ignoring diacritics and hamza/alef, ta marbuta and alef
+    maqsura forms. Uses the FTS5 index, or a LIKE search of search_name without it.
+    Names starting with the first word rank first, then names in order.
+    """
+    query = (query or '').strip()
+    if query.isdigit():
+        return queryset.filter(code__startswith=query).order_by('code')
+
+    words = normalize_search_text(query).split()
+    if not words:
+        return queryset
+
+    if search_index_available(queryset.db):
+        # A subquery rather than a join: SQLite would otherwise probe the index once per student
+        match = " AND ".join('"{}"*'.format(word.replace('"', '""')) for word in words)
+        queryset = queryset.filter(pk__in=RawSQL(
+            f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s", [match]
+        ))
+    else:
+        for word in words:
+            queryset = queryset.filter(Q(search_name__startswith=word) | Q(search_name__contains=f" {word}"))
+
+    # Names starting with the first word come first
+    return queryset.annotate(
+        search_rank=Case(
+            When(search_name__startswith=words[0], then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+    ).order_by('search_rank', 'name')
@@ -1,34 +1,506 @@
 
-from Quran.models import Student
-
-
-def handle_academic_year():
-    ACADEMIC_YEAR_UPGRADE = {
-        'pre_primary': 'primary_1',
-        'primary_1': 'primary_2',
-        'primary_2': 'primary_3',
-        'primary_3': 'primary_4',
-        'primary_4': 'primary_5',
-        'primary_5': 'primary_6',
-        'primary_6': 'middle_1',
-        'middle_1': 'middle_2',
-        'middle_2': 'middle_3',
-        'middle_3': 'high_1',
-        'high_1': 'high_2',
-        'high_2': 'high_3',
-        'high_3': 'university_1',
-        'university_1': 'university_2',
-        'university_2': 'university_3',
-        'university_3': 'university_4',
-        'university_4': 'graduate',
-        'graduate': 'graduate',
-    }
-    students = Student.objects.all()
-    for student in students:
-        current_year = student.academic_year
-        next_year = ACADEMIC_YEAR_UPGRADE.get(current_year)
-        if next_year:
-            student.academic_year = next_year
-            student.save()
+import calendar
+from datetime import date
+from django.db import transaction
+from django.db.models import BooleanField, Case, Count, Max, Q, Sum, Value, When
+from django.utils import timezone
+from Quran.models import (
+    School, Student, Attendance, MonthlyAttendance, MonthlyLedger, StudentPaymentStatus, Invoice, AcademicYearPromotion,
+    DiscountConfig, SchoolSnapshot,
+)
+
+
+ACADEMIC_YEAR_UPGRADE = {
+    'pre_primary': 'primary_1',
+    'primary_1': 'primary_2',
+    'primary_2': 'primary_3',
+    'primary_3': 'primary_4',
+    'primary_4': 'primary_5',
+    'primary_5': 'primary_6',
+    'primary_6': 'middle_1',
+    'middle_1': 'middle_2',
+    'middle_2': 'middle_3',
+    'middle_3': 'high_1',
+    'high_1': 'high_2',
+    'high_2': 'high_3',
+    'high_3': 'university_1',
+    'university_1': 'university_2',
+    'university_2': 'university_3',
+    'university_3': 'university_4',
+    'university_4': 'graduate',
+}
+
+INVOICE_BATCH_SIZE = 500
+
+# Parts of a SchoolSnapshot that can be refreshed on their own
+SNAPSHOT_PARTS = ('students', 'attendance', 'revenue')
+
+
+def current_academic_year(today=None):
+    """Year in which the current academic year started (it starts on 1 September)."""
+    today = today or date.today()
+    return today.year if today.month >= 9 else today.year - 1
+
+
+def promote_academic_year(academic_year, school_ids=None, dry_run=False):
+    """
+    Move the students of each school one academic year up, once per academic year.
+    A school without any promotion record only gets a baseline record, its students
+    are assumed to be registered with their current year.
+    Returns one dict per school: school, status ('promoted', 'baseline', 'skipped') and counts.
+    """
+    schools = School.objects.order_by('id')
+    if school_ids:
+        schools = schools.filter(id__in=school_ids)
+
+    last_promotions = dict(
+        AcademicYearPromotion.objects.filter(school__in=schools)
+        .values('school_id')
+        .annotate(last=Max('academic_year'))
+        .values_list('school_id', 'last')
+    )
+
+    results = []
+    for school in schools:
+        last = last_promotions.get(school.id)
+        counts = dict(
+            Student.objects.filter(school=school, academic_year__in=ACADEMIC_YEAR_UPGRADE)
+            .order_by()
+            .values('academic_year')
+            .annotate(total=Count('id'))
+            .values_list('academic_year', 'total')
+        )
+        if last is not None and last >= academic_year:
+            status = 'skipped'
+        elif last is None:
+            status = 'baseline'
         else:
-            pass
+            status = 'promoted'
+
+        if not dry_run and status != 'skipped':
+            with transaction.atomic():
+                promoted = 0
+                if status == 'promoted':
+                    # Highest year first, so no student moves twice
+                    now = timezone.now()
+                    for current_year, next_year in reversed(ACADEMIC_YEAR_UPGRADE.items()):
+                        promoted += Student.objects.filter(
+                            school=school,
+                            academic_year=current_year,
+                        ).update(academic_year=next_year, updated_at=now)
+                AcademicYearPromotion.objects.create(
+                    school=school,
+                    academic_year=academic_year,
+                    students=promoted,
+                )
+
+        results.append({
+            'school': school,
+            'status': status,
+            'counts': counts if status == 'promoted' else {},
+        })
+
+    return results
+
+
+def save_group_attendance(school_ids, selected_date, student_ids, present_ids):
+    """
+    Save the attendance of many students for one date in a single transaction.
+    Only rows whose `present` value changed are written.
+    Raises Student.DoesNotExist if a student is not in the user's schools.
+    """
+    student_ids = {int(student_id) for student_id in student_ids}
+    present_ids = {int(student_id) for student_id in present_ids}
+    result = {"created": 0, "updated": 0, "unchanged": 0}
+    if not student_ids:
+        return result
+
+    with transaction.atomic():
+        # Load all submitted students at once, limited to the user's schools
+        students = dict(
+            Student.objects.filter(
+                id__in=student_ids,
+                school_id__in=school_ids,
+            ).values_list('id', 'school_id')
+        )
+        if len(students) != len(student_ids):
+            raise Student.DoesNotExist("Student not found.")
+
+        # Existing records for that date
+        existing = {
+            student_id: (attendance_id, present)
+            for attendance_id, student_id, present in Attendance.objects.filter(
+                student_id__in=student_ids,
+                date=selected_date,
+            ).order_by().values_list('id', 'student_id', 'present')
+        }
+
+        to_create = []
+        set_present, set_absent = [], []
+        for student_id, school_id in students.items():
+            present = student_id in present_ids
+            if student_id not in existing:
+                to_create.append(Attendance(
+                    school_id=school_id,
+                    student_id=student_id,
+                    date=selected_date,
+                    present=present,
+                ))
+            elif existing[student_id][1] != present:
+                (set_present if present else set_absent).append(existing[student_id][0])
+            else:
+                result["unchanged"] += 1
+
+        # Insert new rows, a concurrent insert of the same (student, date) is overwritten
+        if to_create:
+            Attendance.objects.bulk_create(
+                to_create,
+                update_conflicts=True,
+                unique_fields=['student', 'date'],
+                update_fields=['present', 'updated_at'],
+            )
+            result["created"] = len(to_create)
+
+        # Update changed rows, one statement per value
+        now = timezone.now()
+        for ids, present in ((set_present, True), (set_absent, False)):
+            if ids:
+                result["updated"] += Attendance.objects.filter(id__in=ids).update(present=present, updated_at=now)
+
+        # Keep the monthly rollup and cached reports in sync (bulk writes bypass the signals)
+        if result["created"] or result["updated"]:
+            selected_date = Attendance._meta.get_field('date').to_python(selected_date)
+            refresh_monthly_attendance(students, selected_date.year, selected_date.month)
+            School.bump_data_version(*students.values())
+            if selected_date == timezone.localdate():
+                for school_id in set(students.values()):
+                    refresh_school_snapshot(school_id, ['attendance'])
+
+    return result
+
+
+def refresh_monthly_attendance(students, year, month):
+    """
+    Recompute the MonthlyAttendance bitmaps of the given students for one month.
+    `students` maps student id to school id.
+    """
+    date_from = date(year, month, 1)
+    date_to = date(year, month, calendar.monthrange(year, month)[1])
+
+    bitmaps = dict.fromkeys(students, 0)
+    for student_id, day in Attendance.objects.filter(
+        student_id__in=list(students),
+        date__range=(date_from, date_to),
+        present=True,
+    ).order_by().values_list('student_id', 'date'):
+        bitmaps[student_id] |= 1 << (day.day - 1)
+
+    MonthlyAttendance.objects.bulk_create(
+        [
+            MonthlyAttendance(
+                school_id=students[student_id],
+                student_id=student_id,
+                year=year,
+                month=month,
+                present_days=bits,
+            )
+            for student_id, bits in bitmaps.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['student', 'year', 'month'],
+        update_fields=['present_days', 'updated_at'],
+    )
+
+
+def refresh_ledger(school_id, year, month):
+    """
+    Recompute the MonthlyLedger rows of a school for invoices issued in one month.
+    Same rules as the summary report: paid statuses of active students, split by
+    discount type and by whether the invoice bills the issue month or an older one.
+    """
+    date_from = date(year, month, 1)
+    date_to = date(year, month, calendar.monthrange(year, month)[1])
+
+    rows = (
+        StudentPaymentStatus.objects.filter(
+            is_paid=True,
+            student__is_active=True,
+            student__group__isnull=False,
+            student__discount_type__in=['none', 'discount'],
+            invoice__school_id=school_id,
+            invoice__date__range=(date_from, date_to),
+        )
+        .annotate(
+            is_current=Case(
+                When(invoice__month=month, invoice__year=year, then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            )
+        )
+        .order_by()
+        .values('student__group_id', 'student__discount_type', 'is_current')
+        .annotate(count=Count('id'), amount=Sum('invoice__amount'))
+    )
+
+    ledgers = {}
+    for row in rows:
+        group_id = row['student__group_id']
+        ledger = ledgers.setdefault(group_id, MonthlyLedger(
+            school_id=school_id, group_id=group_id, year=year, month=month
+        ))
+        prefix = 'paid' if row['student__discount_type'] == 'none' else 'discount'
+        field = f"{prefix}_{'current' if row['is_current'] else 'previous'}"
+        setattr(ledger, field, row['count'])
+        setattr(ledger, f'{field}_amount', row['amount'] or 0)
+
+    with transaction.atomic():
+        MonthlyLedger.objects.filter(school_id=school_id, year=year, month=month).delete()
+        MonthlyLedger.objects.bulk_create(ledgers.values())
+
+
+def rebuild_ledger(school_ids=None):
+    """Recompute every MonthlyLedger month that has invoices. Returns the number of months."""
+    invoices = Invoice.objects.all()
+    if school_ids:
+        invoices = invoices.filter(school_id__in=school_ids)
+
+    months = set()
+    for school_id, day in invoices.order_by().values_list('school_id', 'date').distinct():
+        months.add((school_id, day.year, day.month))
+
+    with transaction.atomic():
+        # Drop months that no longer have invoices
+        stale = MonthlyLedger.objects.all()
+        if school_ids:
+            stale = stale.filter(school_id__in=school_ids)
+        stale.delete()
+
+        for school_id, year, month in sorted(months):
+            refresh_ledger(school_id, year, month)
+
+        School.bump_data_version(*(school_ids or School.objects.values_list('pk', flat=True)))
+
+    return len(months)
+
+
+def refresh_ledger_for_student(student_id):
+    """Recompute the ledger months touched by a student's invoices."""
+    months = {
+        (school_id, day.year, day.month)
+        for school_id, day in Invoice.objects.filter(
+            student_id=student_id
+        ).order_by().values_list('school_id', 'date').distinct()
+    }
+    for school_id, year, month in months:
+        refresh_ledger(school_id, year, month)
+
+
+def create_invoices(invoices):
+    """
+    Save new invoices together with their paid payment statuses, in batches and in one transaction.
+    The bulk counterpart of Invoice.objects.create(), whose post_save signal creates the status:
+    an invoice whose (student, month, year) is already invoiced, or repeats an earlier invoice of
+    the list, is skipped, and the ledger and cached reports are refreshed. Returns the created invoices.
+    """
+    created = []
+    seen = set()
+    with transaction.atomic():
+        for start in range(0, len(invoices), INVOICE_BATCH_SIZE):
+            batch = invoices[start:start + INVOICE_BATCH_SIZE]
+
+            # One existence query per batch, unique_together(student, month, year)
+            seen.update(
+                Invoice.objects.filter(
+                    student_id__in={invoice.student_id for invoice in batch},
+                    month__in={invoice.month for invoice in batch},
+                    year__in={invoice.year for invoice in batch},
+                ).values_list('student_id', 'month', 'year')
+            )
+            new = []
+            for invoice in batch:
+                key = (invoice.student_id, int(invoice.month), int(invoice.year))
+                if key not in seen:
+                    seen.add(key)
+                    new.append(invoice)
+            if not new:
+                continue
+
+            Invoice.objects.bulk_create(new)
+            # Like the signal's get_or_create, an existing status of the month is kept
+            StudentPaymentStatus.objects.bulk_create(
+                [
+                    StudentPaymentStatus(
+                        school_id=invoice.school_id,
+                        student_id=invoice.student_id,
+                        invoice=invoice,
+                        month=invoice.month,
+                        year=invoice.year,
+                        is_paid=True,
+                    )
+                    for invoice in new
+                ],
+                ignore_conflicts=True,
+            )
+            created.extend(new)
+
+        # bulk_create skips the signals refreshing the ledger and cached reports
+        date_field = Invoice._meta.get_field('date')
+        months = set()
+        for invoice in created:
+            day = date_field.to_python(invoice.date)
+            months.add((invoice.school_id, day.year, day.month))
+        for school_id, year, month in sorted(months):
+            refresh_ledger(school_id, year, month)
+        school_ids = {school_id for school_id, _year, _month in months}
+        School.bump_data_version(*school_ids)
+        for school_id in school_ids:
+            refresh_school_snapshot(school_id, ['revenue'])
+
+    return created
+
+
+def create_monthly_invoices(school_ids, month, year, group_id=None, issued=None):
+    """
+    Invoice every eligible student of the schools (or of one of their groups) for a month,
+    with create_invoices. Eligible students are active, in a group and not fully exempt,
+    priced like Invoice.calculate_expected_amount. Students already invoiced for the month
+    are skipped. Returns the created invoices and the number of skipped students.
+    """
+    issued = issued or timezone.localdate()
+    students = Student.objects.filter(
+        school_id__in=school_ids,
+        is_active=True,
+        group__isnull=False,
+    ).exclude(discount_type='full')
+    if group_id:
+        students = students.filter(group_id=group_id)
+
+    invoices = [
+        Invoice(
+            school_id=student.school_id,
+            student=student,
+            date=issued,
+            month=month,
+            year=year,
+            amount=Invoice.calculate_expected_amount(student),
+        )
+        for student in students.select_related('group__course').order_by('group_id', 'name')
+    ]
+    created = create_invoices(invoices)
+    return {"invoices": created, "skipped": len(invoices) - len(created)}
+
+
+def school_snapshot_values(school_id, parts, today):
+    """SchoolSnapshot fields of some parts, a few aggregate queries per part."""
+    values = {}
+    if 'students' in parts:
+        values['active_students'] = Student.objects.filter(school_id=school_id, is_active=True).count()
+
+    if 'attendance' in parts:
+        counts = Attendance.objects.filter(school_id=school_id, date=today).aggregate(
+            recorded=Count('id'),
+            present=Count('id', filter=Q(present=True)),
+        )
+        values['attendance_recorded'] = counts['recorded']
+        values['attendance_present'] = counts['present']
+
+    if 'revenue' in parts:
+        # Students billed every month, priced like Invoice.calculate_expected_amount
+        billed = Student.objects.filter(
+            school_id=school_id,
+            is_active=True,
+            group__isnull=False,
+        ).exclude(discount_type='full')
+        expected = billed.aggregate(
+            price=Sum('group__course__price'),
+            discounted=Count('id', filter=Q(discount_type='discount')),
+        )
+        values['expected_amount'] = (expected['price'] or 0) - expected['discounted'] * DiscountConfig.for_school(school_id).discount
+        values['collected_amount'] = Invoice.objects.filter(
+            school_id=school_id,
+            month=today.month,
+            year=today.year,
+        ).aggregate(total=Sum('amount'))['total'] or 0
+        values['unpaid_students'] = billed.exclude(
+            id__in=StudentPaymentStatus.objects.filter(
+                school_id=school_id,
+                month=today.month,
+                year=today.year,
+                is_paid=True,
+            ).values('student_id')
+        ).count()
+
+    return values
+
+
+def refresh_school_snapshot(school_id, parts=SNAPSHOT_PARTS, today=None):
+    """
+    Recompute some parts of a school's dashboard snapshot. Partial refreshes only update
+    today's snapshot: a missing or older one is rebuilt in full when the dashboard needs it.
+    """
+    today = today or timezone.localdate()
+    if set(parts) != set(SNAPSHOT_PARTS):
+        snapshot = SchoolSnapshot.objects.filter(school_id=school_id, date=today)
+        if snapshot.exists():
+            snapshot.update(updated_at=timezone.now(), **school_snapshot_values(school_id, parts, today))
+        return
+
+    values = school_snapshot_values(school_id, SNAPSHOT_PARTS, today)
+    SchoolSnapshot.objects.bulk_create(
+        [SchoolSnapshot(school_id=school_id, date=today, **values)],
+        update_conflicts=True,
+        unique_fields=['school'],
+        update_fields=['date', *values, 'updated_at'],
+    )
+
+
+class SchoolChanges:
+    """on_commit callback of the changes to a school in a transaction, see record_school_change."""
+
+    def __init__(self, school_id):
+        self.school_id = school_id
+        self.data_version = False
+        self.parts = set()
+
+    def __call__(self):
+        if self.data_version:
+            School.bump_data_version(self.school_id)
+        if self.parts:
+            refresh_school_snapshot(self.school_id, [part for part in SNAPSHOT_PARTS if part in self.parts])
+
+
+def record_school_change(school_id, parts=(), data_version=True):
+    """
+    Bump the data version of a school and refresh some parts of its snapshot after a change.
+    In a transaction both run once per school when it commits, with the parts of every
+    change, so reports cached while it was open are rebuilt too; a rollback drops them.
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        if data_version:
+            School.bump_data_version(school_id)
+        if parts:
+            refresh_school_snapshot(school_id, parts)
+        return
+
+    # The pending callbacks belong to the transaction, a rollback discards them
+    changes = next((
+        callback for _savepoint_ids, callback, _robust in connection.run_on_commit
+        if isinstance(callback, SchoolChanges) and callback.school_id == school_id
+    ), None)
+    if changes is None:
+        changes = SchoolChanges(school_id)
+        transaction.on_commit(changes)
+    changes.data_version |= data_version
+    changes.parts.update(parts)
+
+
+def refresh_dashboard(school_ids=None, today=None):
+    """Recompute the snapshots of all schools (or some). Returns the number of schools."""
+    schools = School.objects.order_by('pk')
+    if school_ids:
+        schools = schools.filter(pk__in=school_ids)
+    school_ids = list(schools.values_list('pk', flat=True))
+    for school_id in school_ids:
+        refresh_school_snapshot(school_id, today=today)
+    return len(school_ids)
@@ -1,21 +1,205 @@
-from django.db.models.signals import post_save
+from contextlib import contextmanager
+from threading import local
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, post_migrate, m2m_changed
 from django.dispatch import receiver
-from .models import Invoice, StudentPaymentStatus
+from django.utils import timezone
+from .models import Invoice, School, Student, StudentPaymentStatus, Attendance, DiscountConfig, ClassGroup, Course, Teacher
+from .services import refresh_monthly_attendance, refresh_ledger, refresh_ledger_for_student, record_school_change
+from .search import ensure_search_index
+
+
+# Schools whose per-row report and snapshot updates are suspended, per thread
+_suspended = local()
+
+
+@contextmanager
+def school_updates_suspended(*school_ids):
+    """
+    Skip the per-row data version bumps and snapshot refreshes of some schools, for bulk
+    operations sending one signal per row. The caller refreshes them once afterwards.
+    """
+    previous = getattr(_suspended, 'school_ids', frozenset())
+    _suspended.school_ids = previous | set(school_ids)
+    try:
+        yield
+    finally:
+        _suspended.school_ids = previous
+
+
+def school_updates_are_suspended(school_id):
+    return school_id in getattr(_suspended, 'school_ids', ())
 
 
 @receiver(post_save, sender=Invoice)
 def create_payment_status_for_invoice(sender, instance, created, **kwargs):
+    # Single saves only, bulk invoicing goes through services.create_invoices
     if not created:
         return
 
     # Avoid duplicates because of unique_together(student, month, year)
-    StudentPaymentStatus.objects.get_or_create(
-        student=instance.student,
-        school=instance.school,
-        month=instance.month,
-        year=instance.year,
-        defaults={
-            "invoice": instance,
-            "is_paid": True,
-        }
-    )
+    # The report and snapshot updates of the invoice itself cover the new status
+    with school_updates_suspended(instance.school_id):
+        StudentPaymentStatus.objects.get_or_create(
+            student=instance.student,
+            school=instance.school,
+            month=instance.month,
+            year=instance.year,
+            defaults={
+                "invoice": instance,
+                "is_paid": True,
+            }
+        )
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+def update_monthly_attendance(sender, instance, **kwargs):
+    day = Attendance._meta.get_field('date').to_python(instance.date)
+    refresh_monthly_attendance({instance.student_id: instance.school_id}, day.year, day.month)
+
+
+@receiver(post_save, sender=DiscountConfig)
+@receiver(post_delete, sender=DiscountConfig)
+def clear_school_settings_cache(sender, instance, **kwargs):
+    DiscountConfig.clear_cache(instance.school_id)
+
+
+@receiver(m2m_changed, sender=School.users.through)
+def bump_user_scope_version(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        # pk_set is None on clear, remember the users losing the school
+        instance._cleared_user_ids = list(instance.users.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if reverse:
+            user_ids = [instance.pk]
+        elif action == 'post_clear':
+            user_ids = getattr(instance, '_cleared_user_ids', [])
+        else:
+            user_ids = pk_set
+        School.bump_scope_version(*user_ids)
+
+
+@receiver(post_save, sender=School)
+def bump_created_school_scope_version(sender, instance, created, **kwargs):
+    if created:
+        School.bump_scope_version('all')
+
+
+@receiver(pre_delete, sender=School)
+def bump_deleted_school_scope_version(sender, instance, **kwargs):
+    School.bump_scope_version('all', *instance.users.values_list('pk', flat=True))
+
+
+# Models shown in the summary and attendance reports
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_save, sender=StudentPaymentStatus)
+@receiver(post_delete, sender=StudentPaymentStatus)
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+@receiver(post_save, sender=ClassGroup)
+@receiver(post_delete, sender=ClassGroup)
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+def bump_report_data_version(sender, instance, **kwargs):
+    if not school_updates_are_suspended(instance.school_id):
+        record_school_change(instance.school_id)
+
+
+@receiver(pre_delete, sender=School)
+def bump_deleted_school_data_version(sender, instance, **kwargs):
+    # SQLite may reuse the id, the next school with it must not hit the old reports
+    School.bump_data_version(instance.pk)
+
+
+@receiver(pre_save, sender=Invoice)
+def remember_invoice_ledger_month(sender, instance, **kwargs):
+    instance._ledger_values = None
+    if instance.pk:
+        instance._ledger_values = Invoice.objects.filter(pk=instance.pk).values_list('school_id', 'date').first()
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+def update_ledger_for_invoice(sender, instance, created=False, **kwargs):
+    # New invoices are counted when their payment status is saved
+    if created:
+        return
+    day = Invoice._meta.get_field('date').to_python(instance.date)
+    refresh_ledger(instance.school_id, day.year, day.month)
+
+    # The invoice moved to another month or school
+    old_values = getattr(instance, '_ledger_values', None)
+    if old_values and (old_values[0], old_values[1].year, old_values[1].month) != (instance.school_id, day.year, day.month):
+        refresh_ledger(old_values[0], old_values[1].year, old_values[1].month)
+
+
+@receiver(post_save, sender=StudentPaymentStatus)
+@receiver(post_delete, sender=StudentPaymentStatus)
+def update_ledger_for_payment_status(sender, instance, **kwargs):
+    invoice = Invoice.objects.filter(pk=instance.invoice_id).values('school_id', 'date').first()
+    if invoice:
+        refresh_ledger(invoice['school_id'], invoice['date'].year, invoice['date'].month)
+
+
+# Fields of Student the ledger depends on
+LEDGER_STUDENT_FIELDS = ('group_id', 'discount_type', 'is_active')
+
+
+@receiver(pre_save, sender=Student)
+def remember_student_ledger_fields(sender, instance, **kwargs):
+    instance._ledger_values = None
+    if instance.pk:
+        instance._ledger_values = Student.objects.filter(pk=instance.pk).values_list(*LEDGER_STUDENT_FIELDS).first()
+
+
+@receiver(post_save, sender=Student)
+def update_ledger_for_student(sender, instance, created, **kwargs):
+    old_values = getattr(instance, '_ledger_values', None)
+    if created or old_values is None:
+        return
+    if old_values != tuple(getattr(instance, field) for field in LEDGER_STUDENT_FIELDS):
+        refresh_ledger_for_student(instance.pk)
+
+
+# Parts of the dashboard snapshot each model changes
+SNAPSHOT_PARTS_BY_MODEL = {
+    Student: ('students', 'revenue'),
+    Attendance: ('attendance',),
+    Invoice: ('revenue',),
+    StudentPaymentStatus: ('revenue',),
+    ClassGroup: ('revenue',),
+    Course: ('revenue',),
+    DiscountConfig: ('revenue',),
+}
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_save, sender=StudentPaymentStatus)
+@receiver(post_delete, sender=StudentPaymentStatus)
+@receiver(post_save, sender=ClassGroup)
+@receiver(post_delete, sender=ClassGroup)
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=DiscountConfig)
+@receiver(post_delete, sender=DiscountConfig)
+def update_school_snapshot(sender, instance, created=False, **kwargs):
+    if school_updates_are_suspended(instance.school_id):
+        return
+    # Only today's attendance is shown
+    if sender is Attendance and Attendance._meta.get_field('date').to_python(instance.date) != timezone.localdate():
+        return
+    record_school_change(instance.school_id, SNAPSHOT_PARTS_BY_MODEL[sender], data_version=False)
+
+
+@receiver(post_migrate)
+def create_student_search_index(sender, using, **kwargs):
+    if sender.name == 'Quran':
+        ensure_search_index(using)
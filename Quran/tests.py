@@ -1,3 +1,1290 @@
-from django.test import TestCase
+import csv
+import os
+import sqlite3
+import tempfile
+from datetime import date, time, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from Quran.models import (
+    School, Student, Teacher, Course, ClassGroup, Attendance, MonthlyAttendance, MonthlyLedger, Invoice, StudentPaymentStatus,
+    DiscountConfig, CodeSequence, DataVersion, AcademicYearPromotion, BackgroundJob, SchoolSnapshot, SCHOOL_SETTINGS_DEFAULTS, code_for_index,
+)
+from Quran.backends.sqlite3.base import DatabaseWrapper
+from Quran.exports import export_table
+from Quran.importers import issue_report, parse_students
+from Quran.jobs import JOB_HANDLERS, claim_job, fail_stale_jobs, run_job
+from Quran.search import search_students
+from Quran.middleware import clear_profiles, recent_profiles, summarize_profiles
+from Quran.services import create_invoices, create_monthly_invoices, rebuild_ledger, refresh_dashboard, save_group_attendance
+from Quran.utils import get_attendance_summary, get_group_roster, get_group_summary, get_missing_months_for_student, get_user_school_ids
+
+
+class QuranTestCase(TestCase):
+    def setUp(self):
+        # Cached values are keyed by ids, which are reused between tests
+        cache.clear()
+
+    def commit(self):
+        """Run the on_commit callbacks pending in the test transaction, as its commit would."""
+        while connection.run_on_commit:
+            _savepoint_ids, callback, _robust = connection.run_on_commit.pop(0)
+            callback()
+
+
+def create_school_data(code="S1"):
+    school = School.objects.create(name=f"School {code}", code=code)
+    teacher = Teacher.objects.create(
+        school=school,
+        id_number=f"{school.id:014d}",
+        name=f"Teacher {code}",
+        phone="01000000000",
+        gender="M",
+        marital_status="S",
+        qualification="Quran Teacher",
+    )
+    course = Course.objects.create(school=school, name="Quran", price=100)
+    group = ClassGroup.objects.create(
+        school=school,
+        course=course,
+        teacher=teacher,
+        start_time=time(13, 0),
+        end_time=time(15, 0),
+    )
+    return school, group
+
+
+def create_students(school, group, count, start=0, **kwargs):
+    students = []
+    for i in range(start, start + count):
+        students.append(Student.objects.create(
+            school=school,
+            group=group,
+            id_number=f"{school.id:02d}{i:012d}",
+            name=f"Student {i:04d}",
+            level="1",
+            phone="01000000000",
+            parent_profession="-",
+            **{'gender': "M", **kwargs},
+        ))
+    return students
+
+
+class GroupRosterTests(QuranTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school, self.group = create_school_data()
+        self.school_ids = [self.school.pk]
+        today = date.today()
+        DiscountConfig.objects.create(school=self.school, name='start_month', value=today.month)
+        DiscountConfig.objects.create(school=self.school, name='start_year', value=today.year)
+
+    def test_roster_matches_per_student_helpers(self):
+        today = date.today()
+        paid, absent, unpaid = create_students(self.school, self.group, 3)
+        create_students(self.school, self.group, 1, start=3, discount_type='full')
+
+        invoice = Invoice.objects.create(
+            school=self.school, student=paid, month=today.month, year=today.year, amount=100
+        )
+        self.assertTrue(StudentPaymentStatus.objects.filter(invoice=invoice).exists())
+        Attendance.objects.create(school=self.school, student=absent, date=today, present=False)
+
+        roster = get_group_roster(school_ids=self.school_ids, group_id=self.group.id, selected_date=today)
+
+        self.assertEqual([r["student_name"] for r in roster], sorted(r["student_name"] for r in roster))
+        for row in roster:
+            student = Student.objects.get(id=row["student_id"])
+            self.assertEqual(row["student_code"], student.code)
+            self.assertEqual(row["status"], get_missing_months_for_student(student))
+            self.assertEqual(row["present"], student.id != absent.id)
+
+    def test_query_count_does_not_grow_with_group_size(self):
+        today = date.today()
+        create_students(self.school, self.group, 3)
+        cache.clear()
+        with self.assertNumQueries(4):
+            roster = get_group_roster(school_ids=self.school_ids, group_id=self.group.id, selected_date=today)
+        self.assertEqual(len(roster), 3)
+
+        create_students(self.school, self.group, 60, start=3)
+        cache.clear()
+        with self.assertNumQueries(4):
+            roster = get_group_roster(school_ids=self.school_ids, group_id=self.group.id, selected_date=today)
+        self.assertEqual(len(roster), 63)
+
+    def test_empty_group_runs_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(get_group_roster(self.school_ids, self.group.id, date.today()), [])
+
+
+class SaveGroupAttendanceTests(QuranTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school, self.group = create_school_data()
+        self.school_ids = [self.school.pk]
+        self.students = create_students(self.school, self.group, 4)
+        self.ids = [s.id for s in self.students]
+
+    def test_only_changed_rows_are_written(self):
+        today = date.today()
+        result = save_group_attendance(self.school_ids, today, self.ids, self.ids[:2])
+        self.assertEqual(result, {"created": 4, "updated": 0, "unchanged": 0})
+        self.assertEqual(Attendance.objects.filter(date=today, present=True).count(), 2)
+
+        result = save_group_attendance(self.school_ids, today, self.ids, self.ids[1:3])
+        self.assertEqual(result, {"created": 0, "updated": 2, "unchanged": 2})
+        self.assertEqual(
+            set(Attendance.objects.filter(date=today, present=True).values_list('student_id', flat=True)),
+            set(self.ids[1:3]),
+        )
+
+        # Unchanged submission: savepoint, two reads, release, no writes
+        with self.assertNumQueries(4):
+            result = save_group_attendance(self.school_ids, today, self.ids, self.ids[1:3])
+        self.assertEqual(result, {"created": 0, "updated": 0, "unchanged": 4})
+
+    def test_students_of_other_schools_are_rejected(self):
+        other_school, other_group = create_school_data(code="S2")
+        other = create_students(other_school, other_group, 1, start=100)[0]
+        with self.assertRaises(Student.DoesNotExist):
+            save_group_attendance(self.school_ids, date.today(), self.ids + [other.id], [])
+        self.assertFalse(Attendance.objects.exists())
+
+
+class MonthlyAttendanceTests(QuranTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school, self.group = create_school_data()
+        self.school_ids = [self.school.pk]
+        self.students = create_students(self.school, self.group, 2)
+
+    def test_rollup_follows_single_and_bulk_writes(self):
+        first, second = self.students
+        attendance = Attendance.objects.create(school=self.school, student=first, date=date(2026, 3, 1))
+        Attendance.objects.create(school=self.school, student=first, date=date(2026, 3, 31))
+        save_group_attendance(self.school_ids, "2026-03-02", [first.id, second.id], [second.id])
+
+        rollup = MonthlyAttendance.objects.get(student=first, year=2026, month=3)
+        self.assertEqual(rollup.present_days, 1 | 1 << 30)
+        self.assertEqual(rollup.total_present, 2)
+        self.assertTrue(MonthlyAttendance.objects.get(student=second, year=2026, month=3).is_present(2))
+
+        attendance.delete()
+        rollup.refresh_from_db()
+        self.assertEqual(rollup.present_days, 1 << 30)
+
+    def test_summary_is_read_from_bitmaps(self):
+        first, second = self.students
+        for day in (1, 2, 5):
+            Attendance.objects.create(school=self.school, student=first, date=date(2026, 2, day))
+        Attendance.objects.create(school=self.school, student=second, date=date(2026, 2, 3), present=False)
+
+        with self.assertNumQueries(2):
+            data = get_attendance_summary(self.school.id, self.group.id, 2, 2026)
+
+        self.assertEqual(len(data['days']), 28)
+        rows = {row['id']: row for row in data['students']}
+        self.assertEqual(rows[first.id]['total_present'], 3)
+        self.assertEqual(
+            [day for day, present in zip(data['days'], rows[first.id]['attendance']) if present], [1, 2, 5]
+        )
+        self.assertEqual(rows[second.id]['total_present'], 0)
+        self.assertEqual(data['stats'], {'total_students': 2, 'avg_attendance': 1.5})
+
+
+class SchoolSettingsCacheTests(QuranTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school, self.group = create_school_data()
+
+    def test_defaults_without_writing(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(DiscountConfig.for_school(self.school.id), SCHOOL_SETTINGS_DEFAULTS)
+        with self.assertNumQueries(0):
+            DiscountConfig.for_school(self.school.id)
+        self.assertFalse(DiscountConfig.objects.exists())
+
+    def test_invalidated_on_save_and_delete(self):
+        DiscountConfig.for_school(self.school.id)
+        config = DiscountConfig.objects.create(school=self.school, name='discount', value=50)
+        self.assertEqual(DiscountConfig.for_school(self.school.id).discount, 50)
+
+        student = create_students(self.school, self.group, 1, discount_type='discount')[0]
+        self.assertEqual(Invoice.calculate_expected_amount(student), 50)
+
+        config.value = 20
+        config.save()
+        self.assertEqual(DiscountConfig.for_school(self.school.id).discount, 20)
+
+        config.delete()
+        self.assertEqual(DiscountConfig.for_school(self.school.id).discount, SCHOOL_SETTINGS_DEFAULTS.discount)
+
+
+class UserSchoolsScopeTests(QuranTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school, self.group = create_school_data()
+        self.other_school, self.other_group = create_school_data("S2")
+        self.user = User.objects.create_user('teacher', 'teacher@example.com', 'password', is_staff=True)
+        self.school.users.add(self.user)
+
+    def test_ids_cached_until_relation_changes(self):
+        self.assertEqual(School.ids_for_user(self.user), [self.school.pk])
+        # Only the scope version is read, the relation is not queried again
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(School.ids_for_user(self.user), [self.school.pk])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('school_users', queries[0]['sql'])
+
+        request = RequestFactory().get('/')
+        request.user = self.user
+        get_user_school_ids(request)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_school_ids(request), [self.school.pk])
+
+    def test_ids_follow_relation_changes(self):
+        self.assertEqual(School.ids_for_user(self.user), [self.school.pk])
+        self.other_school.users.add(self.user)
+        self.assertEqual(School.ids_for_user(self.user), [self.school.pk, self.other_school.pk])
+        self.user.schools.remove(self.school)
+        self.assertEqual(School.ids_for_user(self.user), [self.other_school.pk])
+        self.other_school.users.clear()
+        self.assertEqual(School.ids_for_user(self.user), [])
+        self.user.schools.set([self.school])
+        self.assertEqual(School.ids_for_user(self.user), [self.school.pk])
+
+    def test_superuser_sees_new_and_deleted_schools(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.assertEqual(School.ids_for_user(admin), [self.school.pk, self.other_school.pk])
+        third = School.objects.create(name="School S3", code="S3")
+        self.assertEqual(School.ids_for_user(admin), [self.school.pk, self.other_school.pk, third.pk])
+        third.users.add(self.user)
+        self.assertEqual(School.ids_for_user(self.user), [self.school.pk, third.pk])
+        third.delete()
+        self.assertEqual(School.ids_for_user(admin), [self.school.pk, self.other_school.pk])
+        self.assertEqual(School.ids_for_user(self.user), [self.school.pk])
+
+    def test_list_filters_by_cached_ids(self):
+        create_students(self.school, self.group, 2)
+        create_students(self.other_school, self.other_group, 2, start=2)
+        self.client.force_login(self.user)
+
+        self.client.get(reverse('student_list'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('student_list'))
+        self.assertEqual({student.school_id for student in response.context['students']}, {self.school.pk})
+        self.assertFalse([query for query in queries if 'school_users' in query['sql']])
+
+        # A change made by another process (its own memory cache) bumps the version in the database
+        School.users.through.objects.filter(user=self.user).update(school=self.other_school)
+        School.bump_scope_version(self.user.pk)
+        response = self.client.get(reverse('student_list'))
+        self.assertEqual({student.school_id for student in response.context['students']}, {self.other_school.pk})
+
+
+class MonthlyLedgerTests(QuranTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school, self.group = create_school_data()
+        self.paying = create_students(self.school, self.group, 3)
+        self.discounted = create_students(self.school, self.group, 1, start=10, discount_type='discount')[0]
+        create_students(self.school, self.group, 1, start=20, discount_type='full')
+
+    def create_invoice(self, student, month, year, day, amount=100):
+        return Invoice.objects.create(
+            school=self.school, student=student, month=month, year=year, date=day, amount=amount
+        )
+
+    def test_summary_follows_invoice_writes(self):
+        issued = date(2026, 5, 10)
+        self.create_invoice(self.paying[0], 5, 2026, issued)
+        self.create_invoice(self.paying[1], 4, 2026, issued)
+        self.create_invoice(self.paying[1], 3, 2026, issued)
+        self.create_invoice(self.discounted, 5, 2026, issued, amount=70)
+        late = self.create_invoice(self.paying[2], 5, 2026, date(2026, 6, 2))
+
+        with self.assertNumQueries(2):
+            row, = get_group_summary(self.school.id, 5, 2026)
+        self.assertEqual(row['total_students'], 5)
+        self.assertEqual(row['students_paid_current'], 1)
+        self.assertEqual(row['students_discount_current'], 1)
+        self.assertEqual(row['students_full_discount'], 1)
+        self.assertEqual(row['students_not_paid'], 2)
+        self.assertEqual(row['students_paid_previous'], 2)
+        self.assertEqual(row['total_current_month'], 170)
+        self.assertEqual(row['total_previous_months'], 200)
+        self.assertEqual(row['final_total'], 370)
+
+        # Moving an invoice to the report month and deactivating a student
+        late.date = issued
+        late.save()
+        self.paying[1].is_active = False
+        self.paying[1].save()
+        row, = get_group_summary(self.school.id, 5, 2026)
+        self.assertEqual(row['students_paid_current'], 2)
+        self.assertEqual(row['students_paid_previous'], 0)
+        self.assertEqual(row['final_total'], 270)
+        self.assertFalse(MonthlyLedger.objects.filter(month=6).exists())
+
+        # Deleting an invoice removes its payment status from the ledger
+        late.delete()
+        row, = get_group_summary(self.school.id, 5, 2026)
+        self.assertEqual(row['students_paid_current'], 1)
+
+    def test_rebuild_ledger_command(self):
+        self.create_invoice(self.paying[0], 5, 2026, date(2026, 5, 10))
+        expected = list(get_group_summary(self.school.id, 5, 2026))
+        MonthlyLedger.objects.all().delete()
+
+        call_command('rebuild_ledger', school=[self.school.id], stdout=StringIO())
+        self.assertEqual(list(get_group_summary(self.school.id, 5, 2026)), expected)
+
+
+class ReportCacheTests(QuranTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school, self.group = create_school_data()
+        self.students = create_students(self.school, self.group, 3)
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.user)
+        self.filters = {'school': self.school.id, 'month': 5, 'year': 2026}
+
+    def report_queries(self, table, method, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, params)
+        return response, [query for query in queries if table in query['sql'].lower()]
+
+    def test_summary_served_from_cache_until_invoice(self):
+        url = reverse('summary_report')
+        response, queries = self.report_queries('monthlyledger', 'get', url, self.filters)
+        self.assertTrue(queries)
+        self.assertEqual(response.context['totals']['students_not_paid'], 3)
+
+        response, queries = self.report_queries('monthlyledger', 'get', url, self.filters)
+        self.assertEqual(queries, [])
+        response, queries = self.report_queries('monthlyledger', 'post', url, {**self.filters, 'action': 'csv'})
+        self.assertEqual(queries, [])
+        self.assertEqual(response.status_code, 200)
+
+        Invoice.objects.create(
+            school=self.school, student=self.students[0], month=5, year=2026, date=date(2026, 5, 3), amount=100
+        )
+        self.commit()
+        response, queries = self.report_queries('monthlyledger', 'get', url, self.filters)
+        self.assertTrue(queries)
+        self.assertEqual(response.context['totals']['students_paid_current'], 1)
+
+    def test_attendance_served_from_cache_until_bulk_save(self):
+        url = reverse('monthly_attendance')
+        params = {**self.filters, 'selected_group': self.group.id}
+        self.report_queries('monthlyattendance', 'get', url, params)
+        response, queries = self.report_queries('monthlyattendance', 'get', url, params)
+        self.assertEqual(queries, [])
+        self.assertEqual(response.context['data']['stats']['avg_attendance'], 0)
+
+        save_group_attendance([self.school.id], date(2026, 5, 4), [self.students[0].id], [self.students[0].id])
+        response, queries = self.report_queries('monthlyattendance', 'get', url, params)
+        self.assertTrue(queries)
+        self.assertEqual(response.context['data']['students'][0]['total_present'], 1)
+
+    def test_data_version_shared_through_database(self):
+        version = School.data_version(self.school.id)
+        rebuild_ledger(school_ids=[self.school.id])
+        # Another process has its own memory cache, the version comes from the database
+        cache.clear()
+        self.assertEqual(School.data_version(self.school.id), version + 1)
+        with self.assertNumQueries(1):
+            School.data_version(self.school.id)
+
+    def test_bump_counts_every_change(self):
+        other, _group = create_school_data("S2")
+        # Row inserted by another process that has not incremented it yet
+        DataVersion.objects.filter(name=School.data_version_name(other.id)).delete()
+        DataVersion.objects.create(name=School.data_version_name(other.id))
+        versions = School.data_version(self.school.id), School.data_version(other.id)
+        School.bump_data_version(self.school.id, other.id)
+        School.bump_data_version(other.id)
+        self.assertEqual(School.data_version(self.school.id), versions[0] + 1)
+        self.assertEqual(School.data_version(other.id), versions[1] + 2)
+
+    def test_other_schools_keep_their_cache(self):
+        other, _group = create_school_data("S2")
+        self.commit()
+        versions = School.data_version(self.school.id), School.data_version(other.id)
+        Attendance.objects.create(school=self.school, student=self.students[0], date=date(2026, 5, 4))
+        self.commit()
+        self.assertNotEqual(School.data_version(self.school.id), versions[0])
+        self.assertEqual(School.data_version(other.id), versions[1])
+
+
+class BulkInvoiceTests(QuranTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school, self.group = create_school_data()
+        self.paying = create_students(self.school, self.group, 3)
+        self.discounted = create_students(self.school, self.group, 1, start=10, discount_type='discount')[0]
+        create_students(self.school, self.group, 1, start=20, discount_type='full')
+        create_students(self.school, self.group, 1, start=30, is_active=False)
+        create_students(self.school, None, 1, start=40)
+        self.issued = date(2026, 5, 2)
+
+    def test_invoices_eligible_students_once(self):
+        Invoice.objects.create(
+            school=self.school, student=self.paying[0], month=5, year=2026, date=self.issued, amount=100
+        )
+        result = create_monthly_invoices([self.school.id], 5, 2026, issued=self.issued)
+        self.assertEqual(result['skipped'], 1)
+        self.assertEqual(
+            sorted((invoice.student_id, invoice.amount) for invoice in result['invoices']),
+            [(self.paying[1].id, 100), (self.paying[2].id, 100), (self.discounted.id, 100 - SCHOOL_SETTINGS_DEFAULTS.discount)],
+        )
+        self.assertEqual(StudentPaymentStatus.objects.filter(month=5, year=2026, is_paid=True).count(), 4)
+        row, = get_group_summary(self.school.id, 5, 2026)
+        self.assertEqual(row['students_paid_current'], 3)
+        self.assertEqual(row['students_discount_current'], 1)
+
+        result = create_monthly_invoices([self.school.id], 5, 2026, issued=self.issued)
+        self.assertEqual((result['invoices'], result['skipped']), ([], 4))
+
+    def test_create_invoices_skips_duplicates(self):
+        existing = Invoice.objects.create(
+            school=self.school, student=self.paying[0], month=5, year=2026, date=self.issued, amount=100
+        )
+        # A status left without its own invoice is kept, as with the signal's get_or_create
+        StudentPaymentStatus.objects.create(
+            school=self.school, student=self.paying[1], invoice=existing, month=4, year=2026, is_paid=False
+        )
+
+        def invoice(student, month):
+            return Invoice(school=self.school, student=student, date=self.issued, month=month, year=2026, amount=100)
+
+        created = create_invoices([
+            invoice(self.paying[0], 5),
+            invoice(self.paying[1], 4),
+            invoice(self.paying[1], 5),
+            invoice(self.paying[1], 5),
+        ])
+        self.assertEqual([(item.student_id, item.month) for item in created], [(self.paying[1].id, 4), (self.paying[1].id, 5)])
+        self.assertTrue(all(item.pk for item in created))
+        statuses = dict(
+            StudentPaymentStatus.objects.filter(student=self.paying[1]).values_list('month', 'invoice_id')
+        )
+        self.assertEqual(statuses, {4: existing.id, 5: created[1].id})
+        self.assertEqual(MonthlyLedger.objects.get(month=5).paid_current, 2)
+
+    def test_query_count_does_not_grow_with_students(self):
+        create_monthly_invoices([self.school.id], 4, 2026, issued=self.issued)
+        with CaptureQueriesContext(connection) as small:
+            create_monthly_invoices([self.school.id], 5, 2026, issued=self.issued)
+        create_students(self.school, self.group, 20, start=100)
+        with CaptureQueriesContext(connection) as large:
+            create_monthly_invoices([self.school.id], 6, 2026, issued=self.issued)
+        self.assertEqual(len(large), len(small))
+
+    def test_view_limits_batch_to_user_schools(self):
+        other, other_group = create_school_data("S2")
+        create_students(other, other_group, 2, start=50)
+        user = User.objects.create_user('staff', password='password', is_staff=True)
+        self.school.users.add(user)
+        self.client.force_login(user)
+
+        url = reverse('bulk_invoice')
+        for data in ({'group': other_group.id, 'month': 5, 'year': 2026}, {'school': other.id, 'month': 5, 'year': 2026}):
+            response = self.client.post(url, data)
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(response.context.get('invoices'))
+            self.assertTrue(list(response.context['messages']))
+
+        response = self.client.post(url, {'group': self.group.id, 'month': 5, 'year': 2026})
+        self.assertEqual(len(response.context['invoices']), 4)
+        self.assertEqual(response.context['total_amount'], 400 - SCHOOL_SETTINGS_DEFAULTS.discount)
+        self.assertFalse(Invoice.objects.filter(school=other).exists())
+
+    def test_view_rejects_bad_input(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        url = reverse('bulk_invoice')
+        for data in (
+            {'school': self.school.id, 'year': 2026},
+            {'school': self.school.id, 'month': 'May', 'year': 2026},
+            {'school': self.school.id, 'month': 13, 'year': 2026},
+            {'school': self.school.id, 'month': 5, 'year': ''},
+            {'month': 5, 'year': 2026},
+        ):
+            response = self.client.post(url, data)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(list(response.context['messages']), data)
+            self.assertContains(response, 'alert-danger')
+        response = self.client.post(url, {'month': 5, 'year': 2026})
+        self.assertContains(response, "Select a school or a group.")
+        self.assertFalse(Invoice.objects.exists())
+
+    def test_batch_print_runs_fixed_queries(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        url = reverse('print_invoices')
+        params = {'group': self.group.id, 'month': 5, 'year': 2026}
+        create_monthly_invoices([self.school.id], 5, 2026, issued=self.issued)
+        self.client.get(url, params)
+
+        with CaptureQueriesContext(connection) as small:
+            response = self.client.get(url, params)
+        self.assertEqual(len(response.context['receipts']), 4)
+        create_students(self.school, self.group, 20, start=100)
+        create_monthly_invoices([self.school.id], 5, 2026, issued=self.issued)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url, params)
+        self.assertEqual(len(response.context['receipts']), 24)
+        self.assertEqual(len(large), len(small))
+
+        receipt = response.context['receipts'][0]
+        invoice = Invoice.objects.get(pk=receipt['id'])
+        single = self.client.get(reverse('print_invoice', args=[invoice.id]))
+        self.assertEqual(single.context['receipt'], receipt)
+
+    def test_batch_print_by_ids_limited_to_user_schools(self):
+        other, other_group = create_school_data("S2")
+        other_student, = create_students(other, other_group, 1, start=50)
+        hidden = Invoice.objects.create(school=other, student=other_student, month=5, year=2026, amount=100)
+        invoices = create_monthly_invoices([self.school.id], 5, 2026, issued=self.issued)['invoices']
+        user = User.objects.create_user('staff', password='password', is_staff=True)
+        self.school.users.add(user)
+        self.client.force_login(user)
+
+        url = reverse('print_invoices')
+        response = self.client.get(url, {'ids': f"{invoices[0].id},{invoices[1].id}", 'month': 1})
+        self.assertEqual({receipt['id'] for receipt in response.context['receipts']}, {invoices[0].id, invoices[1].id})
+        response = self.client.get(url, {'ids': [invoices[2].id, hidden.id]})
+        self.assertEqual([receipt['id'] for receipt in response.context['receipts']], [invoices[2].id])
+        self.assertEqual(self.client.get(url, {'month': 5, 'year': 2026}).status_code, 404)
+
+    def test_create_monthly_invoices_command(self):
+        out = StringIO()
+        call_command('create_monthly_invoices', group=self.group.id, month=5, year=2026, stdout=out)
+        self.assertIn("Created 4 invoice(s) for 5/2026", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('create_monthly_invoices', month=5, year=2026, stdout=out)
+
+
+class SchoolSnapshotTests(QuranTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school, self.group = create_school_data()
+        self.paying = create_students(self.school, self.group, 3)
+        self.discounted = create_students(self.school, self.group, 1, start=10, discount_type='discount')[0]
+        create_students(self.school, self.group, 1, start=20, discount_type='full')
+        self.today = timezone.localdate()
+
+    def snapshot(self):
+        return SchoolSnapshot.objects.filter(school=self.school).values(
+            'date', 'active_students', 'attendance_present', 'attendance_recorded',
+            'collected_amount', 'expected_amount', 'unpaid_students',
+        ).first()
+
+    def assertMatchesRecompute(self):
+        self.commit()
+        current = self.snapshot()
+        refresh_dashboard()
+        self.assertEqual(current, self.snapshot())
+        return current
+
+    def test_full_recompute(self):
+        call_command('refresh_dashboard', stdout=StringIO())
+        self.assertEqual(self.snapshot(), {
+            'date': self.today,
+            'active_students': 5,
+            'attendance_present': 0,
+            'attendance_recorded': 0,
+            'collected_amount': 0,
+            'expected_amount': 400 - SCHOOL_SETTINGS_DEFAULTS.discount,
+            'unpaid_students': 4,
+        })
+
+    def test_signals_update_today_snapshot(self):
+        refresh_dashboard()
+        Attendance.objects.create(school=self.school, student=self.paying[0], date=self.today, present=True)
+        Attendance.objects.create(school=self.school, student=self.paying[1], date=self.today, present=False)
+        Invoice.objects.create(
+            school=self.school, student=self.paying[0], month=self.today.month, year=self.today.year, amount=100
+        )
+        self.discounted.is_active = False
+        self.discounted.save()
+        snapshot = self.assertMatchesRecompute()
+        self.assertEqual((snapshot['attendance_present'], snapshot['attendance_recorded']), (1, 2))
+        self.assertEqual(snapshot['collected_amount'], 100)
+        self.assertEqual(snapshot['expected_amount'], 300)
+        self.assertEqual(snapshot['unpaid_students'], 2)
+        self.assertEqual(snapshot['active_students'], 4)
+
+        self.group.course.price = 150
+        self.group.course.save()
+        self.assertEqual(self.assertMatchesRecompute()['expected_amount'], 450)
+
+    def test_invoice_over_existing_payment_status(self):
+        refresh_dashboard()
+        previous = self.today.replace(day=1) - timedelta(days=1)
+        earlier = Invoice.objects.create(
+            school=self.school, student=self.paying[0], month=previous.month, year=previous.year, amount=80
+        )
+        StudentPaymentStatus.objects.create(
+            school=self.school, student=self.paying[0], invoice=earlier, month=self.today.month, year=self.today.year
+        )
+        # get_or_create finds the status, no payment status is saved
+        Invoice.objects.create(
+            school=self.school, student=self.paying[0], month=self.today.month, year=self.today.year, amount=100
+        )
+        self.assertEqual(self.assertMatchesRecompute()['collected_amount'], 100)
+
+    def test_one_update_per_transaction(self):
+        refresh_dashboard()
+        self.commit()
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                Invoice.objects.create(
+                    school=self.school, student=self.paying[0], month=self.today.month, year=self.today.year, amount=100
+                )
+                Attendance.objects.create(school=self.school, student=self.paying[0], date=self.today, present=True)
+            self.commit()
+        updates = [query['sql'].lower() for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len([sql for sql in updates if 'quran_dataversion' in sql]), 1)
+        self.assertEqual(len([sql for sql in updates if 'quran_schoolsnapshot' in sql]), 1)
+        snapshot = self.assertMatchesRecompute()
+        self.assertEqual((snapshot['collected_amount'], snapshot['attendance_present']), (100, 1))
+
+    def test_bulk_services_update_snapshot(self):
+        refresh_dashboard()
+        save_group_attendance([self.school.id], self.today, [student.id for student in self.paying], [self.paying[0].id])
+        create_monthly_invoices([self.school.id], self.today.month, self.today.year)
+        snapshot = self.assertMatchesRecompute()
+        self.assertEqual((snapshot['attendance_present'], snapshot['attendance_recorded']), (1, 3))
+        self.assertEqual(snapshot['unpaid_students'], 0)
+
+    def test_home_renders_from_snapshot(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        SchoolSnapshot.objects.create(school=self.school, date=date(2020, 1, 1), active_students=99)
+
+        # A snapshot of another day is rebuilt on the first visit
+        response = self.client.get(reverse('home'))
+        snapshot, = response.context['snapshots']
+        self.assertEqual((snapshot.date, snapshot.active_students), (self.today, 5))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, self.school.name)
+        tables = ('quran_student', 'quran_invoice', 'quran_attendance', 'quran_studentpaymentstatus')
+        self.assertFalse([query for query in queries if any(table in query['sql'].lower() for table in tables)])
+
+
+class StudentCodeAllocatorTests(QuranTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school, self.group = create_school_data()
+
+    def test_block_of_unique_codes(self):
+        codes = Student.allocate_codes(500)
+        self.assertEqual(len(set(codes)), 500)
+        self.assertTrue(all(len(code) == 4 for code in codes))
+        self.assertEqual(CodeSequence.objects.get(name='student_code').next_index, 500)
+
+    def test_existing_codes_are_skipped(self):
+        taken = code_for_index(0)
+        create_students(self.school, self.group, 1, code=taken)
+        student = create_students(self.school, self.group, 1, start=1)[0]
+        self.assertNotEqual(student.code, taken)
+        self.assertEqual(student.code, code_for_index(1))
+
+    @override_settings(STUDENT_CODE_WIDTH=1)
+    def test_width_grows_when_used_up(self):
+        codes = Student.allocate_codes(12)
+        self.assertEqual(sorted(codes[:9]), [str(i) for i in range(1, 10)])
+        self.assertTrue(all(len(code) == 2 for code in codes[9:]))
+        self.assertEqual(len(set(codes)), 12)
+
+
+class AcademicYearPromotionTests(QuranTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school, self.group = create_school_data()
+        self.other_school, other_group = create_school_data(code="S2")
+        create_students(self.school, self.group, 1, academic_year='primary_1')
+        create_students(self.school, self.group, 1, start=1, academic_year='primary_2')
+        create_students(self.school, self.group, 1, start=2, academic_year='graduate')
+        create_students(self.other_school, other_group, 1, start=3, academic_year='primary_1')
+
+    def academic_years(self, school):
+        return sorted(Student.objects.filter(school=school).values_list('academic_year', flat=True))
+
+    def test_promotes_once_per_year(self):
+        call_command('promote_academic_year', year=2025, stdout=StringIO())
+        self.assertEqual(self.academic_years(self.school), ['graduate', 'primary_1', 'primary_2'])
+
+        call_command('promote_academic_year', year=2026, dry_run=True, stdout=StringIO())
+        self.assertEqual(self.academic_years(self.school), ['graduate', 'primary_1', 'primary_2'])
+
+        call_command('promote_academic_year', year=2026, school=[self.school.id], stdout=StringIO())
+        self.assertEqual(self.academic_years(self.school), ['graduate', 'primary_2', 'primary_3'])
+        self.assertEqual(self.academic_years(self.other_school), ['primary_1'])
+        self.assertEqual(AcademicYearPromotion.objects.get(school=self.school, academic_year=2026).students, 2)
+
+        call_command('promote_academic_year', year=2026, stdout=StringIO())
+        self.assertEqual(self.academic_years(self.school), ['graduate', 'primary_2', 'primary_3'])
+        self.assertEqual(self.academic_years(self.other_school), ['primary_2'])
+
+
+class GenerateDatasetTests(QuranTestCase):
+    def test_generates_consistent_rollups(self):
+        call_command('generate_dataset', schools=1, groups=2, students=3, months=2, seed=3, stdout=StringIO())
+        school = School.objects.get(code='BENCH-3-1')
+        self.assertEqual(Student.objects.filter(school=school).count(), 6)
+        self.assertEqual(MonthlyAttendance.objects.filter(school=school).count(), 12)
+        self.assertEqual(
+            sum(row.total_present for row in MonthlyAttendance.objects.filter(school=school)),
+            Attendance.objects.filter(school=school, present=True).count(),
+        )
+        self.assertEqual(
+            StudentPaymentStatus.objects.filter(school=school).count(),
+            Invoice.objects.filter(school=school).count(),
+        )
+
+        today = date.today()
+        expected = list(get_group_summary(school.id, today.month, today.year))
+        call_command('rebuild_ledger', school=[school.id], stdout=StringIO())
+        self.assertEqual(list(get_group_summary(school.id, today.month, today.year)), expected)
+
+        with self.assertRaises(CommandError):
+            call_command('generate_dataset', seed=3, stdout=StringIO())
+
+
+STUDENT_WORKBOOK_HEADER = [
+    'name', 'id_number', 'gender', 'birth_date', 'academic_year', 'level',
+    'group', 'phone', 'phone_2', 'parent_profession', 'discount',
+]
+
+
+def student_workbook_row(name, id_number, group='أحمد علي (1:00 م - 3:00 م)', discount='نعم'):
+    return [name, id_number, 'ذكر', '01/02/2015', 'الصف الاول الابتدائى', 'الجزء الأول', group, '1001234567', None, 'موظف', discount]
+
+
+class ImportStudentsTests(QuranTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school, self.group = create_school_data()
+        self.course = self.group.course
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write_workbook(self, rows, name='students.xlsx'):
+        wb = Workbook()
+        wb.active.append(STUDENT_WORKBOOK_HEADER)
+        for row in rows:
+            wb.active.append(row)
+        path = os.path.join(self.directory.name, name)
+        wb.save(path)
+        return path
+
+    def run_import(self, path):
+        out = StringIO()
+        call_command('import_students', path, school=self.school.id, course=self.course.id, stdout=out)
+        return out.getvalue()
+
+    def test_import_and_reimport(self):
+        path = self.write_workbook([
+            student_workbook_row('Ali', '30101010101010'),
+            student_workbook_row('Omar', '30101010101011', group='الشيخ أحمد علي (1:00 م - 3:00 م)', discount=None),
+            student_workbook_row('Bad id', '123'),
+            student_workbook_row('Twin', '30101010101010'),
+            student_workbook_row('Nobody', '30101010101012', group=None),
+        ])
+        output = self.run_import(path)
+        self.assertIn("Students created: 5", output)
+        self.assertIn("Row 3 | Name: Omar | Defaulted: discount_flag", output)
+        self.assertIn("Row 4 | Name: Bad id | Defaulted: id_number", output)
+        self.assertIn("Row 5 | Name: Twin | Defaulted: duplicate_id", output)
+        self.assertIn("Row 6 | Name: Nobody | Defaulted: group_not_found", output)
+
+        ali = Student.objects.get(id_number='30101010101010')
+        omar = Student.objects.get(id_number='30101010101011')
+        self.assertEqual(ali.group, omar.group)
+        self.assertEqual((ali.group.start_time, ali.group.end_time), (time(13, 0), time(15, 0)))
+        self.assertEqual(ali.discount_type, 'discount')
+        self.assertEqual(len(ali.code), 4)
+        self.assertEqual(Student.objects.get(id_number='30101010101012').group, self.group)
+
+        # Unchanged rows are left alone, changed rows updated, vanished rows deleted
+        Invoice.objects.create(school=self.school, student=omar, month=5, year=2026, date=date(2026, 5, 3), amount=100)
+        path = self.write_workbook([
+            student_workbook_row('Ali', '30101010101010', discount=None),
+            student_workbook_row('Nobody', '30101010101012', group=None),
+        ])
+        output = self.run_import(path)
+        self.assertIn("Students updated: 1", output)
+        self.assertIn("Students unchanged: 1", output)
+        self.assertIn("Deleted 2 students", output)
+        self.assertEqual(Student.objects.get(id_number='30101010101010').discount_type, 'none')
+        self.assertTrue(Student.objects.filter(pk=omar.pk).exists())
+
+    def test_parse_students_columns(self):
+        df = pd.DataFrame([
+            ['Ali', 30101010101010, 'انثى', '2014-01-16 00:00:00', 'خريج', '3', 'أ. Sara (12:30 ص - 1:15 م)', 1001234567, None, 'x', 'لا'],
+            ['', '3010101010101', 'x', 41640.0, None, None, '(1:00 م - 3:00 م)', None, None, None, None],
+        ])
+        students, issues = parse_students(df)
+        first, second = students.to_dict('records')
+        self.assertEqual(first['id_number'], '30101010101010')
+        self.assertEqual((first['gender'], first['birth_date'], first['academic_year']), ('F', date(2014, 1, 16), 'graduate'))
+        self.assertEqual(first['phone'], '01001234567')
+        self.assertEqual((first['teacher_name'], first['start_time'], first['end_time']), ('Sara', time(0, 30), time(13, 15)))
+        self.assertEqual(first['discount_type'], 'none')
+        self.assertFalse(issues.iloc[0].any())
+
+        self.assertEqual(second['name'], 'UNKNOWN_3')
+        self.assertIsNone(second['id_number'])
+        self.assertEqual(second['birth_date'], date(2014, 1, 1))
+        self.assertEqual(issue_report(students, issues)[0]['missing'], [
+            'name', 'id_number', 'gender', 'academic_year', 'level', 'phone',
+            'parent_profession', 'group_not_found', 'discount_flag',
+        ])
+
+    def test_unchanged_rows_are_skipped(self):
+        path = self.write_workbook([
+            student_workbook_row('Ali', '30101010101010'),
+            student_workbook_row('Omar', '30101010101011'),
+            student_workbook_row('Bad id', '123'),
+        ])
+        self.run_import(path)
+        Student.objects.filter(id_number='30101010101010').update(level='edited')
+
+        # Including the row without a valid id, which keeps its generated id
+        with CaptureQueriesContext(connection) as queries:
+            output = self.run_import(path)
+        self.assertIn("Students unchanged: 3", output)
+        self.assertFalse([query for query in queries if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))])
+        self.assertEqual(Student.objects.get(id_number='30101010101010').level, 'edited')
+
+        # A deleted student comes back even though its row did not change
+        Student.objects.filter(id_number='30101010101011').delete()
+        self.assertIn("Students created: 1", self.run_import(path))
+
+        call_command('import_students', path, school=self.school.id, course=self.course.id, full=True, stdout=StringIO())
+        self.assertEqual(Student.objects.get(id_number='30101010101010').level, 'الجزء الأول')
+
+    def test_workbooks_of_several_schools(self):
+        other_school, _group = create_school_data(code="S2")
+        self.write_workbook([student_workbook_row('Ali', '30101010101010')], name='s1_students.xlsx')
+        self.write_workbook([
+            student_workbook_row('Ali again', '30101010101010'),
+            student_workbook_row('Sara', '30101010101020'),
+        ], name='s2.xlsx')
+
+        out = StringIO()
+        call_command('import_students', self.directory.name, workers=2, stdout=out)
+        output = out.getvalue()
+        self.assertEqual(Student.objects.get(id_number='30101010101010').school, self.school)
+        self.assertEqual(Student.objects.filter(school=other_school).count(), 2)
+        self.assertIn("Row 2 | Name: Ali again | Defaulted: duplicate_id", output)
+        self.assertIn("Totals for 2 workbooks", output)
+        self.assertIn("Students created: 3", output)
+
+        with self.assertRaises(CommandError):
+            call_command('import_students', self.directory.name, school=self.school.id, stdout=StringIO())
+
+    def test_queries_do_not_grow_with_rows(self):
+        def count_queries(rows):
+            path = self.write_workbook(rows)
+            with CaptureQueriesContext(connection) as queries:
+                self.run_import(path)
+            return len(queries)
+
+        rows = [student_workbook_row(f'S{i}', f'3010101010{i:04d}') for i in range(60)]
+        self.run_import(self.write_workbook(rows[:1]))
+        few = count_queries(rows[:3])
+        many = count_queries(rows)
+        self.assertEqual(few, many)
+
+
+    def test_vanished_rows_deleted_at_fixed_cost(self):
+        def count_queries(rows):
+            path = self.write_workbook(rows)
+            with CaptureQueriesContext(connection) as queries:
+                self.run_import(path)
+            return len(queries)
+
+        rows = [student_workbook_row(f'S{i}', f'3010101010{i:04d}') for i in range(60)]
+        self.run_import(self.write_workbook(rows[:5]))
+        refresh_dashboard()
+        few = count_queries(rows[:2])
+        self.run_import(self.write_workbook(rows))
+        many = count_queries(rows[:2])
+        self.assertEqual(few, many)
+
+        # The snapshot and data version are still refreshed, once
+        version = School.data_version(self.school.id)
+        self.run_import(self.write_workbook(rows[:1]))
+        self.assertEqual(School.data_version(self.school.id), version + 1)
+        self.assertEqual(SchoolSnapshot.objects.get(school=self.school).active_students, 1)
+
+
+class StudentSearchTests(QuranTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school, self.group = create_school_data()
+        names = ['أحمد محمد', 'فاطمة مصطفى', 'إسلام عليّ', 'محمد أحمدي']
+        self.students = {}
+        for i, name in enumerate(names):
+            student, = create_students(self.school, self.group, 1, start=i)
+            student.name = name
+            student.save()
+            self.students[name] = student
+
+    def search(self, query):
+        return [student.name for student in search_students(Student.objects.all(), query)]
+
+    def test_letter_forms_prefixes_and_ranking(self):
+        self.assertEqual(self.search('احمد'), ['أحمد محمد', 'محمد أحمدي'])
+        self.assertEqual(self.search('فاطمه مصطفي'), ['فاطمة مصطفى'])
+        self.assertEqual(self.search('اسلام علي'), ['إسلام عليّ'])
+        self.assertEqual(self.search('مُحَمَّد اح'), ['محمد أحمدي', 'أحمد محمد'])
+        self.assertEqual(self.search('حمد'), [])
+        self.assertEqual(self.search(self.students['إسلام عليّ'].code), ['إسلام عليّ'])
+
+    def test_index_follows_writes(self):
+        student = self.students['أحمد محمد']
+        student.name = 'خالد'
+        student.save()
+        self.assertEqual(self.search('خالد'), ['خالد'])
+        self.assertEqual(self.search('احمد'), ['محمد أحمدي'])
+        student.delete()
+        self.assertEqual(self.search('خالد'), [])
+
+    def test_fallback_without_index(self):
+        with mock.patch('Quran.search.search_index_available', return_value=False):
+            self.assertEqual(self.search('احمد'), ['أحمد محمد', 'محمد أحمدي'])
+            self.assertEqual(self.search('فاطمه'), ['فاطمة مصطفى'])
+
+
+class KeysetPaginationTests(QuranTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school, self.group = create_school_data()
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.user)
+        self.boys = create_students(self.school, self.group, 30)
+        create_students(self.school, self.group, 5, start=30, gender='F')
+        # Same updated_at for several students, so the id breaks ties
+        Student.objects.filter(pk__in=[student.pk for student in self.boys[10:16]]).update(updated_at=self.boys[10].updated_at)
+
+    def get_page(self, url):
+        response = self.client.get(url)
+        return response, [student.pk for student in response.context['students']]
+
+    def test_next_and_previous_pages_keep_filters(self):
+        expected = list(
+            Student.objects.filter(gender='M').order_by('-updated_at', '-pk').values_list('pk', flat=True)
+        )
+        response, first = self.get_page(reverse('student_list') + '?gender=M')
+        page = response.context['keyset_page']
+        self.assertEqual(first, expected[:12])
+        self.assertFalse(page['has_previous'])
+        self.assertEqual((page['count'], page['count_is_exact']), (30, True))
+        self.assertIn('gender=M', page['next_url'])
+
+        response, second = self.get_page(reverse('student_list') + page['next_url'])
+        self.assertEqual(second, expected[12:24])
+        response, third = self.get_page(reverse('student_list') + response.context['keyset_page']['next_url'])
+        self.assertEqual(third, expected[24:])
+        self.assertFalse(response.context['keyset_page']['has_next'])
+
+        response, back = self.get_page(reverse('student_list') + response.context['keyset_page']['previous_url'])
+        self.assertEqual(back, expected[12:24])
+        self.assertTrue(response.context['keyset_page']['has_previous'])
+
+    def test_search_keeps_ranking(self):
+        # Names starting with the searched word rank first, whatever their updated_at
+        first, second = self.boys[0], self.boys[1]
+        first.name = 'أحمد محمد'
+        first.save()
+        second.name = 'محمد أحمدي'
+        second.save()
+
+        response, page = self.get_page(reverse('student_list') + '?q=احمد')
+        self.assertEqual(page, [first.pk, second.pk])
+        self.assertFalse(response.context['keyset_page']['has_next'])
+
+    def test_search_pages_with_cursors(self):
+        # Ranked search results page through (search_rank, name, id) cursors
+        for i, student in enumerate(self.boys[:26]):
+            student.name = f"أحمد {i % 4}" if i % 2 else f"محمد أحمد {i % 3}"
+            student.save()
+        expected = list(
+            search_students(Student.objects.filter(gender='M'), 'احمد')
+            .order_by('search_rank', 'name', 'pk').values_list('pk', flat=True)
+        )
+        self.assertEqual(len(expected), 26)
+
+        response, first = self.get_page(reverse('student_list') + '?q=احمد&gender=M')
+        page = response.context['keyset_page']
+        self.assertEqual(first, expected[:12])
+        self.assertIn('q=', page['next_url'])
+
+        response, second = self.get_page(reverse('student_list') + page['next_url'])
+        self.assertEqual(second, expected[12:24])
+        response, third = self.get_page(reverse('student_list') + response.context['keyset_page']['next_url'])
+        self.assertEqual(third, expected[24:])
+        self.assertFalse(response.context['keyset_page']['has_next'])
+
+        response, back = self.get_page(reverse('student_list') + response.context['keyset_page']['previous_url'])
+        self.assertEqual(back, expected[12:24])
+        response, back = self.get_page(reverse('student_list') + response.context['keyset_page']['previous_url'])
+        self.assertEqual(back, expected[:12])
+        self.assertFalse(response.context['keyset_page']['has_previous'])
+
+    def test_count_is_capped(self):
+        with mock.patch('Quran.utils.KEYSET_COUNT_LIMIT', 20):
+            response = self.client.get(reverse('student_list'))
+        self.assertEqual(response.context['keyset_page']['count'], 20)
+        self.assertFalse(response.context['keyset_page']['count_is_exact'])
+        self.assertContains(response, '20+')
+
+
+class PaymentStatusExportTests(QuranTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school, self.group = create_school_data()
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.user)
+        for i, student in enumerate(create_students(self.school, self.group, 5)):
+            Invoice.objects.create(
+                school=self.school, student=student, month=5, year=2026, date=date(2026, 5, 10), amount=100 + i
+            )
+
+    def test_excel_is_streamed_with_totals(self):
+        response = self.client.post(reverse('payment_status'), {
+            'action': 'excel',
+            'school': self.school.id,
+            'from_date': '2026-05-01',
+            'to_date': '2026-05-31',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+
+        ws = load_workbook(BytesIO(b"".join(response.streaming_content))).active
+        rows = list(ws.iter_rows(min_row=3, values_only=True))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[-1][-1], sum(range(100, 105)))
+        self.assertEqual(ws["C3"].style, "export_row_odd")
+        self.assertGreaterEqual(ws.column_dimensions["C"].width, len("Student 0000"))
+
+    def test_csv_export(self):
+        response = self.client.post(reverse('payment_status'), {
+            'action': 'csv',
+            'school': self.school.id,
+            'from_date': '2026-05-01',
+            'to_date': '2026-05-31',
+        })
+        self.assertIn('.csv', response['Content-Disposition'])
+        rows = list(csv.reader(StringIO(b"".join(response.streaming_content).decode("utf-8-sig"))))
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[-1][-1], str(sum(range(100, 105))))
+
+
+class BackgroundJobTests(QuranTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.job_files_dir = directory.name
+        overridden = override_settings(BACKGROUND_EXPORTS=True, JOB_FILES_DIR=directory.name)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        self.school, self.group = create_school_data()
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.user)
+        for i, student in enumerate(create_students(self.school, self.group, 5)):
+            Invoice.objects.create(
+                school=self.school, student=student, month=5, year=2026, date=date(2026, 5, 10), amount=100 + i
+            )
+
+    def submit_export(self):
+        response = self.client.post(reverse('payment_status'), {
+            'action': 'csv',
+            'school': self.school.id,
+            'from_date': '2026-05-01',
+            'to_date': '2026-05-31',
+        })
+        job = BackgroundJob.objects.get()
+        self.assertRedirects(response, reverse('job_detail', args=[job.pk]))
+        return job
+
+    def test_export_is_queued_then_downloaded(self):
+        job = self.submit_export()
+        self.assertEqual(job.status, 'pending')
+        self.assertEqual(self.client.get(reverse('job_download', args=[job.pk])).status_code, 404)
+
+        self.assertEqual(claim_job(), job.pk)
+        self.assertIsNone(claim_job())
+        self.assertEqual(run_job(job.pk).status, 'done')
+
+        status = self.client.get(reverse('job_status', args=[job.pk])).json()
+        self.assertEqual((status['status'], status['progress']), ('done', 100))
+        response = self.client.get(status['download_url'])
+        self.assertIn('.csv', response['Content-Disposition'])
+        rows = list(csv.reader(StringIO(b"".join(response.streaming_content).decode("utf-8-sig"))))
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[-1][-1], str(sum(range(100, 105))))
+
+    def test_summary_report_export(self):
+        response = self.client.post(reverse('summary_report'), {
+            'action': 'excel', 'school': self.school.id, 'month': 5, 'year': 2026,
+        })
+        job = BackgroundJob.objects.get(kind='summary_report_export')
+        self.assertRedirects(response, reverse('job_detail', args=[job.pk]))
+        run_job(claim_job())
+
+        response = self.client.get(reverse('job_download', args=[job.pk]))
+        ws = load_workbook(BytesIO(b"".join(response.streaming_content))).active
+        self.assertEqual(ws["L4"].value, sum(range(100, 105)))
+
+    def test_jobs_are_private_and_failures_recorded(self):
+        job = self.submit_export()
+        teacher = User.objects.create_user('teacher', 'teacher@example.com', 'password', is_staff=True)
+        self.client.force_login(teacher)
+        self.assertEqual(self.client.get(reverse('job_status', args=[job.pk])).status_code, 404)
+
+        BackgroundJob.objects.filter(pk=job.pk).update(params={**job.params, 'school_id': 'x'})
+        job = run_job(claim_job())
+        self.assertEqual(job.status, 'failed')
+        self.assertTrue(job.error)
+        self.assertEqual(os.listdir(self.job_files_dir), [])
+
+    def test_stale_jobs_follow_the_heartbeat(self):
+        job = self.submit_export()
+        claim_job()
+        long_ago = timezone.now() - timedelta(seconds=settings.JOB_STALE_AFTER + 60)
+        # A long job that keeps reporting progress is alive
+        BackgroundJob.objects.filter(pk=job.pk).update(started_at=long_ago)
+        self.assertEqual(fail_stale_jobs(), 0)
+        BackgroundJob.objects.filter(pk=job.pk).update(updated_at=long_ago)
+        self.assertEqual(fail_stale_jobs(), 1)
+        self.assertEqual(BackgroundJob.objects.get(pk=job.pk).status, 'failed')
+
+    def test_job_failed_meanwhile_stays_failed(self):
+        export = JOB_HANDLERS['payment_status_export']
+
+        def failed_at_the_end(job, progress):
+            export(job, progress)
+            BackgroundJob.objects.filter(pk=job.pk).update(status='failed', error="Stale")
+
+        job = self.submit_export()
+        with mock.patch.dict(JOB_HANDLERS, {'payment_status_export': failed_at_the_end}):
+            job = run_job(claim_job())
+        self.assertEqual((job.status, job.error), ('failed', "Stale"))
+        self.assertEqual(BackgroundJob.objects.get(pk=job.pk).status, 'failed')
+        self.assertEqual(os.listdir(self.job_files_dir), [])
+
+    def test_progress_stops_a_job_failed_meanwhile(self):
+        steps = []
+
+        def failed_before_progress(job, progress):
+            BackgroundJob.objects.filter(pk=job.pk).update(status='failed', error="Stale")
+            progress(50)
+            steps.append(50)
+
+        self.submit_export()
+        with mock.patch.dict(JOB_HANDLERS, {'payment_status_export': failed_before_progress}):
+            job = run_job(claim_job())
+        self.assertEqual((job.status, job.error, steps), ('failed', "Stale", []))
+
+
+class ExportTableTests(TestCase):
+    def test_totals_are_summed_in_the_same_pass(self):
+        rows = ({"name": f"row {i}", "amount": i} for i in range(5000))
+        columns = [
+            {"header": "Name", "key": "name"},
+            {"header": "Double", "value": lambda row: row["amount"] * 2, "total": True},
+            {"header": "Amount", "key": "amount", "total": True},
+        ]
+        response = export_table(rows, columns, title="Test", filename="test.xlsx")
+        ws = load_workbook(BytesIO(b"".join(response.streaming_content)), read_only=True).active
+        last = list(ws.iter_rows(values_only=True))[-1]
+        self.assertEqual(last, ("Totals", sum(range(5000)) * 2, sum(range(5000))))
+
+
+class SQLiteProfileTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'profile.sqlite3')
+        self.wrapper = DatabaseWrapper({
+            **connection.settings_dict,
+            **settings.SQLITE_PROFILES['production'],
+            'NAME': self.path,
+        })
+        self.addCleanup(self.wrapper.close)
+
+    def test_init_command_sets_pragmas(self):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+    def test_development_keeps_the_journal_mode(self):
+        self.wrapper.ensure_connection()
+        self.wrapper.close()
+        development = DatabaseWrapper({
+            **connection.settings_dict,
+            **settings.SQLITE_PROFILES['development'],
+            'NAME': self.path,
+        })
+        self.addCleanup(development.close)
+        with development.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+
+    def test_transactions_take_the_write_lock(self):
+        self.wrapper.ensure_connection()
+        self.wrapper._start_transaction_under_autocommit()
+        other = sqlite3.connect(self.path, timeout=0, isolation_level=None)
+        self.addCleanup(other.close)
+        with self.assertRaisesMessage(sqlite3.OperationalError, 'locked'):
+            other.execute("BEGIN IMMEDIATE")
+        self.wrapper.connection.execute("ROLLBACK")
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0, PROFILING_TOP_QUERIES=2)
+class RequestProfilingTests(QuranTestCase):
+    def setUp(self):
+        super().setUp()
+        clear_profiles()
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.user)
+
+    def test_requests_are_timed_and_sampled(self):
+        response = self.client.get(reverse('student_list'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+        profile, = recent_profiles()
+        self.assertEqual(profile['view'], 'student_list')
+        self.assertGreater(profile['queries'], 0)
+        self.assertLessEqual(len(profile['slowest']), 2)
+
+        response = self.client.get(reverse('performance'))
+        self.assertContains(response, 'student_list')
+        self.assertEqual(summarize_profiles(recent_profiles())[0]['requests'], 1)
+
+    def test_admin_links_to_performance_page(self):
+        response = self.client.get(reverse('admin:index'))
+        self.assertContains(response, reverse('performance'))
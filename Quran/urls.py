@@ -6,9 +6,11 @@ from Quran.views import (
     CourseListView, CourseCreateView, CourseUpdateView, CourseDeleteView,
     ClassGroupListView, ClassGroupCreateView, ClassGroupUpdateView, ClassGroupDeleteView,
     AttendanceView, MonthlyAttendanceView,
-    InvoiceCreateView, InvoicePrintView,
+    InvoiceCreateView, InvoicePrintView, InvoiceBatchPrintView, BulkInvoiceView,
     PaymentStatusListView,
     SummaryReportView,
+    JobDetailView, JobStatusView, JobDownloadView,
+    PerformanceView,
 )
 
 urlpatterns = [
@@ -45,10 +47,20 @@ urlpatterns = [
     # Invoice
     path('invoice/', InvoiceCreateView.as_view(), name='invoice'),
     path('invoice/print/<int:invoice_id>/', InvoicePrintView.as_view(), name='print_invoice'),
+    path('invoice/print/', InvoiceBatchPrintView.as_view(), name='print_invoices'),
+    path('invoice/bulk/', BulkInvoiceView.as_view(), name='bulk_invoice'),
 
     # Payment Status
     path('payment_status/', PaymentStatusListView.as_view(), name='payment_status'),
 
     # Reports
     path('summary_report/', SummaryReportView.as_view(), name='summary_report'),
+
+    # Background Jobs
+    path('jobs/<int:pk>/', JobDetailView.as_view(), name='job_detail'),
+    path('jobs/<int:pk>/status/', JobStatusView.as_view(), name='job_status'),
+    path('jobs/<int:pk>/download/', JobDownloadView.as_view(), name='job_download'),
+
+    # Performance
+    path('performance/', PerformanceView.as_view(), name='performance'),
 ]
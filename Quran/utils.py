@@ -1,19 +1,35 @@
 import calendar
+import json
+import operator
 from datetime import date, datetime
 from django.db.models import Count, Q, F, Sum, Value, IntegerField, ExpressionWrapper, Case, When
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models.functions import Coalesce
+from django.utils import translation
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 from collections import defaultdict
+from functools import reduce
 from Quran.models import (
-    School, Student, Attendance, StudentPaymentStatus, Invoice, ClassGroup, DiscountConfig
+    School, Student, Attendance, MonthlyAttendance, MonthlyLedger, StudentPaymentStatus, Invoice, ClassGroup,
+    DiscountConfig,
 )
 
 
-def get_user_school(request):
-    user = request.user
-    if user.is_superuser:
-        return School.objects.all()
-    else:
-        return School.objects.filter(users=user)
+def get_user_school_ids(request):
+    """
+    Return the ids of the schools of the request user as a list of integers.
+    Resolved once per request with School.ids_for_user.
+    """
+    if not hasattr(request, '_user_school_ids'):
+        request._user_school_ids = School.ids_for_user(request.user)
+    return request._user_school_ids
+
+
+def get_user_school_id(request):
+    """Return the first school id of the request user, None without a school."""
+    school_ids = get_user_school_ids(request)
+    return school_ids[0] if school_ids else None
 
 
 def get_present_for_student(student_id, date):
@@ -21,27 +37,8 @@ def get_present_for_student(student_id, date):
     return attendance.present if attendance else True
 
 
-def get_missing_months_for_student(student):
-    if student.discount_type == 'full':
-        return []
-
-    start_month_obj, _ = DiscountConfig.objects.get_or_create(
-        school=student.school,
-        name='start_month',
-        defaults={'value': 1}
-    )
-
-    start_year_obj, _ = DiscountConfig.objects.get_or_create(
-        school=student.school,
-        name='start_year',
-        defaults={'value': 2026}
-    )
-
-    # Get actual values
-    start_month = int(start_month_obj.value)
-    start_year = int(start_year_obj.value)
-
-    today = date.today()
+def get_required_months(start_year, start_month, today=None):
+    today = today or date.today()
 
     required_months = []
     y, m = start_year, start_month
@@ -51,289 +48,228 @@ def get_missing_months_for_student(student):
         if m > 12:
             m, y = 1, y + 1
 
-    existing_months = set(
-        StudentPaymentStatus.objects.filter(student_id=student.id).values_list('year', 'month')
-    )
+    return required_months
 
-    missing_months = []
-    for (year, month) in required_months:
-        if (year, month) not in existing_months:
-            missing_months.append(f"{year}-{month:02d}" )
+
+def get_missing_months_for_student(student):
+    return get_missing_months_for_students([student])[student.id]
+
+
+def get_missing_months_for_students(students):
+    """
+    Unpaid months ("YYYY-MM") since the school start of several students, keyed by student id.
+    Runs one query for all the payment statuses.
+    """
+    missing_months = {student.id: [] for student in students}
+    paying = [student for student in students if student.discount_type != 'full']
+    if not paying:
+        return missing_months
+
+    existing_months = defaultdict(set)
+    for student_id, year, month in StudentPaymentStatus.objects.filter(
+        student_id__in=[student.id for student in paying]
+    ).values_list('student_id', 'year', 'month'):
+        existing_months[student_id].add((year, month))
+
+    # Get school start month/year
+    today = date.today()
+    required_months = {}
+    for student in paying:
+        if student.school_id not in required_months:
+            school_settings = DiscountConfig.for_school(student.school_id)
+            required_months[student.school_id] = get_required_months(
+                school_settings.start_year, school_settings.start_month, today=today
+            )
+        missing_months[student.id] = [
+            f"{year}-{month:02d}"
+            for (year, month) in required_months[student.school_id]
+            if (year, month) not in existing_months[student.id]
+        ]
 
     return missing_months
 
 
+def get_group_roster(school_ids, group_id, selected_date):
+    """
+    Build the attendance roster of a group for a given date.
+    Runs a fixed number of queries whatever the size of the group.
+    """
+    # Students of the group
+    students = list(
+        Student.objects.filter(
+            school_id__in=school_ids,
+            group_id=int(group_id),
+            is_active=True,
+        ).order_by('name').values('id', 'school_id', 'code', 'name', 'discount_type')
+    )
+    if not students:
+        return []
+
+    student_ids = [s['id'] for s in students]
+
+    # Start month/year per school
+    school_settings = {
+        school_id: DiscountConfig.for_school(school_id)
+        for school_id in {s['school_id'] for s in students}
+    }
+
+    # Paid months per student
+    paid_months = defaultdict(set)
+    for student_id, year, month in StudentPaymentStatus.objects.filter(
+        student_id__in=student_ids
+    ).values_list('student_id', 'year', 'month'):
+        paid_months[student_id].add((year, month))
+
+    # Attendance of the day, students without a record default to present
+    present_map = dict(
+        Attendance.objects.filter(
+            student_id__in=student_ids,
+            date=selected_date,
+        ).values_list('student_id', 'present')
+    )
+
+    today = date.today()
+    required_months = {}
+    roster = []
+    for student in students:
+        missing = []
+        if student['discount_type'] != 'full':
+            config = school_settings[student['school_id']]
+            key = (config.start_year, config.start_month)
+            if key not in required_months:
+                required_months[key] = get_required_months(*key, today=today)
+            missing = [
+                f"{year}-{month:02d}"
+                for (year, month) in required_months[key]
+                if (year, month) not in paid_months[student['id']]
+            ]
+
+        roster.append({
+            "student_id": student['id'],
+            "student_code": student['code'],
+            "student_name": student['name'],
+            "status": missing,
+            "present": present_map.get(student['id'], True),
+        })
+
+    return roster
+
+
+def cached_report(report, school_id, group_id, month, year, build):
+    """
+    Return build(), cached per report, filters and language. The key includes the data
+    version of the school, read from the database, so a change to its students, attendance
+    or payments makes the next call rebuild the report in every process.
+    """
+    key = ":".join(str(part) for part in (
+        'report', report, school_id, group_id, year, month, translation.get_language(),
+        School.data_version(school_id),
+    ))
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, settings.REPORT_CACHE_TIMEOUT)
+    return data
+
+
 def get_attendance_summary(school_id, group_id, month, year):
-    # Get date range
-    date_from = date(year, month, 1)
+    # Get days of month
     last_day = calendar.monthrange(year, month)[1]
-    date_to = date(year, month, last_day)
     days_list = list(range(1, last_day + 1))
 
     # Get all students for this school
-    students = Student.objects.filter(
-        school_id=school_id,
-        group_id=group_id,
-        is_active=True
-    ).order_by('name')
+    students = list(
+        Student.objects.filter(
+            school_id=school_id,
+            group_id=group_id,
+            is_active=True
+        ).order_by('name').values('id', 'name', 'phone')
+    )
 
-    if not students.exists():
+    if not students:
         return {
             'students': [],
             'days': days_list,
             'stats': {'total_students': 0, 'avg_attendance': 0}
         }
-    
-    # Get attendance data
-    attendance_data = Attendance.objects.filter(
-        student__in=students,
-        date__range=(date_from, date_to)
-    ).values(
-        'student__name',
-        'student_id',
-        'date',
-        'present'
-    ).order_by('student__name')
- 
-    # Convert to nested dictionary: {student_id: {day: present}}
-    attendance_dict = defaultdict(dict)
-
-    for record in attendance_data:
-        student_id = record['student_id']
-        day = record['date'].day
-        attendance_dict[student_id][day] = record['present']
-    
+
+    # Get monthly bitmaps: {student_id: present_days}
+    bitmaps = dict(
+        MonthlyAttendance.objects.filter(
+            student_id__in=[student['id'] for student in students],
+            year=year,
+            month=month,
+        ).values_list('student_id', 'present_days')
+    )
+
     # Build student list with attendance
-    student_list = []    
+    student_list = []
     for student in students:
-        attendance_list = []
-        
-        # Fill attendance for each day
-        for day in days_list:
-            is_present = attendance_dict.get(student.id, {}).get(day, False)
-            attendance_list.append(is_present)
-
+        bits = bitmaps.get(student['id'], 0)
         student_list.append({
-            'id': student.id,
-            'name': student.name,
-            "phone": student.phone,
-            'attendance': attendance_list,
-            'total_present': sum(attendance_list),
+            'id': student['id'],
+            'name': student['name'],
+            "phone": student['phone'],
+            'attendance': [bool(bits >> (day - 1) & 1) for day in days_list],
+            'total_present': bits.bit_count(),
         })
-    
+
+    total_present = sum(student['total_present'] for student in student_list)
     data = {
         'students': student_list,
         'days': days_list,
+        'stats': {
+            'total_students': len(student_list),
+            'avg_attendance': round(total_present / len(student_list), 1),
+        },
     }
     return data
 
 
 def get_group_summary(school_id, month, year):
-    # Get start day of month
-    date_from = date(year, month, 1)
-
-    # Get last day of month
-    last_day = calendar.monthrange(year, month)[1]
-    date_to = date(year, month, last_day)
-
-    # Filter invoices by date range
-    invoice_qs = Invoice.objects.filter(school_id=school_id, date__range=(date_from, date_to))
-
-    # Get the discount value for the school, default to 0 if not set
-    discount_value_obj, _ = DiscountConfig.objects.get_or_create(
-        school=school_id,
-        name='discount',
-        defaults={'value': 30}
-    )
-    discount_value = discount_value_obj.value
-
-    data = (
+    # Active and fully exempted students per group
+    groups = (
         ClassGroup.objects.filter(school_id=school_id)
-        .select_related('teacher')
         .annotate(
             total_students=Count(
                 'students',
-                filter=Q(
-                    students__is_active=True
-                ),
-                distinct=True
-            ),
-            # price=F("course__price"),
-
-            # Paid current month
-            students_paid_current=Count(
-                'students__payment_statuses',
-                filter=Q(
-                    students__is_active=True,
-                    students__discount_type='none',
-                    students__payment_statuses__is_paid=True,
-                    students__payment_statuses__invoice__in=invoice_qs,
-                    students__payment_statuses__invoice__month=month,
-                    students__payment_statuses__invoice__year=year,
-                ),
-                distinct=True,
-            ),
-            students_paid_current_amount=Sum(
-                'students__payment_statuses__invoice__amount',
-                filter=Q(
-                    students__is_active=True,
-                    students__discount_type='none',
-                    students__payment_statuses__is_paid=True,
-                    students__payment_statuses__invoice__in=invoice_qs,
-                    students__payment_statuses__invoice__month=month,
-                    students__payment_statuses__invoice__year=year,
-                ),
-            ),
-
-            # Paid previous months
-            students_paid_previous=Count(
-                'students__payment_statuses',
-                filter=Q(
-                    students__is_active=True,
-                    students__discount_type='none',
-                    students__payment_statuses__is_paid=True,
-                    students__payment_statuses__invoice__in=invoice_qs,
-                ) & ~Q(
-                    students__payment_statuses__invoice__month=month,
-                    students__payment_statuses__invoice__year=year,
-                ),
-                distinct=True,
+                filter=Q(students__is_active=True),
             ),
-            students_paid_previous_amount=Sum(
-                'students__payment_statuses__invoice__amount',
-                filter=Q(
-                    students__is_active=True,
-                    students__discount_type='none',
-                    students__payment_statuses__is_paid=True,
-                    students__payment_statuses__invoice__in=invoice_qs,
-                ) & ~Q(
-                    students__payment_statuses__invoice__month=month,
-                    students__payment_statuses__invoice__year=year,
-                ),
-                distinct=True,
-            ),
-
-            # Discount current month
-            students_discount_current=Count(
-                'students__payment_statuses',
-                filter=Q(
-                    students__is_active=True,
-                    students__discount_type='discount',
-                    students__payment_statuses__is_paid=True,
-                    students__payment_statuses__invoice__in=invoice_qs,
-                    students__payment_statuses__invoice__month=month,
-                    students__payment_statuses__invoice__year=year,
-                ),
-                distinct=True,
-            ),
-            students_discount_current_amount=Sum(
-                'students__payment_statuses__invoice__amount',
-                filter=Q(
-                    students__is_active=True,
-                    students__discount_type='discount',
-                    students__payment_statuses__is_paid=True,
-                    students__payment_statuses__invoice__in=invoice_qs,
-                    students__payment_statuses__invoice__month=month,
-                    students__payment_statuses__invoice__year=year,
-                ),
-                distinct=True,
-            ),
-
-            # Discount previous months
-            students_discount_previous=Count(
-                'students__payment_statuses',
-                filter=Q(
-                    students__is_active=True,
-                    students__discount_type='discount',
-                    students__payment_statuses__is_paid=True,
-                    students__payment_statuses__invoice__in=invoice_qs,
-                ) & ~Q(
-                    students__payment_statuses__invoice__month=month,
-                    students__payment_statuses__invoice__year=year,
-                ),
-                distinct=True,
-            ),
-            students_discount_previous_amount=Sum(
-                'students__payment_statuses__invoice__amount',
-                filter=Q(
-                    students__is_active=True,
-                    students__discount_type='discount',
-                    students__payment_statuses__is_paid=True,
-                    students__payment_statuses__invoice__in=invoice_qs,
-                ) & ~Q(
-                    students__payment_statuses__invoice__month=month,
-                    students__payment_statuses__invoice__year=year,
-                ),
-                distinct=True,
-            ),
-
-            # Fully exempted students
             students_full_discount=Count(
                 'students',
-                filter=Q(
-                    students__is_active=True,
-                    students__discount_type='full'
-                ),
-                distinct=True,
+                filter=Q(students__is_active=True, students__discount_type='full'),
             ),
         )
-        .annotate(
-            # Unpaid current month
-            students_not_paid=ExpressionWrapper(
-                Coalesce(F('total_students'), Value(0)) - (
-                    Coalesce(F('students_paid_current'), Value(0)) +
-                    Coalesce(F('students_discount_current'), Value(0)) +
-                    Coalesce(F('students_full_discount'), Value(0))
-                ),
-                output_field=IntegerField(),
-            ),
+        .values('id', 'name', 'teacher__name', 'start_time', 'end_time', 'total_students', 'students_full_discount')
+        .order_by('id')
+    )
 
-            # Total current month
-            total_current_month=ExpressionWrapper(
-                (
-                    Coalesce(F('students_paid_current_amount'), Value(0)) +
-                    Coalesce(F('students_discount_current_amount'), Value(0))
-                ),
-                output_field=IntegerField(),
+    # Payments of invoices issued this month, maintained by signals
+    ledgers = {
+        ledger.group_id: ledger
+        for ledger in MonthlyLedger.objects.filter(school_id=school_id, year=year, month=month)
+    }
+
+    data = []
+    for group in groups:
+        ledger = ledgers.get(group.pop('id')) or MonthlyLedger()
+        total_current_month = ledger.paid_current_amount + ledger.discount_current_amount
+        total_previous_months = ledger.paid_previous_amount + ledger.discount_previous_amount
+        group.update({
+            'students_paid_current': ledger.paid_current,
+            'students_discount_current': ledger.discount_current,
+            'students_not_paid': group['total_students'] - (
+                ledger.paid_current + ledger.discount_current + group['students_full_discount']
             ),
 
-            # Total previous months
-            total_previous_months=ExpressionWrapper(
-                (
-                    Coalesce(F('students_paid_previous_amount'), Value(0)) +
-                    Coalesce(F('students_discount_previous_amount'), Value(0))
-                ),
-                output_field=IntegerField(),
-            )
-        )
-        .annotate(
-            # Final total
-            final_total=ExpressionWrapper(
-                Coalesce(F('total_current_month'), Value(0)) +
-                Coalesce(F('total_previous_months'), Value(0)),
-                output_field=IntegerField(),
-            )
-        )
-        .values(
-            'name',
-            'teacher__name',
-            'start_time',
-            'end_time',
-            'total_students',
-
-            'students_paid_current',
-            'students_discount_current',
-            'students_full_discount',
-            'students_not_paid',
-
-            'students_paid_previous',
-            'students_discount_previous',
-
-            'total_current_month',
-            'total_previous_months',
-            'final_total',
-        )
-    )
+            'students_paid_previous': ledger.paid_previous,
+            'students_discount_previous': ledger.discount_previous,
+
+            'total_current_month': total_current_month,
+            'total_previous_months': total_previous_months,
+            'final_total': total_current_month + total_previous_months,
+        })
+        data.append(group)
 
     return data
 
@@ -366,3 +302,99 @@ def get_payment_summary(school_id, from_date, to_date):
     )
 
     return data
+
+
+# Counts of keyset-paginated lists stop here ("1000+")
+KEYSET_COUNT_LIMIT = 1000
+
+
+def keyset_ordering(queryset):
+    """
+    The ordering of a keyset-paginated queryset: its own order_by fields (-updated_at when
+    it has none) with the id last as the tie-breaker, in the direction of the first field.
+    """
+    ordering = [field for field in queryset.query.order_by if isinstance(field, str)] or ['-updated_at']
+    if ordering[-1].lstrip('-') not in ('pk', 'id'):
+        ordering.append('-pk' if ordering[0].startswith('-') else 'pk')
+    return ordering
+
+
+def encode_cursor(obj, ordering):
+    values = [getattr(obj, field.lstrip('-')) for field in ordering]
+    values = [value.isoformat() if isinstance(value, (date, datetime)) else value for value in values]
+    return urlsafe_base64_encode(json.dumps(values).encode())
+
+
+def decode_cursor(cursor, ordering):
+    """The ordering values of a cursor, or None when it is missing, malformed or of another ordering."""
+    try:
+        values = json.loads(urlsafe_base64_decode(cursor).decode())
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(ordering):
+        return None
+    return values
+
+
+def keyset_filter(ordering, values, forward=True):
+    """
+    Q of the rows after the cursor `values` in `ordering` (before it when not forward):
+    (a > x) OR (a = x AND b > y) OR ..., with < for descending fields.
+    """
+    steps = []
+    for index, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') == forward else 'gt'
+        step = Q(**{f"{name}__{lookup}": values[index]})
+        for previous, value in zip(ordering[:index], values):
+            step &= Q(**{previous.lstrip('-'): value})
+        steps.append(step)
+    return reduce(operator.or_, steps)
+
+
+def keyset_paginate(queryset, params, page_size):
+    """
+    One page of `queryset` in its own ordering (see keyset_ordering), selected with a
+    WHERE on the cursor in the `after`/`before` request parameter instead of an OFFSET.
+    The ordering fields must be plain fields or annotations of the rows.
+
+    Returns the rows, has_next/has_previous, next/previous URLs keeping the other
+    request parameters (filters), and a count capped at KEYSET_COUNT_LIMIT.
+    """
+    ordering = keyset_ordering(queryset)
+    after = decode_cursor(params.get('after', ''), ordering)
+    before = decode_cursor(params.get('before', ''), ordering) if not after else None
+
+    if before:
+        reverse = [field[1:] if field.startswith('-') else f"-{field}" for field in ordering]
+        rows = list(
+            queryset.filter(keyset_filter(ordering, before, forward=False))
+            .order_by(*reverse)[:page_size + 1]
+        )
+        has_previous, has_next = len(rows) > page_size, True
+        rows = rows[:page_size][::-1]
+    else:
+        page = queryset.order_by(*ordering)
+        if after:
+            page = page.filter(keyset_filter(ordering, after))
+        rows = list(page[:page_size + 1])
+        has_previous, has_next = after is not None, len(rows) > page_size
+        rows = rows[:page_size]
+
+    def page_url(key, obj):
+        query = params.copy()
+        for name in ('after', 'before', 'page'):
+            query.pop(name, None)
+        query[key] = encode_cursor(obj, ordering)
+        return f"?{query.urlencode()}"
+
+    count = queryset.order_by()[:KEYSET_COUNT_LIMIT + 1].count()
+    return {
+        'object_list': rows,
+        'has_next': has_next and bool(rows),
+        'has_previous': has_previous and bool(rows),
+        'next_url': page_url('after', rows[-1]) if has_next and rows else None,
+        'previous_url': page_url('before', rows[0]) if has_previous and rows else None,
+        'count': min(count, KEYSET_COUNT_LIMIT),
+        'count_is_exact': count <= KEYSET_COUNT_LIMIT,
+    }
@@ -1,38 +1,47 @@
 import calendar
 from datetime import date
-from django.utils import translation
-from django.http import HttpResponse
+from django.utils import timezone, translation
+from django.http import FileResponse, HttpResponse, Http404, JsonResponse
 from django.urls import reverse, reverse_lazy
 from django.shortcuts import redirect, render, get_object_or_404
 from django.core.exceptions import ValidationError
+from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.utils.translation import gettext as _
 from django.utils.decorators import method_decorator
+from django.db import transaction
 from django.db.models import ProtectedError, Q
 from django.views.generic import (
     ListView, CreateView, UpdateView, DeleteView, TemplateView, DetailView
 )
 from Quran.models import (
-    School, Student, Teacher, Course, ClassGroup, Attendance, Invoice, StudentPaymentStatus
+    School, Student, Teacher, Course, ClassGroup, Attendance, Invoice, StudentPaymentStatus, BackgroundJob, SchoolSnapshot
 )
 from Quran.forms import (
-    StudentForm, TeacherForm, CourseForm, ClassGroupForm
+    StudentForm, TeacherForm, CourseForm, ClassGroupForm, BulkInvoiceForm
 )
 from Quran.utils import (
-    get_user_school, get_present_for_student, get_attendance_summary, get_missing_months_for_student, get_group_summary, get_payment_summary,
+    get_user_school_ids, get_user_school_id, get_present_for_student, get_attendance_summary, get_missing_months_for_student, get_missing_months_for_students, get_group_summary, get_payment_summary,
+    get_group_roster, keyset_paginate, cached_report,
 )
 from Quran.services import (
-    handle_academic_year
+    save_group_attendance, create_monthly_invoices, refresh_school_snapshot,
 )
+from Quran.jobs import job_file_path, submit_job
 
-# Excle Importing
-import os
-from openpyxl import Workbook
-from openpyxl.drawing.image import Image
-from openpyxl.utils import get_column_letter
-from django.contrib.staticfiles import finders
-from openpyxl.styles import Alignment, Font, PatternFill
+# Exporting
+from Quran.exports import export_table, payment_status_export, summary_report_export
+from Quran.search import search_students
+
+# Profiling
 from django.conf import settings
+from Quran.middleware import recent_profiles, summarize_profiles, clear_profiles
+
+# Form action -> export file format
+EXPORT_FORMATS_BY_ACTION = {
+    "excel": "xlsx",
+    "csv": "csv",
+}
 
 # # Pdf Importing
 # from django.template.loader import render_to_string
@@ -46,21 +55,51 @@ from django.conf import settings
 class HomeView(TemplateView):
     template_name = 'Quran/home.html'
 
-    # Everytime will check date to upgrade academic year
-    today = date.today()
-    if today.month == 9 and today.day == 1:
-        handle_academic_year()
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        school_ids = get_user_school_ids(self.request)
+        today = timezone.localdate()
+
+        # One snapshot row per school, built on the first visit of the day if refresh_dashboard did not run
+        snapshots = SchoolSnapshot.objects.filter(school_id__in=school_ids, date=today).select_related('school').order_by('school__name')
+        missing = set(school_ids) - {snapshot.school_id for snapshot in snapshots}
+        if missing:
+            for school_id in missing:
+                refresh_school_snapshot(school_id, today=today)
+            snapshots = snapshots.all()
+
+        context.update({
+            "today": today,
+            "snapshots": snapshots,
+        })
+        return context
 
 
 # --------------------- Base Class ---------------------
 class BaseListView(ListView):
+    # Opt-in cursor pagination on the queryset ordering (updated_at, id by default): pages
+    # cost the same at any depth, with next/previous links only and a capped count
+    keyset_pagination = False
+    keyset_page = None
+
     def get_queryset(self):
         queryset = super().get_queryset()
-        user_schools = get_user_school(self.request)
-        if user_schools.exists():
-            queryset = queryset.filter(school__in=user_schools)
+        school_ids = get_user_school_ids(self.request)
+        if school_ids:
+            queryset = queryset.filter(school_id__in=school_ids)
         return queryset.order_by('-updated_at')
 
+    def paginate_queryset(self, queryset, page_size):
+        if not self.keyset_pagination:
+            return super().paginate_queryset(queryset, page_size)
+        self.keyset_page = keyset_paginate(queryset, self.request.GET, page_size)
+        return None, None, self.keyset_page['object_list'], False
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['keyset_page'] = self.keyset_page
+        return context
+
 
 class BaseCreateView(CreateView):
     model = Student
@@ -75,7 +114,7 @@ class BaseCreateView(CreateView):
 
     def form_valid(self, form):
         if not self.request.user.is_superuser:
-            form.instance.school = get_user_school(self.request).first()
+            form.instance.school_id = get_user_school_id(self.request)
         return super().form_valid(form)
 
 
@@ -87,7 +126,7 @@ class BaseUpdateView(UpdateView):
 
     def form_valid(self, form):
         if not self.request.user.is_superuser:
-            form.instance.school = get_user_school(self.request).first()
+            form.instance.school_id = get_user_school_id(self.request)
         return super().form_valid(form)
 
 
@@ -98,6 +137,7 @@ class StudentListView(BaseListView):
     template_name = 'Quran/student/student_list.html'
     context_object_name = 'students'
     paginate_by = 12
+    keyset_pagination = True
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -109,11 +149,9 @@ class StudentListView(BaseListView):
         gender_filter = self.request.GET.get('gender', '')
         group_filter = self.request.GET.get('group', '')
 
-        # Apply search filter by name or code
+        # Apply search by name or code, best matches first
         if search_query:
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) | Q(code__icontains=search_query)
-            )
+            queryset = search_students(queryset, search_query)
 
         # Apply gender filter
         if gender_filter:
@@ -129,8 +167,7 @@ class StudentListView(BaseListView):
         context = super().get_context_data(**kwargs)
 
         # Pass group options 
-        user_school = get_user_school(self.request)
-        context['groups'] = ClassGroup.objects.filter(school__in=user_school)
+        context['groups'] = ClassGroup.objects.filter(school_id__in=get_user_school_ids(self.request))
 
         # Pass the current search query and gender and group filter options to the context
         context['search_query'] = self.request.GET.get('q', '')
@@ -320,8 +357,7 @@ class AttendanceView(TemplateView):
         today = date.today()
 
         # Pass group options 
-        user_school = get_user_school(self.request)
-        groups = ClassGroup.objects.filter(school__in=user_school)
+        groups = ClassGroup.objects.filter(school_id__in=get_user_school_ids(self.request))
 
         context.update({
             'today': today,
@@ -356,16 +392,15 @@ class AttendanceView(TemplateView):
         present_student_ids = request.POST.getlist('present')
 
         # Update attendance records for the selected date and group
-        for student_id in student_ids:
-            present = str(student_id) in present_student_ids
-            student = get_object_or_404(Student, id=int(student_id))
-
-            Attendance.objects.update_or_create(
-                school=student.school,
-                student=student,
-                date=selected_date,
-                defaults={'present': present}
+        try:
+            save_result = save_group_attendance(
+                school_ids=get_user_school_ids(request),
+                selected_date=selected_date,
+                student_ids=student_ids,
+                present_ids=present_student_ids,
             )
+        except Student.DoesNotExist:
+            raise Http404(_("Student not found."))
 
         # Fetch group students
         group_students = self.get_group_students(request=self.request, date=selected_date, group=selected_group)
@@ -374,30 +409,15 @@ class AttendanceView(TemplateView):
             'selected_date': selected_date,
             'selected_group': selected_group,
             'group_students': group_students,
+            'save_result': save_result,
         }
 
         return super().get(request, *args, **kwargs)
 
     def get_group_students(self, request, date, group):
-        user_school = get_user_school(request)
-
         group_students = []
         if date and group:
-            students = Student.objects.filter(
-                school__in=user_school,
-                group=int(group),
-                is_active=True,
-            ).order_by('name')
-            for student in students:
-                missing = get_missing_months_for_student(student=student)
-                present = get_present_for_student(student_id=student.id, date=date)
-                group_students.append({
-                    "student_id": student.id,
-                    "student_code": student.code,
-                    "student_name": student.name,
-                    "status": missing,
-                    "present": present,
-                })
+            group_students = get_group_roster(school_ids=get_user_school_ids(request), group_id=group, selected_date=date)
 
         return group_students
 
@@ -412,8 +432,7 @@ class MonthlyAttendanceView(TemplateView):
         
         # Pass options
         schools = School.objects.all()
-        user_school = get_user_school(self.request)
-        groups = ClassGroup.objects.filter(school__in=user_school)
+        groups = ClassGroup.objects.filter(school_id__in=get_user_school_ids(self.request))
 
         context.update({
             "schools": schools,
@@ -455,8 +474,12 @@ class MonthlyAttendanceView(TemplateView):
         # Process and get attendance data
         attendance_data = self.get_attendance_data(school_id=school_id, group_id=group_id, month=month, year=year)
         
-        # # Read action: filter or pdf
-        # action = request.POST.get("action")
+        # Read action: filter, excel or csv
+        action = request.POST.get("action")
+
+        # Export to Excel or CSV if requested
+        if action in EXPORT_FORMATS_BY_ACTION and attendance_data.get("data"):
+            return self.export_data(attendance_data=attendance_data, file_format=EXPORT_FORMATS_BY_ACTION[action])
 
         # # Export to PDF if requested
         # if action == "pdf":
@@ -476,7 +499,7 @@ class MonthlyAttendanceView(TemplateView):
 
         # Get school
         if not self.request.user.is_superuser and not school_id:
-            school_id = get_user_school(self.request).first().id
+            school_id = get_user_school_id(self.request)
 
         # Convert values
         school_id = int(school_id) if school_id else None
@@ -486,7 +509,9 @@ class MonthlyAttendanceView(TemplateView):
 
         # Get attendance data if a school is selected
         if school_id:
-            data = get_attendance_summary(school_id=school_id, group_id=group_id, month=month, year=year)
+            data = cached_report('attendance', school_id, group_id, month, year, lambda: get_attendance_summary(
+                school_id=school_id, group_id=group_id, month=month, year=year,
+            ))
             
             # Calculate days in month for calendar display
             last_day = calendar.monthrange(year, month)[1]
@@ -503,6 +528,28 @@ class MonthlyAttendanceView(TemplateView):
 
         return context
 
+    def export_data(self, attendance_data, file_format):
+        """Exports the monthly attendance grid as an Excel or CSV file."""
+        columns = [
+            {"header": _("Student"), "key": "name"},
+            {"header": _("Phone"), "key": "phone"},
+        ]
+        for day in attendance_data["days"]:
+            columns.append({
+                "header": day,
+                "value": lambda student, index=day - 1: "✓" if student["attendance"][index] else "-",
+            })
+        columns.append({"header": _("Present"), "key": "total_present", "total": True})
+
+        return export_table(
+            rows=attendance_data["data"]["students"],
+            columns=columns,
+            title=f'{_("Monthly Attendance")} {attendance_data["selected_month"]}/{attendance_data["selected_year"]}',
+            filename=f'attendance_report_{attendance_data["selected_month"]}_{attendance_data["selected_year"]}.xlsx',
+            file_format=file_format,
+            rtl=translation.get_language() == "ar",
+        )
+
     # def export_pdf(self, request, attendance_data):
     #     """Export attendance data to PDF using Playwright."""
     #     html = render_to_string('Quran/attendance/monthly_attendance_pdf.html', attendance_data)
@@ -586,15 +633,16 @@ class InvoiceCreateView(TemplateView):
                 self.post_context["error_msg"] = _(f"An invoice already exists for this student for this month.")
 
             else:
-                # Create invoice
+                # Create invoice, with its payment status, ledger and snapshot updates in one transaction
                 try:
-                    invoice = Invoice.objects.create(
-                        school=student.school,
-                        student=student,
-                        month=month,
-                        year=year,
-                        amount=Invoice.calculate_expected_amount(student),
-                    )
+                    with transaction.atomic():
+                        invoice = Invoice.objects.create(
+                            school=student.school,
+                            student=student,
+                            month=month,
+                            year=year,
+                            amount=Invoice.calculate_expected_amount(student),
+                        )
                     return redirect("print_invoice", invoice_id=invoice.id)
                 except ValidationError as e:
                     self.post_context["error_msg"] = _("Invoice was not saved.")
@@ -619,7 +667,7 @@ class InvoiceCreateView(TemplateView):
         if code:
             student = Student.objects.filter(code=code).first()
         elif name:
-            student = Student.objects.filter(name__icontains=name).first()
+            student = search_students(Student.objects.all(), name).first()
 
         # Get student data
         if not student:
@@ -646,6 +694,21 @@ class InvoiceCreateView(TemplateView):
         }
 
 
+def invoice_receipt(invoice, missing):
+    """Context of one printed receipt (Quran/invoice/receipt.html)."""
+    return {
+        "id": invoice.id,
+        "school": invoice.student.school.name,
+        "date": invoice.date,
+        "student": invoice.student.name,
+        "course": invoice.student.group.course.name,
+        "month": invoice.month,
+        "year": invoice.year,
+        "amount": invoice.amount,
+        "status": missing,
+    }
+
+
 @method_decorator(staff_member_required, name='dispatch')
 class InvoicePrintView(TemplateView):
     template_name = 'Quran/invoice/print_invoice.html'
@@ -660,21 +723,102 @@ class InvoicePrintView(TemplateView):
         missing = get_missing_months_for_student(student=invoice.student)
 
         # Update context with all required data for template
+        receipt = invoice_receipt(invoice, missing)
+        context.update(receipt)
+        context["receipt"] = receipt
+        context["invoice"] = invoice
+        return context
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class InvoiceBatchPrintView(TemplateView):
+    """
+    Receipts of several invoices on one page, one per printed page: ?ids=1,2,3 (or repeated ids),
+    or ?group= (or ?school=) with month and year. Runs a fixed number of queries for any batch size.
+    """
+    template_name = 'Quran/invoice/print_invoices.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        params = self.request.GET
+
+        invoices = Invoice.objects.filter(school_id__in=get_user_school_ids(self.request))
+        ids = [value for values in params.getlist('ids') for value in values.split(',') if value.strip()]
+        try:
+            if ids:
+                invoices = invoices.filter(pk__in=[int(value) for value in ids])
+            elif (params.get('group') or params.get('school')) and params.get('month') and params.get('year'):
+                invoices = invoices.filter(month=int(params['month']), year=int(params['year']))
+                if params.get('group'):
+                    invoices = invoices.filter(student__group_id=int(params['group']))
+                if params.get('school'):
+                    invoices = invoices.filter(school_id=int(params['school']))
+            else:
+                raise Http404(_("Select invoices to print."))
+        except ValueError:
+            raise Http404(_("Select invoices to print."))
+
+        invoices = list(
+            invoices.select_related('student__school', 'student__group__course')
+            .order_by('student__group_id', 'student__name', 'year', 'month')
+        )
+        missing = get_missing_months_for_students({invoice.student for invoice in invoices})
+
+        context["receipts"] = [invoice_receipt(invoice, missing[invoice.student_id]) for invoice in invoices]
+        return context
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class BulkInvoiceView(TemplateView):
+    template_name = 'Quran/invoice/bulk_invoice.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        today = date.today()
+        school_ids = get_user_school_ids(self.request)
+
         context.update({
-            "id": invoice.id,
-            "school": invoice.student.school.name,
-            "date": invoice.date,
-            "student": invoice.student.name,
-            "course": invoice.student.group.course.name,
-            "month": invoice.month,
-            "year": invoice.year,
-            "amount": invoice.amount,
-            "status": missing,
+            "schools": School.objects.filter(pk__in=school_ids),
+            "groups": ClassGroup.objects.filter(school_id__in=school_ids).select_related('teacher'),
+            "months": range(1, 13),
+            "years": range(today.year, today.year + 10),
+            "selected_month": today.month,
+            "selected_year": today.year,
         })
 
-        context["invoice"] = invoice
+        # Add post-processing context if available
+        if hasattr(self, "post_context"):
+            context.update(self.post_context)
+
         return context
 
+    def post(self, request, *args, **kwargs):
+        form = BulkInvoiceForm(request.POST, school_ids=get_user_school_ids(request))
+        if not form.is_valid():
+            for field, errors in form.errors.items():
+                for error in errors:
+                    messages.error(request, error if field == '__all__' else f"{form.fields[field].label}: {error}")
+            return super().get(request, *args, **kwargs)
+
+        school, group = form.cleaned_data['school'], form.cleaned_data['group']
+        month, year = form.cleaned_data['month'], form.cleaned_data['year']
+        self.post_context = {
+            "selected_school": school.pk if school else None,
+            "selected_group": group.pk if group else None,
+            "selected_month": month,
+            "selected_year": year,
+        }
+
+        # Limit the batch to the school of the group, or to the selected school
+        school_ids = [group.school_id] if group else [school.pk]
+        result = create_monthly_invoices(school_ids, month, year, group_id=group.pk if group else None)
+        self.post_context.update({
+            "invoices": result["invoices"],
+            "skipped": result["skipped"],
+            "total_amount": sum(invoice.amount for invoice in result["invoices"]),
+        })
+        return super().get(request, *args, **kwargs)
+
 
 # --------------------- Student Payment Status ---------------------
 @method_decorator(staff_member_required, name='dispatch')
@@ -707,6 +851,22 @@ class PaymentStatusListView(TemplateView):
         from_date = self.request.POST.get("from_date")
         to_date = self.request.POST.get("to_date")
 
+        # Export to Excel or CSV if requested, rows are streamed without loading them all
+        if action in EXPORT_FORMATS_BY_ACTION:
+            data, _totals = self.get_payment_data(school_id=school_id, from_date=from_date, to_date=to_date, with_totals=False)
+            if data is not None and data.exists():
+                if settings.BACKGROUND_EXPORTS:
+                    job = submit_job(
+                        request.user,
+                        'payment_status_export',
+                        school_id=int(school_id or get_user_school_id(request)),
+                        from_date=from_date,
+                        to_date=to_date,
+                        file_format=EXPORT_FORMATS_BY_ACTION[action],
+                    )
+                    return redirect('job_detail', pk=job.pk)
+                return self.export_data(data=data, file_format=EXPORT_FORMATS_BY_ACTION[action])
+
         # Fetch the data based on the selected filters
         data, totals = self.get_payment_data(school_id=school_id, from_date=from_date, to_date=to_date)
 
@@ -719,20 +879,16 @@ class PaymentStatusListView(TemplateView):
             "totals": totals,
         }
 
-        # Export to Excel if requested
-        if action == "excel" and data:
-            return self.export_excel(data=data)
-
         # Otherwise, render the filtered report page
         return self.get(request, *args, **kwargs)
 
-    def get_payment_data(self, school_id, from_date, to_date):
+    def get_payment_data(self, school_id, from_date, to_date, with_totals=True):
         data = None
         totals = {}
 
         # Convert values to integers
         if not self.request.user.is_superuser and not school_id:
-            school_id = get_user_school(self.request).first().id
+            school_id = get_user_school_id(self.request)
         school_id = int(school_id)
 
         # Fetch the payment summary for the given filters
@@ -740,117 +896,15 @@ class PaymentStatusListView(TemplateView):
             data = get_payment_summary(school_id=school_id, from_date=from_date, to_date=to_date)
 
             # Calculate totals for numeric columns
-            if data:
+            if with_totals and data:
                 totals = {"total_amount": sum(d.get("amount", 0) for d in data)}
 
         return data, totals
 
-    # Export Excel
-    def export_excel(self, data):
-        """
-        Generates an Excel file from the payment status data and returns it as a response.
-        Includes logo, merged title, striped header, full column width, and row height.
-        """
-        wb = Workbook()
-        ws = wb.active
-
-        # Determine language
-        lang = translation.get_language()
-        
-        # Set headers based on language
-        if lang == "ar":
-            title_text = "حالة الدفع"
-            headers = [
-                "التاريخ", "رمز الطالب", "اسم الطالب", "الشهر", "السنة", "المبلغ"
-            ]
-            ws.sheet_view.rightToLeft = True
-        else:
-            title_text = _("Payment Status")
-            headers = [
-                _("Date"), _("Student Code"), _("Student Name"), _("Month"), _("Year"), _("Amount"),
-            ]
-
-        # Add logo in first row
-        # Get the absolute path to the static file
-        logo_path = finders.find("logo.png")
-        if logo_path:
-            img = Image(logo_path)
-            img.height = 60
-            img.width = 120
-            ws.add_image(img, "A1")
-
-        # Merge cells for title
-        ws.merge_cells(start_row=1, start_column=2, end_row=1, end_column=len(headers))
-        title_cell = ws.cell(row=1, column=2)
-        title_cell.value = title_text
-        title_cell.alignment = Alignment(horizontal="center", vertical="center")
-        title_cell.font = Font(size=14, bold=True)
-        ws.row_dimensions[1].height = 48
-
-        # Header row
-        header_row_index = 2
-        for col_index, header in enumerate(headers, start=1):
-            cell = ws.cell(row=header_row_index, column=col_index, value=header)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-        ws.row_dimensions[header_row_index].height = 25
-
-        # Data rows with stripe effect
-        for i, row in enumerate(data, start=header_row_index + 1):
-            fill = PatternFill(start_color="F2F2F2" if i % 2 == 0 else "FFFFFF",
-                                end_color="F2F2F2" if i % 2 == 0 else "FFFFFF",
-                                fill_type="solid")
-            
-            row_values = [
-                row.get("date"),
-                row.get("student_code"),
-                row.get("student_name"),
-                row.get("month"),
-                row.get("year"),
-                row.get("amount"),
-            ]
-            
-            for col_index, value in enumerate(row_values, start=1):
-                cell = ws.cell(row=i, column=col_index, value=value)
-                cell.fill = fill
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-            ws.row_dimensions[i].height = 30
-
-        # Totals row (if applicable)
-        if data:
-            totals_row_index = ws.max_row + 1
-            totals_row_values = [
-                _("Totals"), "", "", "", "",
-                sum(d.get("amount", 0) for d in data),
-            ]
-            for col_index, value in enumerate(totals_row_values, start=1):
-                cell = ws.cell(row=totals_row_index, column=col_index, value=value)
-                cell.font = Font(bold=True)
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-                cell.fill = PatternFill(start_color="D9D9D9", end_color="D9D9D9", fill_type="solid")
-            ws.row_dimensions[totals_row_index].height = 25
-
-        # Adjust column widths
-        for i, col in enumerate(ws.iter_cols(min_row=header_row_index, max_row=ws.max_row), start=1):
-            max_length = 0
-            for cell in col:
-                try:
-                    if cell.value:
-                        max_length = max(max_length, len(str(cell.value)))
-                except AttributeError:
-                    continue  # Skip merged cells
-            col_letter = get_column_letter(i)
-            ws.column_dimensions[col_letter].width = max_length + 2
-
-        # Save and return response
-        response = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-        export_filename = _("payment_status.xlsx")
-        response["Content-Disposition"] = f'attachment; filename="{export_filename}"'
-        wb.save(response)
-        return response
+    # Export Excel / CSV
+    def export_data(self, data, file_format):
+        """Streams the payment status data as an Excel or CSV file."""
+        return export_table(rows=data, file_format=file_format, **payment_status_export())
 
 
 # --------------------- Reports ---------------------
@@ -902,9 +956,19 @@ class SummaryReportView(TemplateView):
         # Process and get report data
         report_data = self.get_report_data(school_id=school_id, month=month, year=year)
         
-        # Export to Excel if requested
-        if action == "excel" and report_data.get("data"):
-            return self.export_excel(data=report_data["data"])
+        # Export to Excel or CSV if requested
+        if action in EXPORT_FORMATS_BY_ACTION and report_data.get("data"):
+            if settings.BACKGROUND_EXPORTS:
+                job = submit_job(
+                    request.user,
+                    'summary_report_export',
+                    school_id=report_data["selected_school"],
+                    month=report_data["selected_month"],
+                    year=report_data["selected_year"],
+                    file_format=EXPORT_FORMATS_BY_ACTION[action],
+                )
+                return redirect('job_detail', pk=job.pk)
+            return self.export_data(data=report_data["data"], file_format=EXPORT_FORMATS_BY_ACTION[action])
         
         # Store in post_context for template rendering
         self.post_context = report_data
@@ -925,7 +989,9 @@ class SummaryReportView(TemplateView):
 
         # Get report data if a school is selected
         if school_id:
-            data = get_group_summary(school_id=school_id, month=month, year=year)
+            data = cached_report('summary', school_id, None, month, year, lambda: get_group_summary(
+                school_id=school_id, month=month, year=year,
+            ))
 
             # Calculate totals for numeric columns
             if data:
@@ -950,124 +1016,71 @@ class SummaryReportView(TemplateView):
         }
         return context
 
-    # Export Excel
-    def export_excel(self, data):
-        """
-        Generates an Excel file from the summary report data and returns it as a response.
-        Includes logo, merged title, striped header, full column width, and row height.
-        """
-        wb = Workbook()
-        ws = wb.active
-
-        # Determine language
-        lang = translation.get_language()
-        
-        # Set headers based on language
-        if lang == "ar":
-            title_text = "تقرير ملخص"
-            headers = [
-                "المعلم", "المجموعة", "البداية", "النهاية", "إجمالي الطلاب",
-                "المدفوع هذا الشهر", "الخصم هذا الشهر", "إعفاء كامل", "غير مدفوع",
-                "المدفوع الأشهر السابقة", "الخصم الأشهر السابقة", "الإجمالي"
-            ]
-            ws.sheet_view.rightToLeft = True
-        else:
-            title_text = _("Summary Report")
-            headers = [
-                _("Teacher"), _("Group"), _("Start"), _("End"), _("Total Students"),
-                _("Paid Current"), _("Discount Current"), _("Full Discount"), _("Not Paid"),
-                _("Paid Previous"), _("Discount Previous"), _("Total Amount")
-            ]
-
-        # Add logo in first row
-        # Get the absolute path to the static file
-        logo_path = finders.find("logo.png")
-        if logo_path:
-            img = Image(logo_path)
-            img.height = 60
-            img.width = 120
-            ws.add_image(img, "A1")
-
-        # Merge cells for title
-        ws.merge_cells(start_row=1, start_column=2, end_row=1, end_column=len(headers))
-        title_cell = ws.cell(row=1, column=2)
-        title_cell.value = title_text
-        title_cell.alignment = Alignment(horizontal="center", vertical="center")
-        title_cell.font = Font(size=14, bold=True)
-        ws.row_dimensions[1].height = 48
-
-        # Header row
-        header_row_index = 2
-        for col_index, header in enumerate(headers, start=1):
-            cell = ws.cell(row=header_row_index, column=col_index, value=header)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-        ws.row_dimensions[header_row_index].height = 25
-
-        # Data rows with stripe effect
-        for i, row in enumerate(data, start=header_row_index + 1):
-            fill = PatternFill(start_color="F2F2F2" if i % 2 == 0 else "FFFFFF",
-                            end_color="F2F2F2" if i % 2 == 0 else "FFFFFF",
-                            fill_type="solid")
-            row_values = [
-                row.get("teacher__name"),
-                row.get("name"),
-                row.get("start_time"),
-                row.get("end_time"),
-                row.get("total_students"),
-                row.get("students_paid_current"),
-                row.get("students_discount_current"),
-                row.get("students_full_discount"),
-                row.get("students_not_paid"),
-                row.get("students_paid_previous"),
-                row.get("students_discount_previous"),
-                row.get("final_total"),
-            ]
-            for col_index, value in enumerate(row_values, start=1):
-                cell = ws.cell(row=i, column=col_index, value=value)
-                cell.fill = fill
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-            ws.row_dimensions[i].height = 30
-
-        # Totals row
-        totals_row_index = ws.max_row + 1
-        totals_row_values = [
-            _("Totals"), "", "", "",
-            sum(d.get("total_students", 0) for d in data),
-            sum(d.get("students_paid_current", 0) for d in data),
-            sum(d.get("students_discount_current", 0) for d in data),
-            sum(d.get("students_full_discount", 0) for d in data),
-            sum(d.get("students_not_paid", 0) for d in data),
-            sum(d.get("students_paid_previous", 0) for d in data),
-            sum(d.get("students_discount_previous", 0) for d in data),
-            sum(d.get("final_total", 0) for d in data),
-        ]
-        for col_index, value in enumerate(totals_row_values, start=1):
-            cell = ws.cell(row=totals_row_index, column=col_index, value=value)
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.fill = PatternFill(start_color="D9D9D9", end_color="D9D9D9", fill_type="solid")
-        ws.row_dimensions[totals_row_index].height = 25
-
-        # Adjust column widths
-        for i, col in enumerate(ws.iter_cols(min_row=header_row_index, max_row=ws.max_row), start=1):
-            max_length = 0
-            for cell in col:
-                try:
-                    if cell.value:
-                        max_length = max(max_length, len(str(cell.value)))
-                except AttributeError:
-                    continue  # Skip merged cells
-            col_letter = get_column_letter(i)
-            ws.column_dimensions[col_letter].width = max_length + 2
-
-        # Save and return response
-        response = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-        export_filename = _("summary_report.xlsx")
-        response["Content-Disposition"] = f'attachment; filename="{export_filename}"'
-        wb.save(response)
-        return response
+    # Export Excel / CSV
+    def export_data(self, data, file_format):
+        """Exports the summary report data as an Excel or CSV file."""
+        return export_table(rows=data, file_format=file_format, **summary_report_export())
 
+
+# --------------------- Background Jobs ---------------------
+@method_decorator(staff_member_required, name='dispatch')
+class JobDetailView(DetailView):
+    model = BackgroundJob
+    template_name = 'Quran/jobs/job_detail.html'
+    context_object_name = 'job'
+
+    def get_queryset(self):
+        # Users only see their own jobs
+        queryset = super().get_queryset()
+        if not self.request.user.is_superuser:
+            queryset = queryset.filter(user=self.request.user)
+        return queryset
+
+
+class JobStatusView(JobDetailView):
+    """Progress of a job as JSON, polled by the job page."""
+
+    def render_to_response(self, context, **response_kwargs):
+        job = self.object
+        return JsonResponse({
+            "id": job.pk,
+            "status": job.status,
+            "status_display": job.get_status_display(),
+            "progress": job.progress,
+            "error": job.error,
+            "download_url": reverse('job_download', args=[job.pk]) if job.status == 'done' else None,
+        })
+
+
+class JobDownloadView(JobDetailView):
+    def get(self, request, *args, **kwargs):
+        job = self.get_object()
+        if job.status != 'done':
+            raise Http404(_("The file is not ready."))
+        try:
+            job_file = open(job_file_path(job), 'rb')
+        except FileNotFoundError:
+            raise Http404(_("The file has expired."))
+        return FileResponse(job_file, as_attachment=True, filename=job.file_name)
+
+
+# --------------------- Performance ---------------------
+@method_decorator(staff_member_required, name='dispatch')
+class PerformanceView(TemplateView):
+    template_name = 'Quran/performance/performance.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        profiles = recent_profiles()
+
+        context.update({
+            "enabled": settings.PROFILING_ENABLED,
+            "summary": summarize_profiles(profiles),
+            "profiles": profiles,
+        })
+        return context
+
+    def post(self, request, *args, **kwargs):
+        if request.POST.get("action") == "clear":
+            clear_profiles()
+        return redirect("performance")
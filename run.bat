@@ -5,6 +5,9 @@ call venv\Scripts\activate
 
 python manage.py migrate --noinput
 
+rem Safe to re-run, each school is promoted once per academic year
+python manage.py promote_academic_year
+
 waitress-serve ^
   --host=127.0.0.1 ^
   --port=8005 ^